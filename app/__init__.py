@@ -1,14 +1,28 @@
 import os
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from app.config import get_config
 from app.extensions import init_extensions, db, login_manager
 from app.routes import register_blueprints
+from app.cli import register_commands
+from app.services.cache_snapshot import init_snapshots
 from config import Config
 from app.models.user import User
+from app.models.search import SearchResult
+
+class JSONProvider(DefaultJSONProvider):
+    """Default JSON provider that also serializes search results"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, SearchResult):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 def create_app(config_class=Config):
     """Create and configure the Flask application."""
     app = Flask(__name__)
+    app.json = JSONProvider(app)
     
     # Load configuration
     if config_class is None:
@@ -25,12 +39,18 @@ def create_app(config_class=Config):
     
     # Register blueprints
     register_blueprints(app)
+    
+    # Register CLI commands
+    register_commands(app)
+    
+    # Restore the cache snapshot lazily in each worker
+    init_snapshots(app)
 
     # Create database tables
     with app.app_context():
         # Ensure database directory exists
         db_dir = os.path.dirname(app.config['SQLITE_DB'])
-        if not os.path.exists(db_dir):
+        if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
             os.chmod(db_dir, 0o777)
         
@@ -4,6 +4,7 @@ from app.auth import bp
 from app.auth.forms import LoginForm, RegistrationForm
 from app.models import User
 from app.extensions import db
+from app.services import quotas, scheduler
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -53,4 +54,6 @@ def register():
 @bp.route('/profile')
 @login_required
 def profile():
-    return render_template('auth/profile.html', title='Profile') 
\ No newline at end of file
+    priority = scheduler.ADMIN if current_user.is_admin else scheduler.AUTHENTICATED
+    credits = quotas.summary(f"user:{current_user.id}", priority)
+    return render_template('auth/profile.html', title='Profile', credits=credits)
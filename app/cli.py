@@ -0,0 +1,55 @@
+"""Flask CLI commands for the application."""
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+from app.services import cache_snapshot
+
+cache_cli = AppGroup('cache', help='Cache snapshot commands.')
+
+
+@cache_cli.command('export')
+@click.argument('destination')
+@click.option('--source', default=None, help='Snapshot to export (defaults to the configured snapshot).')
+def export_cache(destination, source):
+    """Copy a cache snapshot to DESTINATION."""
+    source = source or cache_snapshot.snapshot_path()
+    try:
+        count = cache_snapshot.export_snapshot(source, destination)
+    except (OSError, cache_snapshot.SnapshotError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Exported {count} cache entries to {destination}")
+
+
+@cache_cli.command('import')
+@click.argument('source')
+@click.option('--destination', default=None, help='Where to install it (defaults to the configured snapshot).')
+def import_cache(source, destination):
+    """Install SOURCE as the snapshot loaded on the next boot."""
+    destination = destination or cache_snapshot.snapshot_path()
+    if not destination:
+        raise click.ClickException('Cache snapshots are disabled (CACHE_SNAPSHOT_PATH is empty).')
+    try:
+        count = cache_snapshot.import_snapshot(source, destination)
+    except (OSError, cache_snapshot.SnapshotError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {count} cache entries into {destination}")
+
+
+@cache_cli.command('save')
+def save_cache():
+    """Snapshot this process's cache (useful with a shared Redis cache)."""
+    path = cache_snapshot.snapshot_path()
+    if not path:
+        raise click.ClickException('Cache snapshots are disabled (CACHE_SNAPSHOT_PATH is empty).')
+    count = cache_snapshot.save_snapshot(path)
+    click.echo(f"Saved {count} cache entries to {path}")
+
+
+def register_commands(app: Flask) -> None:
+    """Register CLI command groups with the Flask application.
+    
+    Args:
+        app: The Flask application instance
+    """
+    app.cli.add_command(cache_cli)
@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from config import PeerCacheConfig
 
 # Load environment variables from .env file
 load_dotenv()
@@ -8,7 +9,7 @@ load_dotenv()
 # Get the absolute path of the project root directory
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
-class Config:
+class Config(PeerCacheConfig):
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-not-secure'
     FIRECRAWL_API_KEY = os.environ.get('FIRECRAWL_API_KEY')
@@ -21,10 +22,27 @@ class Config:
     CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'simple'
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT') or 86400)  # 24 hours
     
+    # Adaptive search TTLs: learned per website from result churn, within these bounds
+    CACHE_TTL_MIN = int(os.environ.get('CACHE_TTL_MIN') or 3600)  # 1 hour
+    CACHE_TTL_MAX = int(os.environ.get('CACHE_TTL_MAX') or 1209600)  # 2 weeks
+    CACHE_TTL_TARGET_CHURN = float(os.environ.get('CACHE_TTL_TARGET_CHURN') or 0.2)
+    
+    # Cached values larger than this many bytes are zlib-compressed
+    CACHE_COMPRESS_THRESHOLD = int(os.environ.get('CACHE_COMPRESS_THRESHOLD') or 1024)
+    
+    # Peer cache sharing (CACHE_PEERS, CACHE_PEER_*) comes from PeerCacheConfig
+    
     # Redis cache settings (if used)
     CACHE_REDIS_HOST = os.environ.get('REDIS_HOST') or 'localhost'
     CACHE_REDIS_PORT = int(os.environ.get('REDIS_PORT') or 6379)
     
+    # Per-URL extraction cache: entries are revalidated after EXTRACTION_CACHE_TTL
+    # and kept (with their validators) for EXTRACTION_CACHE_MAX_AGE seconds
+    EXTRACTION_CACHE_TTL = int(os.environ.get('EXTRACTION_CACHE_TTL') or 86400)  # 24 hours
+    EXTRACTION_CACHE_MAX_AGE = int(os.environ.get('EXTRACTION_CACHE_MAX_AGE') or 2592000)  # 30 days
+    REVALIDATION_TIMEOUT = int(os.environ.get('REVALIDATION_TIMEOUT') or 10)
+    VALIDATOR_TIMEOUT = int(os.environ.get('VALIDATOR_TIMEOUT') or 3)  # Background HEAD after an extract
+    
     # Session settings
     SESSION_TYPE = 'filesystem'
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
@@ -34,6 +52,55 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{SQLITE_DB}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Cache snapshots, written to the data volume so restarts start warm
+    CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH') or os.path.join(os.path.dirname(SQLITE_DB), 'cache_snapshot.bin')
+    CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL') or 300)  # 5 minutes
+    CACHE_SNAPSHOT_MAX_BYTES = int(os.environ.get('CACHE_SNAPSHOT_MAX_BYTES') or 33554432)  # 32MB
+    
+    # Search state shared by all gunicorn workers
+    SEARCH_STATE_DB = os.environ.get('SEARCH_STATE_DB') or os.path.join(os.path.dirname(SQLITE_DB), 'search_state.db')
+    SEARCH_STATE_TTL = int(os.environ.get('SEARCH_STATE_TTL') or 3600)  # 1 hour
+    SEARCH_RESULT_TTL = int(os.environ.get('SEARCH_RESULT_TTL') or 3600)  # 1 hour
+    SEARCH_RESULT_MAX_BYTES = int(os.environ.get('SEARCH_RESULT_MAX_BYTES') or 67108864)  # 64MB
+    SEARCH_HEARTBEAT_TIMEOUT = int(os.environ.get('SEARCH_HEARTBEAT_TIMEOUT') or 30)  # Seconds
+    
+    # End-to-end time budget per search mode, kept under gunicorn's timeout
+    SEARCH_DEADLINE_FAST = int(os.environ.get('SEARCH_DEADLINE_FAST') or 120)  # 2 minutes
+    SEARCH_DEADLINE_THOROUGH = int(os.environ.get('SEARCH_DEADLINE_THOROUGH') or 480)  # 8 minutes
+    
+    # Results enriched with comment analysis before the user asks for them
+    ENRICHMENT_PREFETCH = int(os.environ.get('ENRICHMENT_PREFETCH') or 2)
+    # Analyses a card asks for run on the request thread, so keep them short and few
+    ENRICHMENT_ON_DEMAND_SECONDS = int(os.environ.get('ENRICHMENT_ON_DEMAND_SECONDS') or 30)
+    ENRICHMENT_MAX_ON_DEMAND = int(os.environ.get('ENRICHMENT_MAX_ON_DEMAND') or 2)  # Per worker process
+    
+    # Result ranking, see app/services/ranking.py
+    RANKING_ESTIMATOR = os.environ.get('RANKING_ESTIMATOR') or 'bayesian'  # Or 'wilson'
+    RANKING_PRIOR_REVIEWS = int(os.environ.get('RANKING_PRIOR_REVIEWS') or 20)
+    RANKING_WEIGHTS = {}  # Per ranking type, e.g. {'ratings': {'quality': 1.0, 'relevance': 0.2}}
+    
+    # Background search scheduling, per worker process
+    SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS') or 4)
+    SEARCH_MAX_PER_WEBSITE = int(os.environ.get('SEARCH_MAX_PER_WEBSITE') or 2)
+    SEARCH_RESERVED_WORKERS = int(os.environ.get('SEARCH_RESERVED_WORKERS') or 1)  # Kept free of cache warming
+    SEARCH_DRAIN_TIMEOUT = int(os.environ.get('SEARCH_DRAIN_TIMEOUT') or 15)  # Fits in gunicorn's graceful_timeout
+    
+    # Firecrawl credits per user or anonymous session; admins are unlimited
+    QUOTA_DAILY_USER = int(os.environ.get('QUOTA_DAILY_USER') or 30)
+    QUOTA_BURST_USER = int(os.environ.get('QUOTA_BURST_USER') or 10)  # Per hour
+    QUOTA_DAILY_ANONYMOUS = int(os.environ.get('QUOTA_DAILY_ANONYMOUS') or 5)
+    QUOTA_BURST_ANONYMOUS = int(os.environ.get('QUOTA_BURST_ANONYMOUS') or 3)  # Per hour
+    
+    # Admission control, per worker process; admins are not limited
+    ADMISSION_SEARCH_PER_MINUTE = int(os.environ.get('ADMISSION_SEARCH_PER_MINUTE') or 6)
+    ADMISSION_SEARCH_BURST = int(os.environ.get('ADMISSION_SEARCH_BURST') or 3)
+    ADMISSION_STATUS_PER_MINUTE = int(os.environ.get('ADMISSION_STATUS_PER_MINUTE') or 120)
+    ADMISSION_STATUS_BURST = int(os.environ.get('ADMISSION_STATUS_BURST') or 10)
+    ADMISSION_ENRICH_PER_MINUTE = int(os.environ.get('ADMISSION_ENRICH_PER_MINUTE') or 20)
+    ADMISSION_ENRICH_BURST = int(os.environ.get('ADMISSION_ENRICH_BURST') or 5)
+    ADMISSION_IP_FACTOR = int(os.environ.get('ADMISSION_IP_FACTOR') or 4)  # Clients sharing one address
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE') or 16)  # Halved for anonymous users
+    
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
 
@@ -61,6 +128,12 @@ class TestingConfig(Config):
     
     # Mock API key for testing
     FIRECRAWL_API_KEY = 'test-api-key'
+    
+    # No cache snapshots in tests
+    CACHE_SNAPSHOT_PATH = None
+    
+    # Keep search state in a shared in-memory database
+    SEARCH_STATE_DB = 'file:search_state_test?mode=memory&cache=shared'
 
 class ProductionConfig(Config):
     """Production configuration"""
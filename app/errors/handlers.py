@@ -1,4 +1,4 @@
-from flask import render_template, current_app
+from flask import render_template, current_app, request, jsonify
 from app.errors import bp
 from app.services.firecrawl_service import RateLimitExceeded, FirecrawlAPIManager
 from datetime import datetime, timedelta
@@ -17,6 +17,26 @@ def rate_limit_error(error):
     return render_template('errors/rate_limit.html',
                          reset_time=api_manager.daily_reset_time), 429
 
+def overloaded_error(error, title):
+    """Turned away by admission control; JSON for polling requests"""
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': error.description, 'retry_after': error.retry_after})
+    else:
+        response = current_app.make_response(render_template(
+            'errors/busy.html', title=title, message=error.description, retry_after=error.retry_after))
+    response.status_code = error.code
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    return overloaded_error(error, 'Slow Down')
+
+@bp.app_errorhandler(503)
+def service_unavailable_error(error):
+    return overloaded_error(error, 'Busy Right Now')
+
 @bp.app_errorhandler(403)
 def forbidden_error(error):
     return render_template('errors/403.html'), 403 
\ No newline at end of file
@@ -20,6 +20,14 @@ def init_extensions(app):
     # Initialize migrate after db
     migrate.init_app(app, db)
     
+    # Initialize the search state store shared by all workers
+    from app.services.search_state import search_state
+    search_state.init_app(app)
+    
+    # Initialize the rate limit buckets
+    from app.services.admission import admission
+    admission.init_app(app)
+    
     # Initialize login manager
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint('health', __name__)
+
+from app.health import routes
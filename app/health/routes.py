@@ -0,0 +1,63 @@
+"""Health and load signals for Fly checks and autoscaling.
+
+Both endpoints read only in-process counters, never the database or the
+session, so they answer in well under a millisecond even when the worker
+is busy with searches.
+"""
+import os
+
+import psutil
+from flask import current_app, jsonify
+
+from app.health import bp
+from app.services import quotas
+from app.services.admission import MAX_QUEUE
+from app.services.cache_index import cache_index
+from app.services.scheduler import scheduler
+
+
+@bp.route('/healthz')
+def healthz():
+    """Liveness.
+
+    Draining is not reported here: gunicorn drains the scheduler in
+    worker_exit, after the worker has stopped accepting connections.
+    """
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/load')
+def load():
+    """Machine-readable capacity of this worker process"""
+    queue = scheduler.stats()
+    if queue['utilization'] >= 1 and queue['pending'] >= current_app.config.get('ADMISSION_MAX_QUEUE', MAX_QUEUE) // 2:
+        status = 'busy'  # Anonymous searches are being shed
+    else:
+        status = 'ok'
+
+    daily_limit = current_app.config.get('FIRECRAWL_DAILY_LIMIT', 100)
+    spent = quotas.spent_today()
+    memory = psutil.virtual_memory()
+    return jsonify({
+        'status': status,
+        'pid': os.getpid(),
+        'queue': {
+            'workers': queue['workers'],
+            'pending': queue['pending'],
+            'running': queue['running'],
+            'utilization': queue['utilization'],
+            'pending_by_priority': queue['pending_by_priority'],
+        },
+        'estimated_wait_seconds': queue['estimated_wait'],
+        'credits': {
+            'daily_limit': daily_limit,
+            'used_today': spent,
+            'remaining': max(daily_limit - spent, 0) if spent is not None else None,
+        },
+        'cache': cache_index.lookups(),
+        'memory': {
+            'rss_bytes': psutil.Process().memory_info().rss,
+            'available_bytes': memory.available,
+            'percent_used': memory.percent,
+        },
+    })
@@ -1,14 +1,57 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for, session
+from flask import (Response, render_template, request, jsonify, current_app, flash, redirect, url_for, session,
+                   stream_with_context)
 from flask_login import login_required, current_user
 from app.main import bp
-from app.models import UserSearchHistory, SearchResult
-from app.extensions import db, cache
-from app.services.firecrawl_service import search_website, get_best_results, FirecrawlAPIManager
-from tqdm import tqdm
-from datetime import datetime
+from app.models import UserSearchHistory
+from app.models.search import json_default
+from app.extensions import db
+from app.services.admission import admission
+from app.services.cache_index import cache_index
+from app.services.enrichment import enrich_search, enrich_one, EnrichmentBusy, PREFETCH
+from app.services import quotas, scheduler, search_events
+from app.services.latency import latency_model
+from app.services.progress import StageProgress, QUEUED, remaining, poll_interval
+from app.services.search_state import (search_state, SearchJob, SearchCancelled, DeadlineExceeded, COMPLETE,
+                                       ENRICHING, ERROR, CANCELLED, ENRICH_STAGE)
+from app.services.firecrawl_service import (search_website, get_cache_key, search_cache_key,
+                                            FirecrawlAPIManager, QuotaExceeded, RateLimitExceeded,
+                                            AuthenticationError)
+from datetime import datetime, timedelta
+from werkzeug.exceptions import ServiceUnavailable
+import functools
 import json
+import time
 import uuid
-from threading import Thread
+
+# Search modes and the config setting holding each one's time budget
+SEARCH_MODES = {
+    'fast': 'SEARCH_DEADLINE_FAST',
+    'thorough': 'SEARCH_DEADLINE_THOROUGH',
+}
+OUT_OF_TIME = "The search ran out of time. Try the thorough search mode."
+ENRICH_RETRY_AFTER = 5  # Seconds before a card asks again for an analysis that was turned away
+
+def search_owner():
+    """Who a search is scheduled for: the user, or the anonymous session"""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    if 'client_id' not in session:
+        session['client_id'] = str(uuid.uuid4())
+    return f"session:{session['client_id']}"
+
+def search_priority():
+    """Scheduling class for the current user"""
+    if not current_user.is_authenticated:
+        return scheduler.ANONYMOUS
+    if current_user.is_admin:
+        return scheduler.ADMIN
+    return scheduler.AUTHENTICATED
+
+def error_url(error):
+    """Page explaining why a search failed"""
+    if error == quotas.EXHAUSTED:
+        return url_for('main.quota_exceeded')
+    return url_for('main.api_error', message=error)
 
 @bp.route('/', methods=['GET'])
 def index():
@@ -16,88 +59,134 @@ def index():
 
 @bp.route('/loading')
 def loading():
-    return render_template('main/loading.html')
+    return render_template('main/loading.html', search_id=session.get('search_id'))
 
 @bp.route('/check_search_status')
+@admission.limit('status')
 def check_search_status():
     # Get the search ID from the session
     search_id = session.get('search_id')
     if not search_id:
         return jsonify({'complete': False})
     
+    # Polling keeps the search alive; an abandoned search is cancelled
+    search_state.heartbeat(search_id)
+    
+    # The search may be running in another worker, so read the shared store
+    state = search_state.get(search_id)
+    if state is None:
+        return jsonify({'complete': False})
+    
+    if state['state'] == CANCELLED:
+        flash('Your search was cancelled. Please try again.', 'warning')
+        return jsonify({
+            'complete': True,
+            'redirect_url': url_for('main.index')
+        })
+    
     # Check if there was an error
-    error = cache.get(f'search_error_{search_id}')
-    if error:
+    if state['state'] == ERROR:
         return jsonify({
             'complete': True,
-            'redirect_url': url_for('main.api_error', message=error)
+            'redirect_url': error_url(state['error'])
         })
     
-    # Check if the search is complete
-    result = cache.get(f'search_result_{search_id}')
-    if result is not None:
+    # Check if the search is complete; enrichment continues on the results page
+    if state['state'] in (ENRICHING, COMPLETE):
         # Search is complete, return the redirect URL
         return jsonify({
             'complete': True,
             'redirect_url': url_for('main.results', search_id=search_id)
         })
     
-    # Search is still in progress
-    return jsonify({'complete': False})
+    # Search is still in progress; the latency model says when to ask again
+    eta = remaining(state['progress'])
+    return jsonify({
+        'complete': False,
+        'progress': state['progress'],
+        'eta': eta,
+        'poll_after': poll_interval(eta)
+    })
 
-@bp.route('/search', methods=['POST'])
-def search():
-    website = request.form.get('website')
-    query = request.form.get('query')
-    ranking_type = request.form.get('ranking_type', 'relevance')
-    
-    # Generate a unique search ID
-    search_id = str(uuid.uuid4())
-    session['search_id'] = search_id
-    
-    # Store search parameters
-    search_data = {
-        'website': website,
-        'query': query,
-        'ranking_type': ranking_type
-    }
-    try:
-        cache.set(f'search_params_{search_id}', search_data)
-    except Exception as e:
-        current_app.logger.error(f"Failed to store search parameters in cache: {str(e)}")
-        flash("Failed to initialize search. Please try again.", "error")
-        return redirect(url_for('main.index'))
+@bp.route('/search/<search_id>/events')
+@admission.limit('status')
+def search_events_stream(search_id):
+    """Progress and results of a search as server-sent events"""
+    limit = current_app.config.get('SSE_MAX_STREAMS', search_events.MAX_STREAMS)
+    if not search_events.slots.acquire(limit):
+        # The page falls back to polling
+        return jsonify({'error': 'Too many open streams'}), 503
+
+    def redirect_for(snapshot):
+        if snapshot['state'] == ERROR:
+            return error_url(snapshot['error'])
+        if snapshot['state'] == CANCELLED:
+            return url_for('main.index')
+        return url_for('main.results', search_id=search_id)
+
+    def generate():
+        try:
+            yield from search_events.stream(search_id, redirect_for)
+        finally:
+            search_events.slots.release()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def run_search(app, search_id, params, job, user_id=None):
+    """Run a queued search on a scheduler thread.
+
+    A search interrupted after its basic results were stored picks up at
+    the enrichment stage; otherwise it starts from the beginning.
+    """
+    website = params['website']
+    query = params['query']
+    ranking_type = params.get('ranking_type', 'relevance')
     
-    # Start the search in a background thread
-    def do_search():
-        # Create an application context for the thread
-        with current_app.app_context():
-            try:
+    # Create an application context for the thread
+    with app.app_context():
+        if not search_state.start(search_id):
+            current_app.logger.warning(f"Search {search_id} was already claimed")
+            return
+        try:
+            if job.progress is None:
+                job.progress = StageProgress(search_id, website, ranking_type)
+            results = None
+            if job.stage == ENRICH_STAGE:
+                results = search_state.load_results(job.result_key)
+                if results is not None:
+                    current_app.logger.info(f"Resuming enrichment for search {search_id}")
+                    search_state.publish_basic(search_id, results, result_key=job.result_key)
+            
+            if results is None:
                 current_app.logger.info(f"Starting search for query: {query} on website: {website}")
                 current_app.logger.info(f"Search ID: {search_id}")
                 
-                # Log the start of the API call
+                # Phase one: the cheap basic search the loading page waits for
                 current_app.logger.info("Making API call to search_website...")
-                results = search_website(website, query)
+                results = search_website(website, query, ranking_type, job=job, detailed=False)
                 
                 # Log the completion and results summary
                 result_count = len(results) if isinstance(results, list) else 0
-                current_app.logger.info(f"Search completed with {result_count} results")
+                current_app.logger.info(f"Basic search completed with {result_count} results")
                 
-                # Store results in cache with detailed logging
+                # Store results in the shared store with detailed logging
                 try:
-                    cache.set(f'search_result_{search_id}', results)
-                    current_app.logger.info("Successfully stored results in cache")
-                except Exception as cache_error:
-                    current_app.logger.error(f"Failed to store results in cache: {str(cache_error)}")
-                    cache.set(f'search_error_{search_id}', "Failed to store search results")
+                    # Identical searches share one stored copy of the results
+                    job.result_key = get_cache_key("search_results", website=website, query=query,
+                                                   ranking_type=ranking_type)
+                    search_state.publish_basic(search_id, results, result_key=job.result_key)
+                    current_app.logger.info("Successfully stored search results")
+                except Exception as store_error:
+                    current_app.logger.error(f"Failed to store search results: {str(store_error)}")
+                    search_state.fail(search_id, "Failed to store search results")
                     return
                 
                 # Store in user history if authenticated
-                if current_user.is_authenticated:
+                if user_id is not None:
                     try:
                         search_history = UserSearchHistory(
-                            user_id=current_user.id,
+                            user_id=user_id,
                             website=website,
                             search_query=query,
                             ranking_type=ranking_type,
@@ -110,22 +199,123 @@ def search():
                         current_app.logger.error(f"Failed to store search history: {str(db_error)}")
                         # Don't fail the whole search if history storage fails
             
-            except Exception as e:
-                error_msg = str(e)
-                current_app.logger.error(f"Search error: {error_msg}")
-                current_app.logger.exception("Full traceback:")
-                try:
-                    cache.set(f'search_error_{search_id}', error_msg)
-                except Exception as cache_error:
-                    current_app.logger.error(f"Failed to store error in cache: {str(cache_error)}")
+            # Phase two: comment analysis, filled into the results page as it arrives
+            job.stage = ENRICH_STAGE
+            enrich_search(search_id, job.result_key, results, ranking_type, job)
+        
+        except DeadlineExceeded:
+            current_app.logger.info(f"Search {search_id} ran out of time")
+            search_state.fail(search_id, OUT_OF_TIME)
+        except SearchCancelled:
+            current_app.logger.info(f"Search {search_id} stopped before completion")
+        except QuotaExceeded:
+            current_app.logger.info(f"Search {search_id} has no cached results and no credits left")
+            search_state.fail(search_id, quotas.EXHAUSTED)
+        except RateLimitExceeded:
+            search_state.fail(search_id, "Rate limit exceeded. Please try again tomorrow.")
+        except AuthenticationError:
+            search_state.fail(search_id, "API authentication failed. Please check your API key.")
+        except Exception as e:
+            error_msg = str(e)
+            current_app.logger.error(f"Search error: {error_msg}")
+            current_app.logger.exception("Full traceback:")
+            try:
+                search_state.fail(search_id, error_msg)
+            except Exception as store_error:
+                current_app.logger.error(f"Failed to store search error: {str(store_error)}")
+
+def expected_duration(params, job):
+    """Predicted run time of a search job, so the scheduler can run short ones first"""
+    website = params['website']
+    ranking_type = params.get('ranking_type', 'relevance')
+    prefetch = current_app.config.get('ENRICHMENT_PREFETCH', PREFETCH)
+    if job.stage == ENRICH_STAGE:
+        return latency_model.predict(website, ranking_type, prefetch=prefetch, basic=False)
+    # Searches answered from the cache make no API calls
+    entry = cache_index.get(search_cache_key(website, params['query'], detailed=False))
+    cached = params.get('cache_only') or (entry is not None and (entry['expires_at'] or float('inf')) > time.time())
+    return latency_model.predict(website, ranking_type, cached=cached, prefetch=prefetch)
+
+def queue_search(search_id, params, job, user_id=None):
+    """Hand a search to the scheduler, checkpointing it if the worker shuts down first"""
+    app = current_app._get_current_object()
+    scheduler.submit(
+        functools.partial(run_search, app, search_id, params, job, user_id),
+        owner=job.owner, priority=job.priority, website=params['website'],
+        checkpoint=job.checkpoint, expected_seconds=expected_duration(params, job)
+    )
+
+def resume_interrupted_searches(app):
+    """Resume searches checkpointed by a worker that shut down.
+
+    Called from gunicorn's post_worker_init hook, so a fresh worker picks
+    them up as soon as it boots rather than on the first request it serves.
+    """
+    with app.app_context():
+        try:
+            for search_id, params, checkpoint in search_state.claim_interrupted():
+                job = SearchJob.from_checkpoint(search_id, checkpoint)
+                queue_search(search_id, params, job, job.user_id)
+                current_app.logger.info(f"Resumed interrupted search {search_id}")
+        except Exception as e:
+            current_app.logger.error(f"Failed to resume interrupted searches: {str(e)}")
+
+@bp.route('/search', methods=['POST'])
+@admission.limit('search', shed=True)
+def search():
+    website = request.form.get('website')
+    query = request.form.get('query')
+    ranking_type = request.form.get('ranking_type', 'relevance')
+    mode = request.form.get('mode', 'thorough')
+    if mode not in SEARCH_MODES:
+        mode = 'thorough'
+    
+    # The whole pipeline has to finish within the mode's budget
+    deadline = time.time() + current_app.config.get(SEARCH_MODES[mode], 480)
+    
+    # A new search replaces whatever this session was still waiting for
+    previous_id = session.get('search_id')
+    if previous_id:
+        search_state.cancel(previous_id, 'Replaced by a newer search')
+    
+    # Generate a unique search ID
+    search_id = str(uuid.uuid4())
+    session['search_id'] = search_id
+    
+    owner = search_owner()
+    priority = search_priority()
+    cache_only = not quotas.allowed(owner, priority)
+    if cache_only:
+        flash("You have used up your search credits for now, so only cached results will be shown.", "warning")
+    
+    # Store search parameters
+    search_data = {
+        'website': website,
+        'query': query,
+        'ranking_type': ranking_type,
+        'mode': mode,
+        'cache_only': cache_only
+    }
+    try:
+        search_state.create(search_id, search_data)
+    except Exception as e:
+        current_app.logger.error(f"Failed to store search parameters: {str(e)}")
+        flash("Failed to initialize search. Please try again.", "error")
+        return redirect(url_for('main.index'))
+    
+    # The background thread has no request context of its own
+    user_id = current_user.id if current_user.is_authenticated else None
+    job = SearchJob(search_id, deadline, owner=owner, priority=priority, user_id=user_id)
+    job.progress = StageProgress(search_id, website, ranking_type)
+    job.report(QUEUED)
     
-    # Start the thread
+    # Queue the search; the scheduler shares workers fairly between clients
     try:
-        thread = Thread(target=do_search)
-        thread.start()
-        current_app.logger.info(f"Started background search thread for ID: {search_id}")
+        queue_search(search_id, search_data, job, user_id)
+        current_app.logger.info(f"Queued background search for ID: {search_id}")
     except Exception as e:
-        current_app.logger.error(f"Failed to start search thread: {str(e)}")
+        current_app.logger.error(f"Failed to queue search: {str(e)}")
+        search_state.fail(search_id, "Failed to start search")
         flash("Failed to start search. Please try again.", "error")
         return redirect(url_for('main.index'))
     
@@ -134,13 +324,17 @@ def search():
 
 @bp.route('/results/<search_id>')
 def results(search_id):
-    # Get search parameters and results from cache
-    search_params = cache.get(f'search_params_{search_id}')
-    search_results = cache.get(f'search_result_{search_id}')
+    # Get search parameters and results from the shared store
+    state = search_state.get(search_id)
+    search_params = state['params'] if state else None
+    search_results = state['result'] if state else None
     
-    if not search_params or not search_results:
+    if not search_params or search_results is None:
         flash('Search results not found or expired. Please try a new search.', 'warning')
         return redirect(url_for('main.index'))
+    if not search_results:
+        flash('No results were found for this search. Please try a different query.', 'warning')
+        return redirect(url_for('main.index'))
     
     # Check for errors in the results
     if isinstance(search_results, dict) and 'error' in search_results:
@@ -148,7 +342,7 @@ def results(search_id):
         return redirect(url_for('main.index'))
     
     current_app.logger.info(f"Displaying results for search_id: {search_id}")
-    current_app.logger.debug(f"Results data: {json.dumps(search_results, indent=2)}")
+    current_app.logger.debug(f"Results data: {json.dumps(search_results, indent=2, default=json_default)}")
     
     return render_template(
         'main/results.html',
@@ -156,9 +350,50 @@ def results(search_id):
         website=search_params['website'],
         query=search_params['query'],
         ranking_type=search_params.get('ranking_type', 'relevance'),
-        results=search_results
+        results=search_results,
+        search_id=search_id,
+        enriching=state['state'] == ENRICHING,
+        prefetch=current_app.config.get('ENRICHMENT_PREFETCH', 2)
     )
 
+@bp.route('/results/<search_id>/details')
+def result_details(search_id):
+    """Enriched results for a results page that is still filling in"""
+    # The results page polls while enrichment runs, which keeps it alive
+    search_state.heartbeat(search_id)
+    state = search_state.get(search_id)
+    if state is None:
+        return jsonify({'error': 'Search not found or expired'}), 404
+    
+    return jsonify({
+        'complete': state['state'] != ENRICHING,
+        'results': [r for r in state['result'] or [] if r.enriched and r.url]
+    })
+
+@bp.route('/results/<search_id>/enrich', methods=['POST'])
+@admission.limit('enrich')
+def enrich_result_details(search_id):
+    """Comment analysis for one result, requested when its card is opened or viewed"""
+    url = (request.get_json(silent=True) or {}).get('url') or request.form.get('url')
+    if not url:
+        return jsonify({'error': 'Missing result URL'}), 400
+    
+    owner = search_owner()
+    priority = search_priority()
+    user_id = current_user.id if current_user.is_authenticated else None
+    try:
+        result = enrich_one(search_id, url, owner=owner, priority=priority, user_id=user_id)
+    except EnrichmentBusy:
+        raise ServiceUnavailable("Comment analysis is busy right now. Please try again shortly.",
+                                 retry_after=ENRICH_RETRY_AFTER)
+    except DeadlineExceeded:
+        return jsonify({'error': 'Comment analysis took too long', 'retry_after': ENRICH_RETRY_AFTER}), 504
+    if result is None:
+        return jsonify({'error': 'Result not found or expired'}), 404
+    if not result.enriched:
+        return jsonify({'error': 'Search credits used up', 'result': result}), 429
+    return jsonify({'result': result})
+
 @bp.route('/search_history')
 @login_required
 def search_history():
@@ -182,37 +417,80 @@ def api_usage():
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get the API manager and usage stats
-    api_manager = FirecrawlAPIManager(current_app.config.get('FIRECRAWL_API_KEY'))
-    
-    # Get usage history from database
-    usage_history = UserSearchHistory.query.order_by(UserSearchHistory.created_at.desc()).limit(30).all()
-    
-    # Format for chart display
-    dates = [entry.created_at.strftime('%Y-%m-%d') for entry in usage_history]
-    counts = [entry.count() for entry in usage_history]
+    # Credits are counted in the database, so every worker reports the same usage
+    totals = quotas.daily_totals(30)
+    today = quotas.next_reset() - timedelta(days=1)
+    daily_requests = next((credits for day, credits in totals if day == today), 0)
+    daily_limit = current_app.config.get('FIRECRAWL_DAILY_LIMIT', 100)
     
     return render_template(
         'admin/api_usage.html',
         title='API Usage Dashboard',
-        daily_requests=api_manager.daily_requests,
-        daily_limit=api_manager.daily_limit,
-        percentage_used=(api_manager.daily_requests / api_manager.daily_limit) * 100,
-        reset_time=api_manager.daily_reset_time.strftime('%Y-%m-%d %H:%M:%S'),
-        history_dates=dates,
-        history_counts=counts
+        daily_requests=daily_requests,
+        daily_limit=daily_limit,
+        percentage_used=(daily_requests / daily_limit) * 100 if daily_limit else 0,
+        reset_time=quotas.next_reset().strftime('%Y-%m-%d %H:%M:%S UTC'),
+        history_dates=[day.strftime('%Y-%m-%d') for day, _ in totals],
+        history_counts=[credits for _, credits in totals],
+        top_owners=quotas.top_owners()
     )
 
+@bp.route('/admin/cache', methods=['GET'])
+@login_required
+def cache_inspector():
+    """Display the largest and most-hit cache entries"""
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    tag_counts = cache_index.tag_counts()
+    return render_template(
+        'admin/cache.html',
+        title='Cache Inspector',
+        stats=cache_index.stats(),
+        largest=cache_index.largest(),
+        most_hit=cache_index.most_hit(),
+        tags=sorted(tag_counts.items(), key=lambda item: item[1]['size'], reverse=True)
+    )
+
+@bp.route('/admin/cache/invalidate', methods=['POST'])
+@login_required
+def invalidate_cache():
+    """Invalidate every cache entry carrying a tag"""
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    tag = (request.form.get('tag') or '').strip()
+    if not tag:
+        flash('Please provide a tag to invalidate.', 'warning')
+        return redirect(url_for('main.cache_inspector'))
+    
+    removed = cache_index.invalidate_tag(tag)
+    current_app.logger.info(f"Admin {current_user.id} invalidated {removed} cache entries tagged {tag}")
+    flash(f'Removed {removed} cache entries tagged "{tag}".', 'success')
+    return redirect(url_for('main.cache_inspector'))
+
 @bp.route('/api-error/rate-limit')
 def api_rate_limit_error():
     """Display the API rate limit error page"""
-    api_manager = FirecrawlAPIManager(current_app.config.get('FIRECRAWL_API_KEY'))
+    api_manager = FirecrawlAPIManager()
     return render_template(
         'errors/api_limit.html',
         title='API Limit Reached',
         reset_time=api_manager.daily_reset_time.strftime('%Y-%m-%d %H:%M:%S')
     )
 
+@bp.route('/api-error/quota')
+def quota_exceeded():
+    """Explain that a search needs credits the user or session has used up"""
+    return render_template(
+        'errors/quota.html',
+        title='Search Credits Used Up',
+        credits=quotas.summary(search_owner(), search_priority()),
+        reset_time=quotas.next_reset().strftime('%Y-%m-%d %H:%M UTC')
+    )
+
 @bp.route('/api-error')
 def api_error():
     """Display a generic API error page"""
@@ -1,6 +1,7 @@
 from app.models.user import User
 from app.models.search import UserSearchHistory
-from app.models.search import SearchResult, SearchCache
+from app.models.search import SearchResult, ResultSet, SearchCache
+from app.models.usage import CreditUsage
 from app.models.db import db
 
-__all__ = ['User', 'UserSearchHistory', 'SearchResult', 'SearchCache', 'db']
+__all__ = ['User', 'UserSearchHistory', 'SearchResult', 'ResultSet', 'SearchCache', 'CreditUsage', 'db']
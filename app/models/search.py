@@ -1,7 +1,16 @@
 from datetime import datetime
+from operator import attrgetter
 from app.extensions import db
-from dataclasses import dataclass
-from typing import List, Optional
+
+# Fields of a search result, in the order they are stored
+RESULT_FIELDS = ('rank', 'title', 'url', 'summary', 'big_difference', 'key_takeaways', 'pros', 'cons',
+                 'tips_and_tricks', 'image_url', 'rating', 'review_count', 'published', 'enriched')
+LIST_FIELDS = frozenset(('key_takeaways', 'pros', 'cons', 'tips_and_tricks'))
+_NONE_DEFAULTS = {'rank': None, 'rating': None, 'review_count': None, 'published': None, 'enriched': False}
+DEFAULTS = tuple([] if field in LIST_FIELDS else _NONE_DEFAULTS.get(field, '')
+                 for field in RESULT_FIELDS)
+EXTRA = 'extra'  # Column of keys outside RESULT_FIELDS
+_FIELD_SET = frozenset(RESULT_FIELDS)
 
 class SearchCache(db.Model):
     """Model for caching search results"""
@@ -29,62 +38,172 @@ class UserSearchHistory(db.Model):
     def __repr__(self):
         return f'<UserSearchHistory {self.website}:{self.search_query}>'
 
-@dataclass
 class SearchResult:
-    """Data class for search results"""
-    title: str
-    url: str
-    rating: Optional[float] = None
-    image_url: Optional[str] = None
-    summary: Optional[str] = None
-    pros: List[str] = None
-    cons: List[str] = None
-    tips: List[str] = None
-    
-    def __post_init__(self):
-        if self.pros is None:
-            self.pros = []
-        if self.cons is None:
-            self.cons = []
-        if self.tips is None:
-            self.tips = []
-
-    def to_dict(self):
-        """Convert the search result to a dictionary"""
-        return {
-            'title': self.title,
-            'url': self.url,
-            'rating': self.rating,
-            'image_url': self.image_url,
-            'summary': self.summary,
-            'pros': self.pros,
-            'cons': self.cons,
-            'tips': self.tips
-        }
+    """A single search result, the shape every part of the app passes around.
 
-    @classmethod
-    def from_dict(cls, data):
-        """Create a SearchResult instance from a dictionary"""
-        return cls(
-            title=data.get('title'),
-            url=data.get('url'),
-            rating=data.get('rating'),
-            image_url=data.get('image_url'),
-            summary=data.get('summary'),
-            pros=data.get('pros', []),
-            cons=data.get('cons', []),
-            tips=data.get('tips', [])
-        )
+    Slotted, so a result costs a fraction of the dict it replaces and field
+    access is a plain attribute read. It also reads and writes like a dict
+    (``get``, ``[]``, ``in``, ``keys``), so code and data written against
+    dicts keep working. Keys outside RESULT_FIELDS are kept in ``extra``.
+    """
+    __slots__ = RESULT_FIELDS + (EXTRA,)
 
-class SearchResult:
-    """Model for storing search results"""
-    
-    def __init__(self, title, url, rating=None, image_url=None, summary=None, pros=None, cons=None, tips=None):
+    def __init__(self, title='', url='', rating=None, image_url='', summary='', pros=None, cons=None,
+                 tips_and_tricks=None, key_takeaways=None, big_difference='', rank=None, enriched=False,
+                 extra=None, tips=None, review_count=None, published=None):
+        self.rank = rank
         self.title = title
         self.url = url
-        self.rating = rating
-        self.image_url = image_url
         self.summary = summary
-        self.pros = pros or []
-        self.cons = cons or []
-        self.tips = tips or []
\ No newline at end of file
+        self.big_difference = big_difference
+        self.key_takeaways = [] if key_takeaways is None else key_takeaways
+        self.pros = [] if pros is None else pros
+        self.cons = [] if cons is None else cons
+        if tips_and_tricks is None:
+            tips_and_tricks = [] if tips is None else tips
+        self.tips_and_tricks = tips_and_tricks
+        self.image_url = image_url
+        self.rating = rating
+        self.review_count = review_count
+        self.published = published  # Unix time
+        self.enriched = enriched
+        self.extra = extra or None
+
+    @property
+    def tips(self):
+        """Former name of tips_and_tricks"""
+        return self.tips_and_tricks
+
+    @tips.setter
+    def tips(self, value):
+        self.tips_and_tricks = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a SearchResult from a result dict"""
+        result = cls.__new__(cls)
+        for field, default in zip(RESULT_FIELDS, DEFAULTS):
+            setattr(result, field, data.get(field, [] if default == [] else default))
+        result.extra = {k: v for k, v in data.items() if k not in _FIELD_SET} or None
+        return result
+
+    @classmethod
+    def coerce(cls, value):
+        """The value itself if it is a SearchResult, else one built from a dict"""
+        return value if isinstance(value, cls) else cls.from_dict(value)
+
+    def to_dict(self):
+        """The result as a dict of the fields that differ from their defaults"""
+        data = {}
+        for field, default in zip(RESULT_FIELDS, DEFAULTS):
+            value = getattr(self, field)
+            if value != default:
+                data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def copy(self, **changes):
+        """A shallow copy with some fields replaced"""
+        result = SearchResult.__new__(SearchResult)
+        for field in RESULT_FIELDS:
+            setattr(result, field, getattr(self, field))
+        result.extra = dict(self.extra) if self.extra else None
+        for key, value in changes.items():
+            result[key] = value
+        return result
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        return self.extra.get(key, default) if self.extra else default
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            self.extra = dict(self.extra or (), **{key: value})
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            other = SearchResult.from_dict(other)
+        if not isinstance(other, SearchResult):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'<SearchResult {self.rank}:{self.title}>'
+
+class ResultSet(list):
+    """Search results in rank order.
+
+    A list of SearchResult records that hands out whole fields as columns,
+    and is stored column by column: each field once per set instead of once
+    per result, and fields no result sets are left out altogether.
+    """
+
+    @classmethod
+    def coerce(cls, results):
+        """The results themselves if they are a ResultSet, else a ResultSet of them"""
+        if isinstance(results, cls):
+            return results
+        return cls(SearchResult.coerce(result) for result in results)
+
+    def column(self, field):
+        """The values of one field, in rank order"""
+        if field in _FIELD_SET:
+            return list(map(attrgetter(field), self))
+        return [result.get(field) for result in self]
+
+    def to_columns(self):
+        """The set as a dict of columns, without the columns that hold only defaults"""
+        columns = {}
+        for field, default in zip(RESULT_FIELDS, DEFAULTS):
+            values = list(map(attrgetter(field), self))
+            if any(value != default for value in values):
+                columns[field] = values
+        extras = [result.extra for result in self]
+        if any(extras):
+            columns[EXTRA] = extras
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns, size):
+        """Rebuild a set of size results from to_columns output"""
+        results = cls(SearchResult.__new__(SearchResult) for _ in range(size))
+        for field, default in zip(RESULT_FIELDS + (EXTRA,), DEFAULTS + (None,)):
+            values = columns.get(field)
+            if values is not None:
+                for result, value in zip(results, values):
+                    setattr(result, field, value)
+            elif default == []:
+                for result in results:
+                    setattr(result, field, [])
+            else:
+                for result in results:
+                    setattr(result, field, default)
+        return results
+
+    def to_dicts(self):
+        return [result.to_dict() for result in self]
+
+def json_default(value):
+    """``default`` hook for json.dumps that serializes search results"""
+    if isinstance(value, SearchResult):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
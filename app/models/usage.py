@@ -0,0 +1,22 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class CreditUsage(db.Model):
+    """Firecrawl credits spent by one user or anonymous session per time window
+
+    One row per owner and window (the current day, and the current hour for
+    burst limits), incremented in place rather than logging every call.
+    """
+    __table_args__ = (db.UniqueConstraint('owner', 'window', 'window_start'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(64), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    window = db.Column(db.String(8), nullable=False)  # 'day' or 'hour'
+    window_start = db.Column(db.DateTime, nullable=False, index=True)
+    credits = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CreditUsage {self.owner} {self.window} {self.window_start}: {self.credits}>'
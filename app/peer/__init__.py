@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint('peer', __name__)
+
+from app.peer import routes
@@ -0,0 +1,42 @@
+from flask import request, abort, Response
+from app.peer import bp
+from app.services import peer_cache
+from app.services.cache_codec import decode_portable, PortableError
+
+@bp.before_request
+def check_peer():
+    """Only configured peers carrying the shared secret may use these endpoints"""
+    if not peer_cache.enabled():
+        abort(404)
+    if not peer_cache.authorized(request):
+        abort(403)
+
+@bp.route('/cache/<path:key>', methods=['GET'])
+def get_entry(key):
+    """Serve a cache entry to a peer in the portable encoding (local cache only, never forwarded)"""
+    blob, ttl, tags = peer_cache.local_entry(key)
+    if blob is None:
+        abort(404)
+    response = Response(blob, mimetype='application/octet-stream')
+    if ttl:
+        response.headers[peer_cache.TTL_HEADER] = str(ttl)
+    if tags:
+        response.headers[peer_cache.TAGS_HEADER] = ','.join(tags)
+    return response
+
+@bp.route('/cache/<path:key>', methods=['PUT'])
+def put_entry(key):
+    """Store a cache entry pushed by a peer in the portable encoding"""
+    if (request.content_length or 0) > peer_cache.PEER_MAX_BYTES:
+        abort(413)
+    blob = request.get_data()
+    if not blob:
+        abort(400)
+    try:
+        value = decode_portable(blob, peer_cache.PEER_MAX_BYTES)
+    except PortableError:
+        abort(400)
+    ttl = request.headers.get(peer_cache.TTL_HEADER, type=int)
+    tags = [t for t in request.headers.get(peer_cache.TAGS_HEADER, '').split(',') if t]
+    peer_cache.store_local(key, value, timeout=ttl, tags=tags)
+    return '', 204
@@ -9,6 +9,12 @@ def register_blueprints(app: Flask) -> None:
     """
     from app.main import bp as main_bp
     from app.auth import bp as auth_bp
+    from app.peer import bp as peer_bp
+    from app.errors import bp as errors_bp
+    from app.health import bp as health_bp
     
     app.register_blueprint(main_bp)
-    app.register_blueprint(auth_bp, url_prefix='/auth') 
\ No newline at end of file
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(peer_bp, url_prefix='/peer')
+    app.register_blueprint(errors_bp)
+    app.register_blueprint(health_bp) 
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Cache TTLs learned from how fast each site's results change.
+
+Every time a search is refreshed we compare the new result set with a small
+fingerprint of the previous one for the same website and query. The share of
+results that changed, divided by the time between the two fetches, gives a
+churn rate. An exponentially weighted average of that rate per website and
+query class picks a TTL so that roughly ``CACHE_TTL_TARGET_CHURN`` of the
+results will have changed by the time an entry expires, clamped to the
+configured bounds. Stable sites get long TTLs (fewer credits), volatile ones
+stay fresh.
+"""
+import hashlib
+import logging
+import time
+
+from flask import current_app
+
+from app.models.search import SearchResult
+from app.services.cache_codec import cache_get, cache_set
+from app.services.cache_index import canonical_query, search_tags, website_tag
+
+logger = logging.getLogger('adaptive_ttl')
+
+TTL_MIN = 3600  # 1 hour
+TTL_MAX = 14 * 86400  # 2 weeks
+TTL_DEFAULT = 86400  # Used until a site has been refreshed at least once
+TARGET_CHURN = 0.2  # Share of results allowed to change before expiry
+EWMA_ALPHA = 0.3
+MIN_CLASS_SAMPLES = 3  # Fall back to the website-wide rate below this
+FINGERPRINT_SIZE = 10
+
+
+def query_class(query):
+    """Bucket a query as a broad head query or a specific long-tail query.
+
+    Long-tail queries match fewer items, so their result sets churn
+    differently from broad ones on the same site.
+    """
+    return 'head' if len(canonical_query(query).split()) <= 2 else 'tail'
+
+
+def fingerprint(results):
+    """Identities of the top results, in order"""
+    identities = []
+    for item in results[:FINGERPRINT_SIZE]:
+        if isinstance(item, (dict, SearchResult)):
+            identities.append(item.get('url') or item.get('title') or '')
+    return identities
+
+
+def churn(previous, current):
+    """Fraction of change between two fingerprints (0 identical, 1 disjoint).
+
+    Averages membership change (Jaccard distance) with the share of
+    positions holding a different item.
+    """
+    if not previous and not current:
+        return 0.0
+    old, new = set(previous), set(current)
+    union = old | new
+    membership = 1 - len(old & new) / len(union) if union else 0.0
+    length = max(len(previous), len(current))
+    moved = sum(1 for a, b in zip(previous, current) if a != b) + abs(len(previous) - len(current))
+    return (membership + moved / length) / 2
+
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+
+def _fingerprint_key(website, query):
+    digest = hashlib.md5(f"{website_tag(website)}|{canonical_query(query)}".encode()).hexdigest()
+    return f"ttl_fingerprint:{digest}"
+
+
+def _stats_key(website):
+    return f"ttl_stats:{website_tag(website)}"
+
+
+def _blend(previous, sample):
+    if previous is None:
+        return sample
+    return EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * previous
+
+
+def observe(website, query, results):
+    """Record a freshly fetched result set and update churn statistics"""
+    now = time.time()
+    current = fingerprint(results)
+    key = _fingerprint_key(website, query)
+    previous = cache_get(key)
+    max_ttl = _config('CACHE_TTL_MAX', TTL_MAX)
+    # Keep fingerprints well past any TTL so the next refresh can compare
+    cache_set(key, {'items': current, 'fetched_at': now}, timeout=max_ttl * 2,
+              tags=search_tags(website, query))
+
+    if not previous:
+        return None
+
+    elapsed_hours = max((now - previous['fetched_at']) / 3600, 1 / 60)
+    rate = churn(previous['items'], current) / elapsed_hours
+
+    stats = cache_get(_stats_key(website)) or {'site': None, 'site_samples': 0, 'classes': {}}
+    stats['site'] = _blend(stats['site'], rate)
+    stats['site_samples'] += 1
+    klass = stats['classes'].setdefault(query_class(query), {'rate': None, 'samples': 0})
+    klass['rate'] = _blend(klass['rate'], rate)
+    klass['samples'] += 1
+    cache_set(_stats_key(website), stats, timeout=0, tags=(website_tag(website),))
+
+    logger.info(f"Churn for {website} ({query_class(query)}): {rate:.4f}/hour")
+    return rate
+
+
+def churn_rate(website, query):
+    """Learned churn per hour for a website and query class, or None"""
+    stats = cache_get(_stats_key(website))
+    if not stats:
+        return None
+    klass = stats['classes'].get(query_class(query))
+    if klass and klass['samples'] >= MIN_CLASS_SAMPLES:
+        return klass['rate']
+    return stats['site']
+
+
+def ttl_for(website, query):
+    """TTL in seconds for a search result set"""
+    ttl_min = _config('CACHE_TTL_MIN', TTL_MIN)
+    ttl_max = _config('CACHE_TTL_MAX', TTL_MAX)
+    rate = churn_rate(website, query)
+    if rate is None:
+        ttl = _config('CACHE_DEFAULT_TIMEOUT', TTL_DEFAULT)
+    elif rate <= 0:
+        ttl = ttl_max
+    else:
+        ttl = _config('CACHE_TTL_TARGET_CHURN', TARGET_CHURN) / rate * 3600
+    return int(min(max(ttl, ttl_min), ttl_max))
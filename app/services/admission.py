@@ -0,0 +1,176 @@
+"""Admission control for the endpoints that start or watch searches.
+
+Every POST to ``/search`` queues paid background work, every result card
+in view asks for a paid analysis, and every open loading page polls
+``/check_search_status`` once a second. Before either
+runs, the client has to get past two checks:
+
+* Token buckets per client (the user, or the anonymous session) and per IP
+  address. The IP bucket is larger because several clients can share an
+  address, but it still stops a client that throws away its session cookie.
+  Polling gets a much larger allowance than starting searches.
+* Load shedding for new searches. When every search thread is busy and the
+  queue is deep, new searches are turned away with a 503 instead of waiting
+  behind work that is already late. Anonymous searches are turned away
+  first, so signed-in users keep their latency.
+
+Rejections carry a Retry-After header. Admins are never limited. Like the
+scheduler, the buckets live in the worker process.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+import uuid
+
+from flask import current_app, request, session
+from flask_login import current_user
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from app.services import scheduler
+
+logger = logging.getLogger('admission')
+
+# Per-client limits for each endpoint: setting and default for tokens per minute, then for burst
+LIMITS = {
+    'search': ('ADMISSION_SEARCH_PER_MINUTE', 6, 'ADMISSION_SEARCH_BURST', 3),
+    'status': ('ADMISSION_STATUS_PER_MINUTE', 120, 'ADMISSION_STATUS_BURST', 10),
+    'enrich': ('ADMISSION_ENRICH_PER_MINUTE', 20, 'ADMISSION_ENRICH_BURST', 5),
+}
+IP_FACTOR = 4  # An IP address gets this many clients' worth of tokens
+MAX_QUEUE = 16  # Queued searches per worker process before signed-in users are shed
+SHED_RETRY_AFTER = 30  # Seconds, when there is no job duration to go by
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Holds up to ``capacity`` tokens, refilled at ``rate`` per second"""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, now, cost=1):
+        """Seconds until ``cost`` tokens are available; 0 when they are now"""
+        self.refill(now)
+        if self.tokens >= cost:
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets by key, taken from all-or-nothing"""
+
+    def __init__(self, max_buckets=MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, per_minute, burst, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(per_minute / 60, burst, now)
+        return bucket
+
+    def _prune(self, now):
+        """Forget full buckets, which behave like new ones, then the idlest"""
+        for key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_buckets:
+            idle = sorted(self._buckets, key=lambda key: self._buckets[key].updated)
+            for key in idle[:len(idle) // 2]:
+                del self._buckets[key]
+
+    def hit(self, limits, now=None):
+        """Take one token from each bucket, or none if any is empty.
+
+        Args:
+            limits (list): (key, tokens per minute, burst) per bucket
+
+        Returns:
+            float: Seconds to wait before retrying, 0 when admitted
+        """
+        now = now or time.time()
+        with self._lock:
+            buckets = [self._bucket(key, per_minute, burst, now) for key, per_minute, burst in limits]
+            wait = max((bucket.wait(now) for bucket in buckets), default=0)
+            if wait == 0:
+                for bucket in buckets:
+                    bucket.tokens -= 1
+            return wait
+
+
+class AdmissionControl:
+    """Rate limits and load shedding applied to routes with ``limit``"""
+
+    def init_app(self, app):
+        app.extensions['admission'] = RateLimiter()
+
+    def _client(self):
+        if current_user.is_authenticated:
+            return f"user:{current_user.id}"
+        if 'client_id' not in session:
+            session['client_id'] = str(uuid.uuid4())
+        return f"session:{session['client_id']}"
+
+    def check_rate(self, name):
+        """Raise TooManyRequests when the caller is over its limit for ``name``"""
+        per_minute_setting, per_minute, burst_setting, burst = LIMITS[name]
+        per_minute = current_app.config.get(per_minute_setting, per_minute)
+        burst = current_app.config.get(burst_setting, burst)
+        ip_factor = current_app.config.get('ADMISSION_IP_FACTOR', IP_FACTOR)
+
+        client = self._client()
+        limits = [
+            (f"{name}:ip:{request.remote_addr}", per_minute * ip_factor, burst * ip_factor),
+            (f"{name}:{client}", per_minute, burst),
+        ]
+        wait = current_app.extensions['admission'].hit(limits)
+        if wait:
+            logger.info(f"Rate limited {client} ({request.remote_addr}) on {name}")
+            raise TooManyRequests("You are sending requests too quickly. Please wait a moment.",
+                                  retry_after=math.ceil(wait))
+
+    def check_load(self):
+        """Raise ServiceUnavailable when the search queue is too deep to join"""
+        stats = scheduler.scheduler.stats()
+        if stats['utilization'] < 1:
+            return
+        max_queue = current_app.config.get('ADMISSION_MAX_QUEUE', MAX_QUEUE)
+        if not current_user.is_authenticated:
+            max_queue //= 2
+        if stats['pending'] < max_queue:
+            return
+
+        # Roughly how long the queue ahead takes to drain
+        retry_after = stats['estimated_wait'] or SHED_RETRY_AFTER
+        logger.warning(f"Shedding search: {stats['pending']} queued, {stats['running']} running")
+        raise ServiceUnavailable("We are handling a lot of searches right now. Please try again shortly.",
+                                 retry_after=min(max(math.ceil(retry_after), 5), 300))
+
+    def limit(self, name, shed=False):
+        """Decorate a route to apply the ``name`` rate limit, and shedding if ``shed``"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                if not (current_user.is_authenticated and current_user.is_admin):
+                    self.check_rate(name)
+                    if shed:
+                        self.check_load()
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+
+admission = AdmissionControl()
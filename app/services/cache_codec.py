@@ -0,0 +1,248 @@
+"""Compact binary encoding for cached values.
+
+Cached result sets are lists of search results. Before a value reaches
+Flask-Caching we store them as columns (see ``ResultSet.to_columns``), and
+other lists of same-shaped dicts as a single key tuple plus one value tuple
+per item, then serialize with ``marshal`` and zlib-compress anything above a
+size threshold. Values marshal cannot handle
+fall back to pickle so every cache write can go through this module.
+
+That format is for the in-process cache only: marshal changes between
+Python versions and, like pickle, must never read untrusted bytes.
+Anything written to disk or sent to another instance uses the portable
+encoding instead, versioned JSON of the same columns, which only ever
+decodes to plain data.
+"""
+import json
+import logging
+import marshal
+import pickle
+import zlib
+
+from flask import current_app, has_app_context
+
+from app.extensions import cache
+from app.models.search import SearchResult, ResultSet
+from app.services.cache_index import cache_index
+
+logger = logging.getLogger('cache_codec')
+
+COMPRESS_THRESHOLD = 1024  # Compress encoded values larger than 1KB
+COMPRESS_LEVEL = 6
+
+# One-byte format header
+FORMAT_MARSHAL = b'\x01'
+FORMAT_MARSHAL_ZLIB = b'\x02'
+FORMAT_PICKLE = b'\x03'
+FORMAT_PICKLE_ZLIB = b'\x04'
+FORMATS = (FORMAT_MARSHAL, FORMAT_MARSHAL_ZLIB, FORMAT_PICKLE, FORMAT_PICKLE_ZLIB)
+
+# Tags for packed containers; JSON-shaped data never contains tuples
+RECORDS_TAG = 'r'
+TUPLE_TAG = 't'
+RESULTS_TAG = 's'
+RESULT_TAG = 'o'
+
+# Portable encoding: magic, version byte, compression flag byte, JSON body
+PORTABLE_MAGIC = b'THEJ'
+PORTABLE_VERSION = 1
+PORTABLE_MAX_BYTES = 64 * 1024 * 1024  # Decompressed size accepted by decode_portable
+CODEC_KEY = '__codec__'  # Marks packed containers in portable data
+
+
+class PortableError(ValueError):
+    """Raised when a value cannot be written in, or read from, the portable encoding"""
+    pass
+
+
+def _pack(value):
+    """Rewrite search results as columns and lists of same-shaped dicts as (tag, keys, rows)"""
+    if isinstance(value, SearchResult):
+        return (RESULT_TAG, value.to_dict())
+    if isinstance(value, list):
+        if value and all(isinstance(item, SearchResult) for item in value):
+            return (RESULTS_TAG, len(value), ResultSet.to_columns(value))
+        if len(value) > 1 and all(type(item) is dict for item in value):
+            keys = tuple(value[0])
+            key_set = set(keys)
+            if all(item.keys() == key_set for item in value):
+                rows = [tuple(_pack(item[k]) for k in keys) for item in value]
+                return (RECORDS_TAG, keys, rows)
+        return [_pack(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return (TUPLE_TAG, [_pack(item) for item in value])
+    return value
+
+
+def _unpack(value):
+    """Reverse _pack"""
+    if isinstance(value, tuple):
+        if value[0] == RECORDS_TAG:
+            keys = value[1]
+            return [{k: _unpack(v) for k, v in zip(keys, row)} for row in value[2]]
+        if value[0] == RESULTS_TAG:
+            return ResultSet.from_columns(value[2], value[1])
+        if value[0] == RESULT_TAG:
+            return SearchResult.from_dict(value[1])
+        return tuple(_unpack(item) for item in value[1])
+    if isinstance(value, list):
+        return [_unpack(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _unpack(v) for k, v in value.items()}
+    return value
+
+
+def _threshold():
+    if has_app_context():
+        return current_app.config.get('CACHE_COMPRESS_THRESHOLD', COMPRESS_THRESHOLD)
+    return COMPRESS_THRESHOLD
+
+
+def encode(value):
+    """Encode a value into the compact binary cache format"""
+    try:
+        body = marshal.dumps(_pack(value))
+        plain, compressed = FORMAT_MARSHAL, FORMAT_MARSHAL_ZLIB
+    except ValueError:
+        # Objects marshal cannot represent (models, datetimes, ...)
+        body = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        plain, compressed = FORMAT_PICKLE, FORMAT_PICKLE_ZLIB
+
+    if len(body) > _threshold():
+        return compressed + zlib.compress(body, COMPRESS_LEVEL)
+    return plain + body
+
+
+def decode(blob):
+    """Decode a value written by encode.
+
+    Values that were cached before the codec existed are returned unchanged.
+    """
+    if not isinstance(blob, bytes) or blob[:1] not in FORMATS:
+        return blob
+
+    header, body = blob[:1], blob[1:]
+    if header in (FORMAT_MARSHAL_ZLIB, FORMAT_PICKLE_ZLIB):
+        body = zlib.decompress(body)
+    if header in (FORMAT_MARSHAL, FORMAT_MARSHAL_ZLIB):
+        return _unpack(marshal.loads(body))
+    return pickle.loads(body)
+
+
+def to_portable(value):
+    """Rewrite a value as JSON-compatible data, result sets as columns.
+
+    Raises:
+        PortableError: For values plain JSON cannot carry (models, datetimes, ...)
+    """
+    if isinstance(value, SearchResult):
+        return {CODEC_KEY: RESULT_TAG, 'value': to_portable(value.to_dict())}
+    if isinstance(value, list):
+        if value and all(isinstance(item, SearchResult) for item in value):
+            return {CODEC_KEY: RESULTS_TAG, 'size': len(value),
+                    'columns': to_portable(ResultSet.to_columns(value))}
+        return [to_portable(item) for item in value]
+    if isinstance(value, tuple):
+        return {CODEC_KEY: TUPLE_TAG, 'items': [to_portable(item) for item in value]}
+    if isinstance(value, dict):
+        if CODEC_KEY in value or not all(isinstance(k, str) for k in value):
+            raise PortableError("Dict keys must be strings other than the codec marker")
+        return {k: to_portable(v) for k, v in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise PortableError(f"{type(value).__name__} values are not portable")
+
+
+def from_portable(data):
+    """Reverse to_portable"""
+    if isinstance(data, list):
+        return [from_portable(item) for item in data]
+    if isinstance(data, dict):
+        tag = data.get(CODEC_KEY)
+        if tag is None:
+            return {k: from_portable(v) for k, v in data.items()}
+        try:
+            if tag == RESULTS_TAG:
+                return ResultSet.from_columns(from_portable(data['columns']), int(data['size']))
+            if tag == RESULT_TAG:
+                return SearchResult.from_dict(from_portable(data['value']))
+            if tag == TUPLE_TAG:
+                return tuple(from_portable(item) for item in data['items'])
+        except (KeyError, TypeError, AttributeError) as e:
+            raise PortableError(f"Malformed {tag} container: {str(e)}")
+        raise PortableError(f"Unknown container {tag}")
+    return data
+
+
+def encode_portable(value):
+    """Encode a value for disk or the network.
+
+    Raises:
+        PortableError: When the value is not portable
+    """
+    body = json.dumps(to_portable(value), separators=(',', ':')).encode()
+    compressed = len(body) > _threshold()
+    if compressed:
+        body = zlib.compress(body, COMPRESS_LEVEL)
+    return PORTABLE_MAGIC + bytes([PORTABLE_VERSION, compressed]) + body
+
+
+def decode_portable(blob, max_bytes=PORTABLE_MAX_BYTES):
+    """Decode a value written by encode_portable, possibly by another instance.
+
+    Raises:
+        PortableError: For anything that is not a valid portable value of this
+            version, or that decompresses to more than max_bytes
+    """
+    header_size = len(PORTABLE_MAGIC) + 2
+    if not isinstance(blob, bytes) or len(blob) < header_size or not blob.startswith(PORTABLE_MAGIC):
+        raise PortableError("Not a portable cache value")
+    version, compressed = blob[len(PORTABLE_MAGIC)], blob[len(PORTABLE_MAGIC) + 1]
+    if version != PORTABLE_VERSION:
+        raise PortableError(f"Unsupported portable version {version}")
+    body = blob[header_size:]
+    try:
+        if compressed:
+            decompressor = zlib.decompressobj()
+            body = decompressor.decompress(body, max_bytes)
+            if decompressor.unconsumed_tail:
+                raise PortableError(f"Portable value larger than {max_bytes} bytes")
+        elif len(body) > max_bytes:
+            raise PortableError(f"Portable value larger than {max_bytes} bytes")
+        return from_portable(json.loads(body))
+    except (zlib.error, UnicodeDecodeError, RecursionError, json.JSONDecodeError) as e:
+        raise PortableError(f"Corrupt portable value: {str(e)}")
+
+
+def cache_set(key, value, timeout=None, tags=()):
+    """Encode and store a value in the application cache.
+
+    Tags are recorded in the cache index so the entry can later be purged
+    together with everything else for the same website, query or URL.
+    """
+    blob = encode(value)
+    stored = cache.set(key, blob, timeout=timeout)
+    cache_index.record_write(key, len(blob), tags, timeout)
+    return stored
+
+
+def cache_get(key):
+    """Fetch and decode a value from the application cache"""
+    blob = cache.get(key)
+    if blob is None:
+        cache_index.record_miss(key)
+        return None
+    cache_index.record_hit(key)
+    try:
+        return decode(blob)
+    except Exception as e:
+        logger.error(f"Failed to decode cache entry {key}: {str(e)}")
+        return None
+
+
+def cache_delete(key):
+    """Remove a value from the application cache"""
+    cache_index.record_delete(key)
+    return cache.delete(key)
@@ -0,0 +1,204 @@
+"""Tag index over the application cache.
+
+Flask-Caching's SimpleCache cannot enumerate its keys, so every write made
+through ``cache_codec.cache_set`` is recorded here together with its tags
+(website, canonical query, URL and schema version), encoded size and hit
+count. That lets us purge everything belonging to one website or page
+without a restart, and gives the admin cache inspector something to show.
+
+The index lives in the process, like SimpleCache itself.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from app.extensions import cache
+
+logger = logging.getLogger('cache_index')
+
+# Bump when the shape of cached values changes; stale entries can then be
+# purged with the schema tag instead of waiting for them to expire
+SCHEMA_VERSION = 1
+DEFAULT_TIMEOUT = 86400
+
+
+def canonical_query(query):
+    """Normalize a query so trivially different spellings share a tag"""
+    return ' '.join((query or '').lower().split())
+
+
+def website_tag(website):
+    website = (website or '').lower()
+    if website.startswith('www.'):
+        website = website[4:]
+    return f"website:{website}"
+
+
+def query_tag(query):
+    return f"query:{canonical_query(query)}"
+
+
+def url_tag(url):
+    return f"url:{url}"
+
+
+def schema_tag(version=SCHEMA_VERSION):
+    return f"schema:{version}"
+
+
+def search_tags(website, query):
+    """Tags for entries derived from one search"""
+    return (website_tag(website), query_tag(query))
+
+
+class CacheIndex:
+    """Thread-safe key metadata and tag-to-key index"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._tags = {}
+        self.hits = 0
+        self.misses = 0
+        self.version = 0  # Bumped on every write, lets snapshots skip idle periods
+
+    def _expires_at(self, timeout):
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+            if has_app_context():
+                timeout = current_app.config.get('CACHE_DEFAULT_TIMEOUT', DEFAULT_TIMEOUT)
+        return time.time() + timeout if timeout else None
+
+    def _drop(self, key):
+        """Remove a key from the index; caller holds the lock"""
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry['tags']:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+        return entry
+
+    def record_write(self, key, size, tags=(), timeout=None, volatile=False, hits=0):
+        """Register a cache write and its tags.
+
+        Volatile entries (values that only make sense in this process) can be
+        invalidated but are never written to snapshots.
+        """
+        tags = set(tags)
+        tags.add(schema_tag())
+        with self._lock:
+            previous = self._drop(key)
+            self.version += 1
+            self._entries[key] = {
+                'key': key,
+                'size': size,
+                'tags': tags,
+                'hits': previous['hits'] if previous else hits,
+                'volatile': volatile,
+                'created_at': time.time(),
+                'expires_at': self._expires_at(timeout),
+            }
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def record_hit(self, key):
+        with self._lock:
+            self.hits += 1
+            entry = self._entries.get(key)
+            if entry:
+                entry['hits'] += 1
+
+    def record_miss(self, key):
+        with self._lock:
+            self.misses += 1
+            self._drop(key)
+
+    def record_delete(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def get(self, key):
+        """Metadata for one key, or None when it is not indexed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry, tags=sorted(entry['tags'])) if entry else None
+
+    def keys_for_tag(self, tag):
+        with self._lock:
+            return set(self._tags.get(tag, ()))
+
+    def invalidate_tag(self, tag):
+        """Delete every cache entry carrying a tag.
+
+        Returns:
+            int: Number of entries removed
+        """
+        keys = self.keys_for_tag(tag)
+        for key in keys:
+            cache.delete(key)
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+        logger.info(f"Invalidated {len(keys)} cache entries tagged {tag}")
+        return len(keys)
+
+    def entries(self):
+        """Snapshot of live entries, pruning ones past their expiry"""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e['expires_at'] and e['expires_at'] <= now]
+            for key in expired:
+                self._drop(key)
+            return [dict(e, tags=sorted(e['tags'])) for e in self._entries.values()]
+
+    def largest(self, limit=20):
+        return sorted(self.entries(), key=lambda e: e['size'], reverse=True)[:limit]
+
+    def most_hit(self, limit=20):
+        return sorted(self.entries(), key=lambda e: e['hits'], reverse=True)[:limit]
+
+    def tag_counts(self):
+        """Number of keys and total bytes per tag"""
+        self.entries()
+        with self._lock:
+            return {
+                tag: {'keys': len(keys), 'size': sum(self._entries[k]['size'] for k in keys)}
+                for tag, keys in self._tags.items()
+            }
+
+    def lookups(self):
+        """Hit counters only, without walking the entries"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = self.entries()
+        return {
+            'entries': len(entries),
+            'size': sum(e['size'] for e in entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.hits = 0
+            self.misses = 0
+            self.version += 1
+
+
+cache_index = CacheIndex()
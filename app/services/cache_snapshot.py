@@ -0,0 +1,226 @@
+"""Cache snapshots that survive restarts, Fly auto-stop and worker recycling.
+
+The in-process cache starts empty every time a machine wakes up or gunicorn
+recycles a worker. Each worker periodically writes its hottest entries to a
+compact snapshot file on the data volume, and the first request a fresh
+process serves loads the snapshot back in. A snapshot is keys, values,
+expiry times and tags in the codec's portable encoding, so it survives
+Python upgrades and loading one never runs marshal or pickle on the file.
+Values that are not portable are left out.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+
+from flask import current_app
+
+from app.extensions import cache
+from app.services.cache_codec import decode, encode, to_portable, from_portable, PortableError
+from app.services.cache_index import cache_index
+
+logger = logging.getLogger('cache_snapshot')
+
+SNAPSHOT_MAGIC = b'THE1SNAP'
+SNAPSHOT_VERSION = 2  # 1 held marshalled blobs
+SNAPSHOT_INTERVAL = 300  # Seconds between periodic snapshots
+SNAPSHOT_MAX_BYTES = 32 * 1024 * 1024  # Only the hottest entries up to 32MB
+
+_state = {'pid': None, 'writer': None}
+_state_lock = threading.Lock()
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file cannot be read"""
+    pass
+
+
+def snapshot_path(app=None):
+    """Configured snapshot location, or None when snapshots are disabled"""
+    config = (app or current_app).config
+    if 'CACHE_SNAPSHOT_PATH' in config:
+        return config['CACHE_SNAPSHOT_PATH']
+    return os.path.join(os.path.dirname(config.get('SQLITE_DB', '')), 'cache_snapshot.bin')
+
+
+def _collect_entries(max_bytes):
+    """Hottest live, non-volatile entries that fit in max_bytes"""
+    entries = []
+    total = 0
+    candidates = sorted(cache_index.entries(), key=lambda e: (e['hits'], e['created_at']), reverse=True)
+    for meta in candidates:
+        if meta['volatile'] or total + meta['size'] > max_bytes:
+            continue
+        blob = cache.get(meta['key'])
+        if not isinstance(blob, bytes):
+            continue
+        try:
+            value = to_portable(decode(blob))
+        except PortableError:
+            continue
+        entries.append([meta['key'], value, meta['expires_at'], list(meta['tags']), meta['hits']])
+        total += len(blob)
+    return entries
+
+
+def save_snapshot(path):
+    """Write the hot cache to path atomically.
+
+    Returns:
+        int: Number of entries written
+    """
+    max_bytes = current_app.config.get('CACHE_SNAPSHOT_MAX_BYTES', SNAPSHOT_MAX_BYTES)
+    entries = _collect_entries(max_bytes)
+    body = zlib.compress(json.dumps(entries, separators=(',', ':')).encode(), 6)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + body)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote cache snapshot with {len(entries)} entries to {path}")
+    return len(entries)
+
+
+def read_snapshot(path):
+    """Read and validate a snapshot file.
+
+    Returns:
+        list: (key, value, expires_at, tags, hits) tuples
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_size = len(SNAPSHOT_MAGIC) + 1
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise SnapshotError(f"{path} is not a cache snapshot")
+    if data[len(SNAPSHOT_MAGIC)] != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {data[len(SNAPSHOT_MAGIC)]}")
+    try:
+        entries = json.loads(zlib.decompress(data[header_size:]))
+        return [(key, from_portable(value), expires_at, tuple(tags), hits)
+                for key, value, expires_at, tags, hits in entries]
+    except (ValueError, TypeError, RecursionError, zlib.error) as e:
+        raise SnapshotError(f"Corrupt cache snapshot {path}: {str(e)}")
+
+
+def load_snapshot(path):
+    """Load unexpired snapshot entries without overwriting newer values.
+
+    Returns:
+        int: Number of entries restored
+    """
+    now = time.time()
+    restored = 0
+    for key, value, expires_at, tags, hits in read_snapshot(path):
+        if expires_at is None:
+            timeout = 0
+        elif expires_at > now:
+            timeout = int(expires_at - now) or 1
+        else:
+            continue
+        blob = encode(value)
+        if cache.add(key, blob, timeout=timeout):
+            cache_index.record_write(key, len(blob), tags, timeout, hits=hits)
+            restored += 1
+    logger.info(f"Restored {restored} cache entries from {path}")
+    return restored
+
+
+class SnapshotWriter(threading.Thread):
+    """Daemon thread that snapshots the cache whenever it has changed"""
+
+    def __init__(self, app, path, interval):
+        super().__init__(name='cache-snapshot-writer', daemon=True)
+        self.app = app
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self._last_version = cache_index.version
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        if cache_index.version == self._last_version:
+            return
+        self._last_version = cache_index.version
+        with self.app.app_context():
+            try:
+                save_snapshot(self.path)
+            except OSError as e:
+                logger.error(f"Failed to write cache snapshot: {str(e)}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def ensure_started(app):
+    """Load the snapshot and start the writer once per process.
+
+    Runs lazily on the first request, so it happens after gunicorn forks a
+    worker rather than in the preloading master.
+    """
+    pid = os.getpid()
+    if _state['pid'] == pid:
+        return
+    with _state_lock:
+        if _state['pid'] == pid:
+            return
+        _state['pid'] = pid
+        path = snapshot_path(app)
+        if not path:
+            return
+        if os.path.exists(path):
+            try:
+                load_snapshot(path)
+            except (OSError, SnapshotError) as e:
+                logger.error(f"Failed to load cache snapshot: {str(e)}")
+        interval = app.config.get('CACHE_SNAPSHOT_INTERVAL', SNAPSHOT_INTERVAL)
+        if interval:
+            writer = SnapshotWriter(app, path, interval)
+            writer.start()
+            _state['writer'] = writer
+
+
+def save_on_exit(app):
+    """Flush a final snapshot when a worker shuts down"""
+    writer = _state.get('writer')
+    if writer is None or _state['pid'] != os.getpid():
+        return
+    writer.stop()
+    writer.flush()
+
+
+def init_snapshots(app):
+    """Register the lazy snapshot loader with the application"""
+    if not snapshot_path(app):
+        return
+
+    @app.before_request
+    def load_cache_snapshot():
+        ensure_started(app)
+
+
+def export_snapshot(source, destination):
+    """Validate a snapshot and copy it elsewhere (e.g. off the machine)"""
+    entries = read_snapshot(source)
+    shutil.copyfile(source, destination)
+    return len(entries)
+
+
+def import_snapshot(source, destination):
+    """Validate a snapshot and install it for the next process to load"""
+    entries = read_snapshot(source)
+    directory = os.path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{destination}.import.tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+    return len(entries)
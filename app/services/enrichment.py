@@ -0,0 +1,119 @@
+"""Second phase of a search: comment analysis per result.
+
+The loading page only waits for the cheap basic search. Comment analysis
+costs a paid extract per result page, so it is done lazily: the background
+thread speculatively enriches only the top ``ENRICHMENT_PREFETCH`` results,
+and every other card asks for its analysis when the user expands it or
+keeps it in view. Enriched results are written back into the shared result
+set one at a time, and the per-URL extraction cache means a page is only
+ever analyzed once however many searches show it.
+
+An on-demand analysis runs on the request thread that asked for it, so it
+gets a short deadline of its own, and only ``ENRICHMENT_MAX_ON_DEMAND`` of
+them run at once per worker; the rest are turned away and retried.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from app.models.search import ResultSet
+from app.services.firecrawl_service import FirecrawlAPIManager, apply_ranking, enrich_result
+from app.services.progress import ENRICHING, DONE
+from app.services.search_state import search_state, SearchJob, DeadlineExceeded, SearchCancelled
+
+logger = logging.getLogger('enrichment')
+
+PREFETCH = 2  # Results enriched before anyone asks for them
+ON_DEMAND_SECONDS = 30  # Time budget of one analysis a card asked for
+MAX_ON_DEMAND = 2  # On-demand analyses running at once per worker process
+
+_on_demand = {'running': 0}
+_on_demand_lock = threading.Lock()
+
+
+class EnrichmentBusy(Exception):
+    """Raised when the worker already runs as many on-demand analyses as it allows"""
+    pass
+
+
+def enrich_search(search_id, result_key, results, ranking_type="relevance", job=None, prefetch=None):
+    """Prefetch enrichment for the top results and complete the search.
+
+    Running out of time completes the search with whatever was enriched so
+    far; a cancelled search keeps its partial results but stays cancelled.
+
+    Returns:
+        list: The results, with the top ones enriched where possible
+    """
+    if prefetch is None:
+        prefetch = current_app.config.get('ENRICHMENT_PREFETCH', PREFETCH)
+    results = ResultSet(ResultSet.coerce(results))
+    pending = [index for index, result in enumerate(results[:prefetch])
+               if not result.enriched and result.url]
+    if job is not None:
+        job.report(ENRICHING, 0, len(pending))
+    api_manager = FirecrawlAPIManager()
+    try:
+        for done, index in enumerate(pending, 1):
+            result = results[index]
+            if job is not None:
+                job.check()
+            results[index] = enrich_result(result, job=job, api_manager=api_manager)
+            search_state.update_result(result_key, result.url, results[index])
+            if job is not None:
+                job.report(ENRICHING, done, len(pending))
+    except DeadlineExceeded:
+        logger.warning(f"Search {search_id} ran out of time during enrichment")
+    except SearchCancelled:
+        logger.info(f"Enrichment for search {search_id} cancelled")
+        return results
+
+    # Cards may have been enriched on demand meanwhile, and ratings can
+    # change with enrichment, so rank the latest stored set
+    results = search_state.load_results(result_key) or results
+    results = apply_ranking(results, ranking_type)
+    search_state.complete(search_id, results, result_key=result_key)
+    if job is not None:
+        job.report(DONE)
+    return results
+
+
+def enrich_one(search_id, url, owner=None, priority=None, user_id=None):
+    """Enrich a single result of a search on demand.
+
+    The extract is charged to ``owner``; over quota the result comes back
+    without the enriched flag.
+
+    Returns:
+        SearchResult: The enriched result, or None when the search or URL is unknown
+
+    Raises:
+        EnrichmentBusy: When too many on-demand analyses are already running
+        DeadlineExceeded: When the analysis outlasts ``ENRICHMENT_ON_DEMAND_SECONDS``
+    """
+    state = search_state.get(search_id)
+    if state is None or not state['result']:
+        return None
+    result = next((r for r in state['result'] if r.url == url), None)
+    if result is None or result.enriched:
+        return result
+
+    limit = current_app.config.get('ENRICHMENT_MAX_ON_DEMAND', MAX_ON_DEMAND)
+    with _on_demand_lock:
+        if _on_demand['running'] >= limit:
+            raise EnrichmentBusy(f"{limit} on-demand analyses already running")
+        _on_demand['running'] += 1
+    try:
+        deadline = time.time() + current_app.config.get('ENRICHMENT_ON_DEMAND_SECONDS', ON_DEMAND_SECONDS)
+        job = SearchJob(None, deadline=deadline, owner=owner, priority=priority, user_id=user_id)
+        enriched = enrich_result(result, job=job)
+    finally:
+        with _on_demand_lock:
+            _on_demand['running'] -= 1
+    if not enriched.enriched:
+        return enriched
+    search_state.update_result(state['result_key'], url, enriched)
+    logger.info(f"Enriched {url} on demand for search {search_id}")
+    return enriched
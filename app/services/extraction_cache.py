@@ -0,0 +1,242 @@
+"""Per-URL extraction cache shared across queries.
+
+Extracted records are keyed by canonical URL, so a popular page that shows
+up in many different result sets is only paid for once. Each entry keeps
+the HTTP validators (ETag, Last-Modified and a content hash) seen when it
+was stored. Once an entry goes stale we do a cheap conditional fetch of the
+page and only pay for a full LLM extract again if the page really changed.
+
+Validators for a freshly extracted page are captured in the background,
+off the search path: a short HEAD request, falling back to hashing the
+page only when the server sends neither ETag nor Last-Modified.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from flask import current_app
+
+from app.services.cache_codec import cache_delete, cache_get
+from app.services.peer_cache import get_shared, set_shared
+from app.services.cache_index import url_tag, website_tag
+
+logger = logging.getLogger('extraction_cache')
+
+EXTRACTION_CACHE_TTL = 86400  # Revalidate entries older than 24 hours
+EXTRACTION_CACHE_MAX_AGE = 30 * 86400  # Keep entries (and validators) for 30 days
+REVALIDATION_TIMEOUT = 10  # Seconds allowed for a conditional fetch
+VALIDATOR_TIMEOUT = 3  # Seconds allowed to capture validators after an extract
+
+# Query parameters that never change page content
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref')
+
+_validator_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='extraction-validators')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def canonical_url(url):
+    """Normalize a URL so equivalent links share one cache entry"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/')
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    # http and https variants of a page are the same page
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def extraction_cache_key(url, namespace='extract'):
+    """Cache key for the extracted record of a URL"""
+    digest = hashlib.md5(canonical_url(url).encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def _content_hash(body):
+    """Hash page content, ignoring whitespace-only differences"""
+    return hashlib.sha256(b' '.join(body.split())).hexdigest()
+
+
+def _fetch_validators(url, entry=None):
+    """Fetch a page, conditionally when we already hold validators.
+
+    Returns:
+        tuple: (unchanged, validators) where unchanged is True when the page
+        matches the cached entry and validators holds the fresh ETag,
+        Last-Modified and content hash (None when the fetch failed).
+    """
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    timeout = current_app.config.get('REVALIDATION_TIMEOUT', REVALIDATION_TIMEOUT)
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Revalidation fetch failed for {url}: {str(e)}")
+        return False, None
+
+    if response.status_code == 304 and entry:
+        return True, {
+            'etag': response.headers.get('ETag') or entry.get('etag'),
+            'last_modified': response.headers.get('Last-Modified') or entry.get('last_modified'),
+            'content_hash': entry.get('content_hash'),
+        }
+    if response.status_code != 200:
+        return False, None
+
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_hash': _content_hash(response.content),
+    }
+    unchanged = bool(entry) and (
+        validators['content_hash'] == entry.get('content_hash')
+        or (validators['etag'] is not None and validators['etag'] == entry.get('etag'))
+    )
+    return unchanged, validators
+
+
+def _probe_validators(url):
+    """Validators of a page, from a HEAD request when the server sends them.
+
+    Returns:
+        dict: ETag, Last-Modified and content hash, or None when the page
+        could not be reached
+    """
+    timeout = current_app.config.get('VALIDATOR_TIMEOUT', VALIDATOR_TIMEOUT)
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        if response.status_code == 200:
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if etag or last_modified:
+                return {'etag': etag, 'last_modified': last_modified, 'content_hash': None}
+        # Nothing to revalidate with in the headers, so hash the page itself
+        response = requests.get(url, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Validator fetch failed for {url}: {str(e)}")
+        return None
+    if response.status_code != 200:
+        return None
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_hash': _content_hash(response.content),
+    }
+
+
+def _capture_validators(app, key, url, extracted_at):
+    """Add validators to an entry, unless it was replaced in the meantime"""
+    with app.app_context():
+        validators = _probe_validators(url)
+        if not validators:
+            return
+        entry = cache_get(key)
+        if not entry or entry.get('extracted_at') != extracted_at:
+            return
+        entry.update(validators)
+        max_age = app.config.get('EXTRACTION_CACHE_MAX_AGE', EXTRACTION_CACHE_MAX_AGE)
+        set_shared(key, entry, timeout=max_age, tags=_tags(entry['url']))
+
+
+def capture_validators(key, url, entry):
+    """Capture validators for a new entry in the background; costs no API credits"""
+    future = _validator_pool.submit(_capture_validators, current_app._get_current_object(), key, url,
+                                    entry['extracted_at'])
+    with _pending_lock:
+        _pending.add(future)
+    future.add_done_callback(_discard)
+    return future
+
+
+def _discard(future):
+    with _pending_lock:
+        _pending.discard(future)
+
+
+def wait_for_validators(timeout=None):
+    """Wait for background validator captures to finish, e.g. in tests"""
+    with _pending_lock:
+        futures = list(_pending)
+    wait(futures, timeout=timeout)
+
+
+def _tags(canonical):
+    """Index tags for an extraction entry"""
+    return (url_tag(canonical), website_tag(urlsplit(canonical).netloc))
+
+
+def _store(key, url, record, validators):
+    """Write an entry, keeping it long enough to be revalidated later"""
+    now = time.time()
+    entry = {
+        'url': canonical_url(url),
+        'record': record,
+        'etag': None,
+        'last_modified': None,
+        'content_hash': None,
+        'extracted_at': now,
+        'validated_at': now,
+    }
+    if validators:
+        entry.update(validators)
+    max_age = current_app.config.get('EXTRACTION_CACHE_MAX_AGE', EXTRACTION_CACHE_MAX_AGE)
+    set_shared(key, entry, timeout=max_age, tags=_tags(entry['url']))
+    return entry
+
+
+def get_or_extract(url, extract_fn, namespace='extract'):
+    """Return the extracted record for a URL, extracting only when needed.
+
+    Args:
+        url (str): Page URL, in any equivalent form
+        extract_fn (callable): Performs the paid extract; called with the URL
+        namespace (str): Separates record shapes produced by different extractors
+
+    Returns:
+        The cached or freshly extracted record
+    """
+    key = extraction_cache_key(url, namespace)
+    entry = get_shared(key)
+    ttl = current_app.config.get('EXTRACTION_CACHE_TTL', EXTRACTION_CACHE_TTL)
+
+    if entry:
+        if time.time() - entry['validated_at'] < ttl:
+            logger.info(f"Extraction cache hit for {entry['url']}")
+            return entry['record']
+
+        unchanged, validators = _fetch_validators(url, entry)
+        if unchanged:
+            logger.info(f"Page unchanged, extending cached extraction for {entry['url']}")
+            entry.update(validators)
+            entry['validated_at'] = time.time()
+            max_age = current_app.config.get('EXTRACTION_CACHE_MAX_AGE', EXTRACTION_CACHE_MAX_AGE)
+            set_shared(key, entry, timeout=max_age, tags=_tags(entry['url']))
+            return entry['record']
+        record = extract_fn(url)
+    else:
+        record = extract_fn(url)
+        validators = None
+
+    entry = _store(key, url, record, validators)
+    if validators is None:
+        capture_validators(key, url, entry)
+    return record
+
+
+def invalidate(url, namespace='extract'):
+    """Drop the cached extraction for a URL"""
+    cache_delete(extraction_cache_key(url, namespace))
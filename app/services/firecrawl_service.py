@@ -2,15 +2,22 @@ import time
 from flask import current_app
 from datetime import datetime, timedelta
 import json
-from tqdm import tqdm  # For progress tracking
-from app.models import SearchCache, UserSearchHistory, SearchResult
-from app.extensions import db, cache
+from app.models import SearchCache, UserSearchHistory, SearchResult, ResultSet
+from app.extensions import db
+from app.services import extraction_cache
+from app.services import adaptive_ttl, peer_cache
+from app.services.cache_codec import cache_get
+from app.services.cache_index import search_tags
+from app.services.ranking import rank, RATINGS
+from app.services.normalizer import normalize_response, normalize_record
+from app.services.progress import SEARCHING, PARSING, RANKING, ENRICHING
+from app.services.search_state import SearchCancelled, DeadlineExceeded
 from pydantic import BaseModel, Field
 from typing import List, Optional, Any, Dict
 from firecrawl import FirecrawlApp
 import requests
 import hashlib
-from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import backoff  # For exponential backoff
 import gc  # For garbage collection
 import logging
@@ -33,6 +40,7 @@ RETRY_DELAY = 30  # 30 seconds between retries
 BACKOFF_FACTOR = 2  # Exponential backoff factor
 MAX_CONCURRENT_REQUESTS = 1  # Limit concurrent requests to avoid concurrency limits
 MEMORY_THRESHOLD = 70  # 70% memory usage threshold
+EXTRACT_POLL_INTERVAL = 2  # Seconds between extract job status checks
 
 class RecipeResult(BaseModel):
     """Model for recipe search results"""
@@ -54,20 +62,6 @@ class SearchResponse(BaseModel):
     status: str
     expiresAt: str
 
-class SearchResultItem(BaseModel):
-    """Schema for individual search results"""
-    rank: float = Field(description="Ranking of the result")
-    title: str = Field(description="Title of the result")
-    summary: str = Field(description="Summary of the result")
-    big_difference: Optional[str] = Field(None, description="What makes this result unique")
-    key_takeaways: Optional[str] = Field(None, description="Key takeaways from the result")
-    pros: Optional[str] = Field(None, description="Positive aspects")
-    cons: Optional[str] = Field(None, description="Negative aspects")
-    tips_and_tricks: Optional[str] = Field(None, description="Tips and tricks")
-    url: Optional[str] = Field(None, description="URL of the result")
-    image_url: Optional[str] = Field(None, description="Image URL if available")
-    rating: Optional[float] = Field(None, description="Rating if available")
-
 class ExtractSchema(BaseModel):
     """Schema for detailed content extraction"""
     title: str = Field(description="Title of the content")
@@ -94,10 +88,8 @@ class NestedModel(BaseModel):
     url: Optional[str] = Field(None, description="URL of the result")
     image_url: Optional[str] = Field(None, description="Image URL if available")
     rating: Optional[float] = Field(None, description="Rating if available")
-
-class ResultsContainer(BaseModel):
-    """Container for results with dynamic key"""
-    results: List[NestedModel] = Field(description="List of search results")
+    review_count: Optional[int] = Field(None, description="Number of ratings or reviews behind the rating")
+    published: Optional[str] = Field(None, description="Publication date, ISO 8601")
 
 # Custom exceptions
 class APIError(Exception):
@@ -108,6 +100,10 @@ class RateLimitExceeded(APIError):
     """Raised when API rate limit is exceeded"""
     pass
 
+class QuotaExceeded(RateLimitExceeded):
+    """Raised when a user or session has spent its own credit quota"""
+    pass
+
 class AuthenticationError(APIError):
     """Raised when API authentication fails"""
     pass
@@ -155,14 +151,23 @@ class FirecrawlAPIManager:
                          (APIError, TimeoutError, requests.exceptions.RequestException),
                          max_tries=MAX_RETRIES,
                          max_time=REQUEST_TIMEOUT)
-    def _execute_with_timeout(self, func, *args, **kwargs):
-        """Execute a function with a timeout and exponential backoff retries"""
+    def _execute_with_timeout(self, func, *args, job=None, **kwargs):
+        """
+        Execute a function with a timeout and exponential backoff retries
+        
+        With a job, each attempt waits at most for the search's remaining time,
+        no retry starts once it is cancelled or out of time, and a backoff that
+        would outlast the deadline raises DeadlineExceeded instead of sleeping.
+        """
+        if job is not None:
+            job.check()
+        timeout = job.budget(REQUEST_TIMEOUT) if job is not None else REQUEST_TIMEOUT
         with self._request_semaphore:
             try:
                 self._check_memory_usage()
                 logger.info(f"Starting Firecrawl API request: {func.__name__}")
                 future = self.executor.submit(func, *args, **kwargs)
-                result = future.result(timeout=REQUEST_TIMEOUT)
+                result = future.result(timeout=timeout)
                 
                 # Log the API response
                 self._log_api_response(result, func.__name__)
@@ -175,44 +180,127 @@ class FirecrawlAPIManager:
                 raise
             except Exception as e:
                 logger.error(f"API request failed: {str(e)}")
+                # Backoff waits never run past the search's deadline
+                wait = time.sleep if job is None else job.sleep
                 if "concurrency" in str(e).lower():
                     logger.error("Concurrency limit reached, waiting before retry")
-                    time.sleep(RETRY_DELAY * 3)  # Wait longer for concurrency issues
+                    wait(RETRY_DELAY * 3)  # Wait longer for concurrency issues
                 elif "500" in str(e):
                     logger.error("Server error (500), waiting before retry")
-                    time.sleep(RETRY_DELAY * 2)
+                    wait(RETRY_DELAY * 2)
                 raise APIError(f"API request failed: {str(e)}")
     
-    def search(self, website, query):
-        """Search a website using Firecrawl API with improved error handling"""
+    def _run_extract(self, urls, params, job=None):
+        """
+        Run an extract job, stopping early if the search is cancelled
+        
+        Without a job this is the SDK's blocking extract. With one, the job is
+        started asynchronously and polled here so cancellation is noticed
+        between polls. Firecrawl has no way to abort an extract job, so a
+        cancelled search stops polling and drops the result; no further
+        requests are made on its behalf.
+        
+        Each extract run for a job is charged to the job's owner, and none is
+        started once the owner's quota is spent.
+        
+        The id of the extract job being polled is kept on the job, so a search
+        checkpointed during shutdown polls the same extract job again when it
+        resumes instead of paying for a new one.
+        """
+        if job is None:
+            return self._execute_with_timeout(self.app.extract, urls, params)
+        
+        extract_id = job.extract_id
+        if extract_id:
+            logger.info(f"Resuming extract job {extract_id}")
+        else:
+            if job.over_quota():
+                raise QuotaExceeded(f"Credit quota used up for {job.owner}")
+            started = self._execute_with_timeout(self.app.async_extract, urls, {
+                'prompt': params.get('prompt'),
+                'schema': params.get('schema'),
+                'enableWebSearch': params.get('enable_web_search', False),
+            }, job=job)
+            extract_id = started.get('id') if isinstance(started, dict) else None
+            if not extract_id:
+                raise APIError(f"Extract job was not started: {started}")
+            job.extract_id = extract_id
+        
+        deadline = time.time() + job.budget(REQUEST_TIMEOUT)
+        try:
+            while True:
+                try:
+                    job.check()
+                except DeadlineExceeded:
+                    logger.info(f"Search out of time, abandoning extract job {extract_id}")
+                    raise
+                except SearchCancelled:
+                    logger.info(f"Search cancelled, abandoning extract job {extract_id}")
+                    raise
+                try:
+                    status = self.app.get_extract_status(extract_id)
+                except Exception as e:
+                    raise APIError(f"API request failed: {str(e)}")
+                if status.get('status') == 'completed':
+                    self._log_api_response(status, 'extract')
+                    job.charge()
+                    return status
+                if status.get('status') in ('failed', 'cancelled'):
+                    raise APIError(f"Extract job {status.get('status')}: {status.get('error')}")
+                if time.time() > deadline:
+                    raise APIError(f"Extract job {extract_id} timed out")
+                time.sleep(min(EXTRACT_POLL_INTERVAL, job.budget(EXTRACT_POLL_INTERVAL)))
+        finally:
+            # Any checkpoint has been taken by now; the next call starts afresh
+            job.extract_id = None
+    
+    def search(self, website, query, job=None, detailed=True):
+        """
+        Search a website using Firecrawl API with improved error handling
+        
+        A basic search (detailed=False) only asks for titles, short summaries,
+        ratings and URLs, which comes back much faster; the comment analysis
+        can then be filled in per result with extract().
+        """
         self._check_rate_limit()
         
+        if detailed:
+            prompt = (f'Search for the top 5 results related to "{query}" on {website}. For each result, provide:\n'
+                      f'1. A clear title\n'
+                      f'2. A detailed summary\n'
+                      f'3. What makes this result unique (big difference)\n'
+                      f'4. Key takeaways\n'
+                      f'5. Pros and cons\n'
+                      f'6. Tips and tricks\n'
+                      f'7. Rating and number of ratings if available\n'
+                      f'8. URL and image URL if available\n'
+                      f'9. Publication date if available')
+        else:
+            prompt = (f'Find the top 5 results related to "{query}" on {website}. For each result, provide:\n'
+                      f'1. A clear title\n'
+                      f'2. A brief summary\n'
+                      f'3. Rating and number of ratings if available\n'
+                      f'4. URL and image URL if available\n'
+                      f'5. Publication date if available')
+        
         try:
-            logger.info(f"Starting search for '{query}' on {website}")
+            logger.info(f"Starting {'detailed' if detailed else 'basic'} search for '{query}' on {website}")
             
             # Use the SDK to perform the search with wildcard URL
-            data = self._execute_with_timeout(
-                self.app.extract,
+            data = self._run_extract(
                 [f"https://{website}/*"],
                 {
-                    'prompt': f'Search for the top 5 results related to "{query}" on {website}. For each result, provide:\n'
-                             f'1. A clear title\n'
-                             f'2. A detailed summary\n'
-                             f'3. What makes this result unique (big difference)\n'
-                             f'4. Key takeaways\n'
-                             f'5. Pros and cons\n'
-                             f'6. Tips and tricks\n'
-                             f'7. Rating if available\n'
-                             f'8. URL and image URL if available',
+                    'prompt': prompt,
                     'schema': SearchResponse.model_json_schema(),
                     'enable_web_search': True,
                     'max_results': 5,
-                    'include_comments': True,
-                    'summarize_comments': True,
+                    'include_comments': detailed,
+                    'summarize_comments': detailed,
                     'timeout': REQUEST_TIMEOUT,  # Pass timeout to API
                     'retry_on_error': True,  # Enable retry on error
                     'max_retries': 3  # Maximum number of retries for the API
-                }
+                },
+                job
             )
             
             self.daily_requests += 1
@@ -227,32 +315,50 @@ class FirecrawlAPIManager:
                 logger.warning(f"Raw response: {json.dumps(data, indent=2)}")
                 return data  # Return raw data if parsing fails
             
+        except (SearchCancelled, QuotaExceeded):
+            raise
         except Exception as e:
             logger.error(f"Search API error: {str(e)}")
             if "concurrency" in str(e).lower():
                 logger.error("Concurrency limit reached, using cached results if available")
-                cache_key = get_cache_key("search", website=website, query=query)
-                cached_result = cache.get(cache_key)
+                cache_key = search_cache_key(website, query, detailed)
+                cached_result = cache_get(cache_key)
                 if cached_result:
                     logger.info("Using cached result due to concurrency limit")
                     return cached_result
             elif "500" in str(e):
                 logger.error("Server error (500), using cached results if available")
-                cache_key = get_cache_key("search", website=website, query=query)
-                cached_result = cache.get(cache_key)
+                cache_key = search_cache_key(website, query, detailed)
+                cached_result = cache_get(cache_key)
                 if cached_result:
                     logger.info("Using cached result due to API error")
                     return cached_result
             raise APIError(f"Firecrawl API error: {str(e)}")
     
-    def extract(self, url, include_comments=True, summarize_comments=True):
-        """Extract content from a URL with optional comment analysis"""
+    def extract(self, url, include_comments=True, summarize_comments=True, job=None):
+        """Extract content from a URL with optional comment analysis.
+
+        Records are shared across queries through the per-URL extraction
+        cache, so a page is only re-extracted when it has actually changed.
+        Both options change the prompt and the record, so each combination
+        is cached separately.
+        """
+        namespace = 'extract_comments' if include_comments else 'extract'
+        if not summarize_comments:
+            namespace += '_unsummarized'
+        return extraction_cache.get_or_extract(
+            url,
+            lambda page_url: self._extract_uncached(page_url, include_comments, summarize_comments, job),
+            namespace=namespace
+        )
+    
+    def _extract_uncached(self, url, include_comments=True, summarize_comments=True, job=None):
+        """Extract content from a URL, always calling the API"""
         self._check_rate_limit()
         
         try:
             # Use the SDK to extract content
-            data = self._execute_with_timeout(
-                self.app.extract,
+            data = self._run_extract(
                 [url],
                 {
                     'prompt': 'Extract detailed information from this page, including any user comments or reviews. Provide:\n'
@@ -262,20 +368,23 @@ class FirecrawlAPIManager:
                              f'4. Key takeaways\n'
                              f'5. Pros and cons\n'
                              f'6. Tips and tricks\n'
-                             f'7. Rating if available',
+                             f'7. Rating and number of ratings if available\n'
+                             f'8. Publication date if available',
                     'schema': NestedModel.model_json_schema(),
                     'enable_web_search': True,
                     'include_comments': include_comments,
                     'summarize_comments': summarize_comments
-                }
+                },
+                job
             )
             
             self.daily_requests += 1
             
-            # Parse and validate response against our schema
-            result = NestedModel(**data)
-            return result.dict()
+            # The page's fields under their canonical names
+            return normalize_record(data)
             
+        except (SearchCancelled, QuotaExceeded):
+            raise
         except Exception as e:
             current_app.logger.error(f"Extract API error: {str(e)}")
             raise APIError(f"Firecrawl API error: {str(e)}")
@@ -297,136 +406,123 @@ def get_cache_key(prefix, **kwargs):
     key_str = json.dumps(key_dict, sort_keys=True)
     return f"{prefix}:{hashlib.md5(key_str.encode()).hexdigest()}"
 
-@cache.memoize(timeout=86400)  # Cache for 24 hours
-def search_website_cached(website, query, ranking_type="relevance"):
-    """Cached version of the search function"""
-    return search_website_internal(website, query, ranking_type)
+def search_cache_key(website, query, detailed=True):
+    """Cache key for the ranking-independent results of a search"""
+    return get_cache_key("search" if detailed else "search_basic", website=website, query=query)
 
-def search_website(website, query, ranking_type="relevance"):
-    """Public-facing search function that utilizes caching"""
+def apply_ranking(results, ranking_type="relevance"):
+    """
+    Return a ranked view of a relevance-ordered result set
+    
+    Ranking is a pure re-sort of the same items, so the cache only holds the
+    ranking-independent results and every ranking type is derived at read time.
+    The cached list itself is never reordered. See app/services/ranking.py.
+    """
+    return rank(results, ranking_type)
+
+def search_website_cached(website, query, ranking_type="relevance", job=None, detailed=True):
+    """Cached version of the search function
+    
+    Results live under the ranking-independent search key with a TTL learned
+    per website (see adaptive_ttl), rather than behind a fixed 24 hour memoize.
+    """
+    results = _search_website_raw(website, query, job, detailed)
+    if job is not None:
+        job.report(RANKING)
+    return apply_ranking(results, ranking_type)
+
+def search_website(website, query, ranking_type="relevance", job=None, detailed=True):
+    """
+    Public-facing search function that utilizes caching
+    
+    Pass the SearchJob of a background search so it stops once cancelled;
+    SearchCancelled is raised to the caller instead of returning results,
+    and DeadlineExceeded once it runs out of time. An owner out of credits
+    still gets cached results; without any, QuotaExceeded is raised. API
+    failures raise APIError or one of its subclasses, so an empty list
+    always means nothing was found. With
+    detailed=False only the cheap basic results are fetched; see
+    enrich_result for the second phase.
+    """
     # Check if we're close to API limit and should prioritize cache
     api_manager = FirecrawlAPIManager()
     if api_manager.daily_requests > 90:  # 90% of free tier limit
         # Force cache usage when close to limits
-        cache_key = get_cache_key("search", website=website, query=query)
-        cached_result = cache.get(cache_key)
+        cache_key = search_cache_key(website, query, detailed)
+        cached_result = cache_get(cache_key)
         if cached_result:
             current_app.logger.info("Using cached result due to API limit constraints")
-            return cached_result
+            return apply_ranking(cached_result, ranking_type)
     
     # Normal cached function call
-    return search_website_cached(website, query, ranking_type)
+    return search_website_cached(website, query, ranking_type, job, detailed)
 
 def search_website_internal(website, query, ranking_type="relevance"):
     """
     Internal implementation of website search with caching
     """
+    return apply_ranking(_search_website_raw(website, query), ranking_type)
+
+def _search_website_raw(website, query, job=None, detailed=True):
+    """
+    Search a website and return results in relevance order
+    
+    Results are cached once per website and query; ranking is applied by the
+    callers, so switching ranking type never costs another API call.
+    """
     api_manager = FirecrawlAPIManager()
     
     try:
-        # Check cache first
-        cache_key = get_cache_key("search", website=website, query=query, ranking_type=ranking_type)
-        cached_result = cache.get(cache_key)
+        # Check cache first, then the peer owning this key
+        cache_key = search_cache_key(website, query, detailed)
+        cached_result = peer_cache.get_shared(cache_key)
         if cached_result:
             current_app.logger.info("Using cached search result")
             return cached_result
 
         # Perform search request
-        response = api_manager.search(website, query)
+        if job is not None:
+            job.report(SEARCHING)
+        response = api_manager.search(website, query, job, detailed)
+        if job is not None:
+            job.report(PARSING)
         
         # For debugging - log the raw response
         current_app.logger.debug(f"Raw API response: {json.dumps(response, indent=2)}")
         
-        # Process results into a consistent format
-        processed_results = []
-        
-        # Handle the response based on its type
-        if isinstance(response, list):
-            # If response is already a list of results
-            for idx, item in enumerate(response, start=1):
-                result = {
-                    "rank": idx,
-                    "title": getattr(item, 'title', "Untitled"),
-                    "summary": getattr(item, 'summary', ""),
-                    "big_difference": getattr(item, 'big_difference', ""),
-                    "key_takeaways": getattr(item, 'key_takeaways', []),
-                    "pros": getattr(item, 'pros', []),
-                    "cons": getattr(item, 'cons', []),
-                    "tips_and_tricks": getattr(item, 'tips_and_tricks', []),
-                    "url": getattr(item, 'url', ""),
-                    "image_url": getattr(item, 'image_url', ""),
-                    "rating": float(getattr(item, 'rating', 0)) if getattr(item, 'rating', None) else None
-                }
-                processed_results.append(result)
-        elif isinstance(response, dict):
-            # If response is a dictionary
-            data = response.get('data', {})
-            if isinstance(data, dict):
-                inner_data = data.get('data', {})
-                if isinstance(inner_data, dict):
-                    # Handle the main result
-                    result = {
-                        "rank": 1,
-                        "title": inner_data.get("title", "Untitled"),
-                        "summary": inner_data.get("summary", ""),
-                        "big_difference": inner_data.get("big_difference", ""),
-                        "key_takeaways": inner_data.get("key_takeaways", []),
-                        "pros": inner_data.get("pros", []),
-                        "cons": inner_data.get("cons", []),
-                        "tips_and_tricks": inner_data.get("tips", []),
-                        "url": inner_data.get("url", ""),
-                        "image_url": inner_data.get("image_url", ""),
-                        "rating": float(inner_data.get("rating", 0)) if inner_data.get("rating") else None
-                    }
-                    processed_results.append(result)
-                    
-                    # Handle additional results
-                    results = inner_data.get('results', [])
-                    if isinstance(results, list):
-                        for idx, item in enumerate(results, start=2):
-                            result = {
-                                "rank": idx,
-                                "title": item.get("title", "Untitled"),
-                                "summary": item.get("summary", ""),
-                                "big_difference": item.get("big_difference", ""),
-                                "key_takeaways": item.get("key_takeaways", []),
-                                "pros": item.get("pros", []),
-                                "cons": item.get("cons", []),
-                                "tips_and_tricks": item.get("tips", []),
-                                "url": item.get("url", ""),
-                                "image_url": item.get("image_url", ""),
-                                "rating": float(item.get("rating", 0)) if item.get("rating") else None
-                            }
-                            processed_results.append(result)
-        else:
-            # If response is neither list nor dict, return it as is for debugging
-            current_app.logger.warning(f"Unexpected response type: {type(response)}")
-            return [{"raw_response": str(response)}]
-        
-        # If ratings-based ranking is requested, sort by rating
-        if ranking_type == "ratings":
-            processed_results.sort(key=lambda x: x.get('rating', 0) or 0, reverse=True)
+        # One pass into canonical records, whatever shape the response has
+        processed_results = normalize_response(response)
+        if processed_results is None:
+            # Return the response as is for debugging
+            return ResultSet([SearchResult(extra={"raw_response": str(response)})])
         
-        # Cache the results
-        cache.set(cache_key, processed_results)
+        # Cache the ranking-independent results
+        adaptive_ttl.observe(website, query, processed_results)
+        peer_cache.set_shared(cache_key, processed_results, timeout=adaptive_ttl.ttl_for(website, query),
+                              tags=search_tags(website, query))
         return processed_results
     
+    # Failures propagate so the caller can tell them apart from finding nothing
+    except DeadlineExceeded as e:
+        current_app.logger.warning(f"Search deadline exceeded: {str(e)}")
+        raise
+    except SearchCancelled:
+        raise
+    except QuotaExceeded as e:
+        current_app.logger.info(f"Quota exceeded and nothing cached: {str(e)}")
+        raise
     except RateLimitExceeded as e:
         current_app.logger.error(f"Rate limit exceeded: {str(e)}")
-        search_website.last_error = "Rate limit exceeded. Please try again tomorrow."
-        return []
+        raise
     except AuthenticationError as e:
         current_app.logger.error(f"Authentication error: {str(e)}")
-        search_website.last_error = "API authentication failed. Please check your API key."
-        return []
+        raise
     except APIError as e:
         current_app.logger.error(f"API error: {str(e)}")
-        search_website.last_error = f"An error occurred with the API: {str(e)}"
-        return []
+        raise
     except Exception as e:
-        current_app.logger.error(f"Unexpected error in search_website_internal: {str(e)}")
-        search_website.last_error = "An unexpected error occurred."
-        return []
+        current_app.logger.error(f"Unexpected error in _search_website_raw: {str(e)}")
+        raise APIError(f"Unexpected search error: {str(e)}")
 
 def cache_results(website, query, results):
     """Cache the search results"""
@@ -461,20 +557,23 @@ def save_to_user_history(user_id, website, query, results):
     db.session.add(history_entry)
     db.session.commit()
 
-def get_detailed_results(basic_results, website):
+def get_detailed_results(basic_results, website, job=None):
     """
     Get detailed information for each result including comment summaries
     
     Args:
         basic_results (list): List of basic search results
         website (str): Website domain
+        job (SearchJob): Optional job; enrichment stops once it is cancelled,
+            and once it runs out of time the rest are returned unenriched
         
     Returns:
-        list: Enhanced search results with comments analysis
+        ResultSet: Enhanced search results with comments analysis
     """
+    basic_results = ResultSet.coerce(basic_results)
     # DEVELOPMENT MODE: Skip detailed results in dev to save credits
     if DEV_MODE:
-        return basic_results[:MAX_RESULTS_DEV]  # Return limited results in dev
+        return ResultSet(basic_results[:MAX_RESULTS_DEV])  # Return limited results in dev
         
     api_key = current_app.config.get('FIRECRAWL_API_KEY')
     base_url = current_app.config.get('FIRECRAWL_BASE_URL')
@@ -486,50 +585,106 @@ def get_detailed_results(basic_results, website):
         "Content-Type": "application/json"
     }
     
-    enhanced_results = []
+    def fetch_details(url):
+        """Run the paid comment-analysis extract for one page"""
+        payload = {
+            "url": url,
+            "include_comments": True,
+            "summarize_comments": True,
+            # DEVELOPMENT MODE OPTIMIZATIONS - REMOVE IN PRODUCTION
+            "format": "basic" if DEV_MODE else "json",  # Basic format uses fewer credits
+            "max_comments": 3 if DEV_MODE else None,  # Limit comments in dev
+            "token_limit": 1000 if DEV_MODE else None  # Limit tokens in dev
+        }
+        
+        timeout = job.budget(REQUEST_TIMEOUT) if job is not None else REQUEST_TIMEOUT
+        response = requests.post(extract_url, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    enhanced_results = ResultSet()
     
-    for result in tqdm(basic_results, desc="Analyzing detailed results"):
+    for index, result in enumerate(basic_results):
+        if job is not None:
+            job.report(ENRICHING, index, len(basic_results))
+            try:
+                job.check()
+            except DeadlineExceeded:
+                current_app.logger.warning("Out of time, returning remaining results without details")
+                enhanced_results.extend(basic_results[index:])
+                break
         try:
-            if not result.get('url'):
+            if not result.url:
                 enhanced_results.append(result)
                 continue
-                
-            payload = {
-                "url": result['url'],
-                "include_comments": True,
-                "summarize_comments": True,
-                # DEVELOPMENT MODE OPTIMIZATIONS - REMOVE IN PRODUCTION
-                "format": "basic" if DEV_MODE else "json",  # Basic format uses fewer credits
-                "max_comments": 3 if DEV_MODE else None,  # Limit comments in dev
-                "token_limit": 1000 if DEV_MODE else None  # Limit tokens in dev
-            }
-            
-            response = requests.post(extract_url, headers=headers, json=payload)
-            response.raise_for_status()
             
-            data = response.json()
+            # Pages are shared across queries, so reuse earlier extractions
+            data = extraction_cache.get_or_extract(result.url, fetch_details, namespace='details')
             
             # Extract comment summaries and organization
             if 'commentSummary' in data:
-                result['summary'] = data['commentSummary'].get('summary', '')
-                result['pros'] = data['commentSummary'].get('pros', '')
-                result['cons'] = data['commentSummary'].get('cons', '')
-                result['tips'] = data['commentSummary'].get('tips', '')
+                result.summary = data['commentSummary'].get('summary', '')
+                result.pros = data['commentSummary'].get('pros', '')
+                result.cons = data['commentSummary'].get('cons', '')
+                result.tips_and_tricks = data['commentSummary'].get('tips', '')
             
             # Update rating if available in detailed data
             if 'rating' in data and data['rating']:
-                result['rating'] = data['rating']
+                result.rating = data['rating']
                 
             enhanced_results.append(result)
             
         except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Error getting details for {result.get('url', 'unknown URL')}: {str(e)}")
+            current_app.logger.error(f"Error getting details for {result.url or 'unknown URL'}: {str(e)}")
             enhanced_results.append(result)  # Add the basic result without enhancements
     
-    # Sort by rating if available
-    enhanced_results.sort(key=lambda x: x.get('rating', 0) or 0, reverse=True)
+    # Best rated first, now that the pages' ratings are in
+    return rank(enhanced_results, RATINGS)
+
+# Fields the per-page extract adds to a basic search result
+ENRICHMENT_FIELDS = ('summary', 'big_difference', 'key_takeaways', 'pros', 'cons', 'tips_and_tricks')
+
+def enrich_result(result, job=None, api_manager=None):
+    """
+    Add the comment analysis for one basic search result
+    
+    Uses the per-URL extraction cache, so a page shared by several searches
+    is only analyzed once. Results without a URL, or whose page cannot be
+    extracted, come back unchanged apart from the enriched flag. Over quota,
+    the result comes back without the flag.
     
-    return enhanced_results
+    Args:
+        result (SearchResult): A basic search result, or its dict
+        job (SearchJob): Optional job; SearchCancelled propagates
+        api_manager (FirecrawlAPIManager): Optional manager to reuse
+        
+    Returns:
+        SearchResult: A new result with 'enriched' set
+    """
+    result = SearchResult.coerce(result)
+    enriched = result.copy(enriched=True)
+    if not result.url:
+        return enriched
+    
+    api_manager = api_manager or FirecrawlAPIManager()
+    try:
+        details = api_manager.extract(result.url, job=job)
+    except QuotaExceeded:
+        # Left unenriched so it can be analyzed once credits are available
+        return result.copy()
+    except APIError as e:
+        current_app.logger.error(f"Error enriching {result.url}: {str(e)}")
+        return enriched
+    
+    for field in ENRICHMENT_FIELDS:
+        if details.get(field):
+            setattr(enriched, field, details[field])
+    if details.get('rating'):
+        enriched.rating = details['rating']
+        enriched.review_count = details.get('review_count') or enriched.review_count
+    if details.get('published'):
+        enriched.published = details['published']
+    return enriched
 
 def get_best_results(results, ranking_type="relevance"):
     """
@@ -540,20 +695,33 @@ def get_best_results(results, ranking_type="relevance"):
         ranking_type (str): 'relevance' or 'ratings'
         
     Returns:
-        list: Top results, possibly reordered
+        ResultSet: Top results, possibly reordered
     """
-    if not results:
-        return []
-    
     # DEVELOPMENT MODE: Return fewer results in dev
     max_results = MAX_RESULTS_DEV if DEV_MODE else 10
     
-    if ranking_type == "relevance":
-        return results[:max_results]
-    else:
-        # Sort by rating if available
-        results.sort(key=lambda x: x.get('rating', 0) or 0, reverse=True)
-        return results[:max_results]
+    return rank(results or [], ranking_type, limit=max_results)
+
+def _text(value):
+    """A field that may be a list, as the text RecipeResult expects"""
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value)
+    return value or None
+
+def to_recipe(record):
+    """A canonical result record as the RecipeResult the legacy service returns"""
+    return RecipeResult(
+        title=record.title or '',
+        description=record.summary or '',
+        rating=record.rating,
+        url=record.url or None,
+        imageUrl=record.image_url or None,
+        summary=record.summary,
+        prosCons={'pros': _text(record.pros) or '', 'cons': _text(record.cons) or ''},
+        tipsTricks=_text(record.tips_and_tricks),
+        keyTakeaways=_text(record.key_takeaways),
+        uniqueAspect=record.big_difference or None
+    )
 
 class FirecrawlService:
     def __init__(self):
@@ -618,71 +786,14 @@ class FirecrawlService:
 
     def _process_api_response(self, response: Dict[str, Any]) -> List[RecipeResult]:
         """Process the API response and extract recipe results"""
-        try:
-            # First level validation
-            search_response = SearchResponse(**response)
-            
-            if not search_response.success:
-                logger.warning("API response indicated failure")
-                return []
-            
-            # Extract recipes from the nested data structure
-            recipes = []
-            
-            # The response has a nested structure: response -> data -> data -> results
-            if isinstance(search_response.data, dict):
-                inner_data = search_response.data.get('data', {})
-                if isinstance(inner_data, dict):
-                    # Handle the main recipe data
-                    main_recipe = {
-                        'title': inner_data.get('title', ''),
-                        'description': inner_data.get('summary', ''),
-                        'rating': float(inner_data.get('rating', 0)) if inner_data.get('rating') else None,
-                        'url': inner_data.get('url'),
-                        'imageUrl': inner_data.get('image_url'),
-                        'summary': inner_data.get('summary'),
-                        'prosCons': {
-                            'pros': inner_data.get('pros', ''),
-                            'cons': inner_data.get('cons', '')
-                        },
-                        'tipsTricks': inner_data.get('tips'),
-                        'keyTakeaways': inner_data.get('key_takeaways'),
-                        'uniqueAspect': inner_data.get('unique')
-                    }
-                    recipes.append(RecipeResult(**main_recipe))
-                    
-                    # Handle additional results if present
-                    results = inner_data.get('results', [])
-                    if isinstance(results, list):
-                        for result in results:
-                            try:
-                                recipe = RecipeResult(
-                                    title=result.get('title', ''),
-                                    description=result.get('summary', ''),
-                                    rating=float(result.get('rating', 0)) if result.get('rating') else None,
-                                    url=result.get('url'),
-                                    imageUrl=result.get('image_url'),
-                                    summary=result.get('summary'),
-                                    prosCons={
-                                        'pros': result.get('pros', ''),
-                                        'cons': result.get('cons', '')
-                                    },
-                                    tipsTricks=result.get('tips'),
-                                    keyTakeaways=result.get('key_takeaways'),
-                                    uniqueAspect=result.get('unique')
-                                )
-                                recipes.append(recipe)
-                            except Exception as e:
-                                logger.error(f"Error processing additional recipe: {str(e)}")
-                                continue
-            
-            logger.info(f"Successfully processed {len(recipes)} recipes")
-            return recipes
-            
-        except Exception as e:
-            logger.error(f"Error processing API response: {str(e)}")
-            logger.error(f"Response structure: {json.dumps(response, indent=2)}")
+        if not response.get('success'):
+            logger.warning("API response indicated failure")
             return []
+        
+        records = normalize_response(response) or []
+        recipes = [to_recipe(record) for record in records]
+        logger.info(f"Successfully processed {len(recipes)} recipes")
+        return recipes
 
     def search(self, website: str, query: str, max_results: int = 3) -> List[RecipeResult]:
         """Perform a simple search"""
@@ -709,58 +820,7 @@ class FirecrawlService:
             
             self._log_api_response(response)
             
-            # Process the response
-            recipes = []
-            if response.get('success'):
-                data = response.get('data', {})
-                if isinstance(data, dict):
-                    inner_data = data.get('data', {})
-                    if isinstance(inner_data, dict):
-                        # Handle the main recipe
-                        main_recipe = {
-                            'title': inner_data.get('title', ''),
-                            'description': inner_data.get('summary', ''),
-                            'rating': float(inner_data.get('rating', 0)) if inner_data.get('rating') else None,
-                            'url': inner_data.get('url'),
-                            'imageUrl': inner_data.get('image_url'),
-                            'summary': inner_data.get('summary'),
-                            'prosCons': {
-                                'pros': inner_data.get('pros', ''),
-                                'cons': inner_data.get('cons', '')
-                            },
-                            'tipsTricks': inner_data.get('tips'),
-                            'keyTakeaways': inner_data.get('key_takeaways'),
-                            'uniqueAspect': inner_data.get('unique')
-                        }
-                        recipes.append(RecipeResult(**main_recipe))
-                        
-                        # Handle additional results
-                        results = inner_data.get('results', [])
-                        if isinstance(results, list):
-                            for result in results:
-                                try:
-                                    recipe = RecipeResult(
-                                        title=result.get('title', ''),
-                                        description=result.get('summary', ''),
-                                        rating=float(result.get('rating', 0)) if result.get('rating') else None,
-                                        url=result.get('url'),
-                                        imageUrl=result.get('image_url'),
-                                        summary=result.get('summary'),
-                                        prosCons={
-                                            'pros': result.get('pros', ''),
-                                            'cons': result.get('cons', '')
-                                        },
-                                        tipsTricks=result.get('tips'),
-                                        keyTakeaways=result.get('key_takeaways'),
-                                        uniqueAspect=result.get('unique')
-                                    )
-                                    recipes.append(recipe)
-                                except Exception as e:
-                                    logger.error(f"Error processing additional recipe: {str(e)}")
-                                    continue
-            
-            logger.info(f"Successfully processed {len(recipes)} recipes")
-            return recipes
+            return self._process_api_response(response)
             
         except Exception as e:
             logger.error(f"Error during simple search: {str(e)}")
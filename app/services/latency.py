@@ -0,0 +1,121 @@
+"""Latency model for searches, built from recent stage timings.
+
+Every finished pipeline stage leaves its duration in the search-state
+store (see progress). The model reads those timings as a rolling window
+per stage, website and ranking type, and answers two questions:
+
+* How long will a stage take? Progress uses the median for its ETAs.
+* How long will a whole search job run? The scheduler uses this to serve
+  short jobs first. Every job pays for analysis of the prefetched results.
+  A fresh search adds the searching, parsing and ranking stages on top; one
+  whose basic results are already cached adds almost nothing.
+
+When a key has fewer than ``MIN_SAMPLES`` timings, its window falls back
+to all websites for the ranking type, then to all timings of the stage,
+and then to ``DEFAULT_SECONDS``. Windows are cached per process for
+``REFRESH_INTERVAL`` seconds, so scheduling decisions do not query the
+store. Timings recorded by this process refresh their windows at once.
+"""
+import logging
+import math
+import threading
+import time
+
+from app.services.search_state import search_state
+
+logger = logging.getLogger('latency')
+
+QUEUED = 'queued'
+SEARCHING = 'searching'
+PARSING = 'parsing'
+RANKING = 'ranking'
+ENRICHING = 'enriching'
+
+# Expected seconds per stage before any history exists; per item for enriching
+DEFAULT_SECONDS = {
+    QUEUED: 1.0,
+    SEARCHING: 30.0,
+    PARSING: 0.1,
+    RANKING: 0.1,
+    ENRICHING: 20.0,
+}
+MIN_SAMPLES = 3  # Timings needed before a narrower window is trusted
+REFRESH_INTERVAL = 60  # Seconds a window is reused before it is read again
+CACHED_SECONDS = 0.5  # Service time of a cached basic search, before enrichment
+
+
+def quantile(samples, q):
+    """Linearly interpolated quantile of a sorted list"""
+    if not samples:
+        return None
+    position = (len(samples) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+
+class LatencyModel:
+    """Rolling stage-latency quantiles per website and ranking type"""
+
+    def __init__(self, store=None):
+        self.store = store or search_state
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def window(self, stage, website, ranking_type):
+        """Sorted recent durations of a stage; per item for the enriching stage"""
+        key = (stage, website, ranking_type)
+        now = time.time()
+        with self._lock:
+            cached = self._windows.get(key)
+        if cached is not None and now - cached[0] < REFRESH_INTERVAL:
+            return cached[1]
+
+        samples = []
+        for scope in ((website, ranking_type), (None, ranking_type), (None, None)):
+            samples = sorted(seconds / items if stage == ENRICHING else seconds
+                             for seconds, items in self.store.timings(stage, *scope)
+                             if stage != ENRICHING or items)
+            if len(samples) >= MIN_SAMPLES:
+                break
+        if len(samples) < MIN_SAMPLES:
+            samples = []
+        with self._lock:
+            self._windows[key] = (now, samples)
+        return samples
+
+    def stage_seconds(self, stage, website, ranking_type, q=0.5):
+        """Expected duration of a stage at quantile q"""
+        estimate = quantile(self.window(stage, website, ranking_type), q)
+        return DEFAULT_SECONDS[stage] if estimate is None else estimate
+
+    def predict(self, website, ranking_type, cached=False, prefetch=0, basic=True, q=0.5):
+        """Expected seconds a search job keeps a scheduler thread busy.
+
+        Args:
+            cached (bool): The basic results are cached, so no API calls are made
+            prefetch (int): Results the job analyzes after the basic search
+            basic (bool): False for a job resuming at the enriching stage
+        """
+        website = (website or '').lower()
+        seconds = prefetch * self.stage_seconds(ENRICHING, website, ranking_type, q)
+        if cached:
+            seconds += CACHED_SECONDS
+        elif basic:
+            seconds += sum(self.stage_seconds(stage, website, ranking_type, q) for stage in (SEARCHING, PARSING, RANKING))
+        return seconds
+
+    def record(self, website, ranking_type, stage, seconds, items=None):
+        """Keep one stage timing and refresh the windows it belongs to"""
+        self.store.record_timing(website, ranking_type, stage, seconds, items)
+        with self._lock:
+            for key in [key for key in self._windows if key[0] == stage]:
+                del self._windows[key]
+
+    def clear(self):
+        """Forget cached windows"""
+        with self._lock:
+            self._windows.clear()
+
+
+latency_model = LatencyModel()
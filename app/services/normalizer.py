@@ -0,0 +1,166 @@
+"""Turn Firecrawl extract responses into canonical result records.
+
+Extract responses come back in several shapes, depending on the schema
+sent and on how the model filled it in:
+
+* the nested envelope, ``{'data': {'data': {<first result>, 'results': [...]}}}``
+* a flat one, ``{'data': {'results': [...]}}`` or ``{'results': [...]}``
+* a list of result dicts or SDK objects
+
+Field names drift between them as well: ``tips`` or ``tipsTricks`` for
+``tips_and_tricks``, ``imageUrl`` for ``image_url``, ``description`` for
+``summary``. ``FIELD_ALIASES`` lists every accepted name for each canonical
+field.
+
+The envelope is unwrapped in Python, which only takes a step per nesting
+level. All items are then validated in a single call to a ``TypeAdapter``
+compiled once at import. pydantic-core resolves the aliases, fills in the
+defaults and drops unknown keys in that one pass, and the plain dicts it
+returns become the slotted SearchResult records of a ResultSet. Ratings are coerced in the loop
+that numbers the records; a validator callback per item cost more than
+the rest of the validation together. See
+``scripts/bench_normalizer.py`` for a comparison with the hand-written
+loops this replaced.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+from pydantic import AliasChoices, ConfigDict, Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, TypedDict
+
+from app.models.search import SearchResult, ResultSet
+
+logger = logging.getLogger('normalizer')
+
+# Every name a field arrives under, canonical name first
+FIELD_ALIASES = {
+    'title': ('title', 'name'),
+    'summary': ('summary', 'description'),
+    'big_difference': ('big_difference', 'bigDifference', 'uniqueAspect', 'unique'),
+    'key_takeaways': ('key_takeaways', 'keyTakeaways'),
+    'pros': ('pros',),
+    'cons': ('cons',),
+    'tips_and_tricks': ('tips_and_tricks', 'tips', 'tipsTricks', 'tipsAndTricks'),
+    'url': ('url', 'link'),
+    'image_url': ('image_url', 'imageUrl', 'image'),
+    'rating': ('rating',),
+    'review_count': ('review_count', 'reviewCount', 'rating_count', 'ratingCount', 'reviews', 'num_reviews'),
+    'published': ('published', 'datePublished', 'date_published', 'published_at', 'date'),
+}
+
+# Keys that show a dict is a result rather than an envelope
+RESULT_KEYS = frozenset(('title', 'name', 'url', 'link'))
+
+
+def _rating(value):
+    """A positive float, or None for missing, zero or unparseable ratings"""
+    try:
+        return float(value) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def _count(value):
+    """A review count such as 12000 or '12,000', or None"""
+    try:
+        return int(float(str(value).replace(',', '')))
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp(value):
+    """Unix time of an ISO date or a year, or None"""
+    if isinstance(value, (int, float)) and value > 9999:
+        return float(value)
+    text = str(value).strip().replace('Z', '+00:00')
+    try:
+        if text.isdigit() and len(text) == 4:
+            published = datetime(int(text), 1, 1)
+        else:
+            published = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.timestamp()
+
+
+def _field(name, **default):
+    return Field(validation_alias=AliasChoices(*FIELD_ALIASES[name]), **default)
+
+
+class ResultRecord(TypedDict):
+    """A search result as the rest of the app uses it"""
+    __pydantic_config__ = ConfigDict(extra='ignore', coerce_numbers_to_str=True)
+
+    title: Annotated[Optional[str], _field('title', default='Untitled')]
+    summary: Annotated[Optional[str], _field('summary', default='')]
+    big_difference: Annotated[Optional[str], _field('big_difference', default='')]
+    key_takeaways: Annotated[Any, _field('key_takeaways', default=[])]
+    pros: Annotated[Any, _field('pros', default=[])]
+    cons: Annotated[Any, _field('cons', default=[])]
+    tips_and_tricks: Annotated[Any, _field('tips_and_tricks', default=[])]
+    url: Annotated[Optional[str], _field('url', default='')]
+    image_url: Annotated[Optional[str], _field('image_url', default='')]
+    rating: Annotated[Any, _field('rating', default=None)]
+    review_count: Annotated[Any, _field('review_count', default=None)]
+    published: Annotated[Any, _field('published', default=None)]
+
+
+records_adapter = TypeAdapter(List[ResultRecord])
+record_adapter = TypeAdapter(ResultRecord)
+
+
+def _items(response):
+    """Raw result items of a response in relevance order, or None for an unknown shape"""
+    if isinstance(response, list):
+        return [item if isinstance(item, dict) else getattr(item, '__dict__', {}) for item in response]
+    if not isinstance(response, dict):
+        return None
+    node = response
+    while isinstance(node.get('data'), dict) and not RESULT_KEYS.intersection(node):
+        node = node['data']
+    items = [node] if RESULT_KEYS.intersection(node) else []
+    results = node.get('results')
+    if isinstance(results, list):
+        items.extend(item for item in results if isinstance(item, dict))
+    return items
+
+
+def normalize_response(response):
+    """Canonical result records from any extract response shape.
+
+    Records are ranked from 1 in the order the response listed them.
+
+    Returns:
+        ResultSet: The records, or None when the response has an unknown shape
+    """
+    items = _items(response)
+    if items is None:
+        logger.warning(f"Unexpected response type: {type(response)}")
+        return None
+    try:
+        records = records_adapter.validate_python(items)
+    except ValidationError as e:
+        # One malformed item should not cost the others
+        logger.warning(f"Dropping malformed results: {e.error_count()} errors")
+        records = []
+        for item in items:
+            try:
+                records.append(record_adapter.validate_python(item))
+            except ValidationError:
+                continue
+    results = ResultSet()
+    for rank, record in enumerate(records, start=1):
+        record['rating'] = _rating(record['rating'])
+        record['review_count'] = _count(record['review_count'])
+        record['published'] = _timestamp(record['published'])
+        results.append(SearchResult(rank=rank, **record))
+    return results
+
+
+def normalize_record(response):
+    """The first canonical record of a single-page extract as a dict, or an empty dict"""
+    records = normalize_response(response)
+    return records[0].to_dict() if records else {}
@@ -0,0 +1,218 @@
+"""Optional cache sharing between app instances.
+
+When several machines run, each one would otherwise pay Firecrawl for the
+same queries. Instances listed in ``CACHE_PEERS`` form a consistent hash
+ring; every key has one owning instance. On a local miss we ask the owner
+for the key over HTTP before doing any paid work, and values we compute
+for keys owned elsewhere are pushed to their owner so the next instance
+finds them there. Peer calls use a short timeout and any failure is
+treated as a miss, so a dead peer only costs a little latency.
+
+Sharing fails closed: without ``CACHE_PEER_SECRET`` the peer endpoints are
+off and we never ask peers for anything. Values travel in the codec's
+portable encoding, so bytes from the network are never unpickled or
+unmarshalled; values that are not portable stay local.
+"""
+import bisect
+import hashlib
+import hmac
+import logging
+import time
+from urllib.parse import quote
+
+import requests
+from flask import current_app
+
+from app.extensions import cache
+from app.services.cache_codec import (cache_get, cache_set, decode, encode, encode_portable, decode_portable,
+                                      PortableError)
+from app.services.cache_index import cache_index
+
+logger = logging.getLogger('peer_cache')
+
+PEER_TIMEOUT = 0.5  # Seconds; a slow peer must never be slower than a miss
+RING_REPLICAS = 100  # Virtual nodes per peer
+PEER_MAX_BYTES = 16 * 1024 * 1024  # Largest value accepted from a peer, decompressed
+SECRET_HEADER = 'X-Peer-Secret'
+TTL_HEADER = 'X-Cache-TTL'
+TAGS_HEADER = 'X-Cache-Tags'
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to peers"""
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        self._ring = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def node_for(self, key):
+        """Peer owning a key, or None for an empty ring"""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+_rings = {}
+_warned = set()
+
+
+def _peers():
+    return [p.rstrip('/') for p in current_app.config.get('CACHE_PEERS') or [] if p]
+
+
+def _self_url():
+    return (current_app.config.get('CACHE_PEER_SELF') or '').rstrip('/')
+
+
+def enabled():
+    """Whether peers are configured along with the shared secret"""
+    if not _peers() or not _self_url():
+        return False
+    if not current_app.config.get('CACHE_PEER_SECRET'):
+        if 'secret' not in _warned:
+            _warned.add('secret')
+            logger.warning("CACHE_PEERS is set without CACHE_PEER_SECRET, peer cache sharing is disabled")
+        return False
+    return True
+
+
+def ring():
+    """Hash ring for the configured peers, including this instance"""
+    nodes = tuple(sorted(set(_peers()) | {_self_url()}))
+    if nodes not in _rings:
+        _rings[nodes] = HashRing(nodes)
+    return _rings[nodes]
+
+
+def owner(key):
+    """Base URL of the instance owning a key"""
+    return ring().node_for(key)
+
+
+def _headers():
+    return {SECRET_HEADER: current_app.config['CACHE_PEER_SECRET']}
+
+
+def authorized(request):
+    """Check a peer request carries the shared secret; nothing is authorized without one"""
+    secret = current_app.config.get('CACHE_PEER_SECRET')
+    if not secret:
+        return False
+    return hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode(), secret.encode())
+
+
+def _url(base, key):
+    return f"{base}/peer/cache/{quote(key, safe='')}"
+
+
+def _timeout():
+    return current_app.config.get('CACHE_PEER_TIMEOUT', PEER_TIMEOUT)
+
+
+def fetch(key):
+    """Ask the owning peer for a key.
+
+    A hit is stored locally with the remaining TTL the owner reported.
+
+    Returns:
+        The decoded value, or None on a miss, error or when we own the key
+    """
+    if not enabled():
+        return None
+    peer = owner(key)
+    if peer == _self_url():
+        return None
+    try:
+        response = requests.get(_url(peer, key), headers=_headers(), timeout=_timeout())
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Peer {peer} unavailable for {key}: {str(e)}")
+        return None
+    if response.status_code != 200:
+        return None
+
+    try:
+        value = decode_portable(response.content, PEER_MAX_BYTES)
+        ttl = int(response.headers.get(TTL_HEADER) or 0) or None
+    except (PortableError, ValueError) as e:
+        logger.warning(f"Ignoring invalid value for {key} from peer {peer}: {str(e)}")
+        return None
+    tags = [t for t in response.headers.get(TAGS_HEADER, '').split(',') if t]
+    store_local(key, value, timeout=ttl, tags=tags)
+    logger.info(f"Peer cache hit for {key} from {peer}")
+    return value
+
+
+def publish(key, value, timeout=None, tags=()):
+    """Push a value to the peer that owns its key"""
+    if not enabled():
+        return False
+    peer = owner(key)
+    if peer == _self_url():
+        return False
+    try:
+        blob = encode_portable(value)
+    except PortableError as e:
+        logger.debug(f"Not publishing {key}: {str(e)}")
+        return False
+    headers = _headers()
+    headers['Content-Type'] = 'application/octet-stream'
+    if timeout:
+        headers[TTL_HEADER] = str(int(timeout))
+    if tags:
+        headers[TAGS_HEADER] = ','.join(tags)
+    try:
+        response = requests.put(_url(peer, key), data=blob, headers=headers, timeout=_timeout())
+        return response.status_code == 204
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Failed to publish {key} to peer {peer}: {str(e)}")
+        return False
+
+
+def get_shared(key):
+    """Look a key up locally, then at its owning peer"""
+    value = cache_get(key)
+    if value is None:
+        value = fetch(key)
+    return value
+
+
+def set_shared(key, value, timeout=None, tags=()):
+    """Store a value locally and at its owning peer"""
+    cache_set(key, value, timeout=timeout, tags=tags)
+    publish(key, value, timeout=timeout, tags=tags)
+
+
+def local_entry(key):
+    """Portable local value, remaining TTL and tags, for serving peers"""
+    blob = cache.get(key)
+    if not isinstance(blob, bytes):
+        return None, None, ()
+    try:
+        blob = encode_portable(decode(blob))
+    except PortableError:
+        return None, None, ()
+    meta = cache_index.get(key)
+    ttl = None
+    tags = ()
+    if meta:
+        tags = [t for t in meta['tags'] if not t.startswith('schema:')]
+        if meta['expires_at']:
+            ttl = max(int(meta['expires_at'] - time.time()), 1)
+    return blob, ttl, tags
+
+
+def store_local(key, value, timeout=None, tags=()):
+    """Store a value received from a peer in the local cache"""
+    blob = encode(value)
+    cache.set(key, blob, timeout=timeout)
+    cache_index.record_write(key, len(blob), tags, timeout)
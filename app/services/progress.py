@@ -0,0 +1,107 @@
+"""Stage-level progress of a search, with a finishing estimate.
+
+A search moves through the pipeline stages below. Each time it enters a
+stage, or finishes another item of the enriching stage, the search's
+progress record in the search-state store is rewritten::
+
+    {'stage': 'enriching', 'done': 1, 'total': 2, 'eta': 14.0, 'at': 1760000000.0}
+
+``eta`` is the number of seconds the rest of the current phase is expected
+to take, as of the write at time ``at``: until the basic results show for
+the stages the loading page waits on, and until the last prefetched card
+is analyzed while enriching. Expected stage durations are the median of how long the
+stage recently took for the same website and ranking type, from the
+latency model.
+
+When a stage ends, its duration is kept in the store, so estimates follow
+Firecrawl as it gets faster or slower and are shared by every worker.
+
+A search served from the cache never enters the searching stage, so the
+searching timings only ever measure real API calls.
+"""
+import logging
+import time
+
+from app.services.latency import latency_model, QUEUED, SEARCHING, PARSING, RANKING, ENRICHING
+from app.services.search_state import search_state
+
+logger = logging.getLogger('progress')
+
+DONE = 'done'
+
+MIN_POLL_INTERVAL = 1  # Seconds between status polls near the end of a stage
+MAX_POLL_INTERVAL = 10  # Seconds between status polls early in a long stage
+
+# Stages the loading page waits for, in order
+BASIC_STAGES = (QUEUED, SEARCHING, PARSING, RANKING)
+
+
+class StageProgress:
+    """Reports the stages one search goes through and times them"""
+
+    def __init__(self, search_id, website, ranking_type='relevance', store=None, model=None):
+        self.search_id = search_id
+        self.website = (website or '').lower()
+        self.ranking_type = ranking_type
+        self.store = store or search_state
+        self.model = model or latency_model
+        self.stage = None
+        self.started_at = None
+        self.done = None
+
+    def expected(self, stage):
+        return self.model.stage_seconds(stage, self.website, self.ranking_type)
+
+    def eta(self, done=None, total=None):
+        """Seconds until the current phase is expected to end, at stage entry"""
+        if self.stage == ENRICHING:
+            return round(self.expected(ENRICHING) * max((total or 0) - (done or 0), 0), 1)
+        if self.stage not in BASIC_STAGES:
+            return None
+        remaining = BASIC_STAGES[BASIC_STAGES.index(self.stage):]
+        return round(sum(self.expected(stage) for stage in remaining), 1)
+
+    def report(self, stage, done=None, total=None):
+        """Enter a stage, or move on within it, and publish the new record"""
+        now = time.time()
+        if stage != self.stage:
+            self._finish_stage(now)
+            self.stage = stage
+            self.started_at = now
+        self.done = done
+        if stage == DONE:
+            return
+        self.store.set_progress(self.search_id, {
+            'stage': stage,
+            'done': done,
+            'total': total,
+            'eta': self.eta(done, total),
+            'at': round(now, 3),
+        })
+
+    def _finish_stage(self, now):
+        if self.stage is None or self.started_at is None:
+            return
+        if self.stage == ENRICHING and not self.done:
+            return  # Nothing was analyzed, so there is no per-item time to learn
+        try:
+            self.model.record(self.website, self.ranking_type, self.stage, now - self.started_at,
+                              self.done if self.stage == ENRICHING else None)
+        except Exception as e:
+            # Timings only improve estimates; never fail a search over them
+            logger.warning(f"Could not record {self.stage} timing: {str(e)}")
+
+
+def remaining(progress, now=None):
+    """Seconds still expected from a progress record, or None without an estimate"""
+    if not progress or progress.get('eta') is None:
+        return None
+    elapsed = (now or time.time()) - progress.get('at', now or time.time())
+    return round(max(progress['eta'] - elapsed, 0), 1)
+
+
+def poll_interval(eta):
+    """Seconds a client should wait before asking again, given the time still expected"""
+    if eta is None:
+        return MIN_POLL_INTERVAL
+    return min(max(eta / 4, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
@@ -0,0 +1,156 @@
+"""Per-user and per-session Firecrawl credit quotas.
+
+``FIRECRAWL_DAILY_LIMIT`` is shared by everyone, so each owner (a user, or
+an anonymous session) also gets a daily allowance and an hourly burst
+allowance of its own. Credits are counted in the ``CreditUsage`` table with
+one row per owner and window, incremented in place. An owner who runs out
+can still search, but only cached results are served until the window
+rolls over. Admins and cache warming are not limited.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.usage import CreditUsage
+from app.services.scheduler import AUTHENTICATED, ANONYMOUS
+
+logger = logging.getLogger('quotas')
+
+DAILY_LIMITS = {AUTHENTICATED: 30, ANONYMOUS: 5}
+BURST_LIMITS = {AUTHENTICATED: 10, ANONYMOUS: 3}  # Per hour
+LIMIT_SETTINGS = {
+    AUTHENTICATED: ('QUOTA_DAILY_USER', 'QUOTA_BURST_USER'),
+    ANONYMOUS: ('QUOTA_DAILY_ANONYMOUS', 'QUOTA_BURST_ANONYMOUS'),
+}
+HOUR_ROWS_KEPT = timedelta(days=2)
+EXHAUSTED = 'quota_exhausted'  # Error recorded on a search stopped by its owner's quota
+
+# Everyone's credits today, as of the last charge in this process
+_spent_today = {'day': None, 'credits': 0}
+
+
+def limits(priority):
+    """(daily, hourly) credit limits for a priority class; None is unlimited"""
+    if priority not in LIMIT_SETTINGS:
+        return None, None
+    daily_setting, burst_setting = LIMIT_SETTINGS[priority]
+    return (current_app.config.get(daily_setting, DAILY_LIMITS[priority]),
+            current_app.config.get(burst_setting, BURST_LIMITS[priority]))
+
+
+def _windows(now=None):
+    now = now or datetime.utcnow()
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {'day': day, 'hour': now.replace(minute=0, second=0, microsecond=0)}
+
+
+def _increment(owner, window, start, credits):
+    return CreditUsage.query.filter_by(owner=owner, window=window, window_start=start).update(
+        {CreditUsage.credits: CreditUsage.credits + credits}, synchronize_session=False
+    )
+
+
+def charge(owner, credits=1, user_id=None):
+    """Count credits spent on behalf of an owner"""
+    for window, start in _windows().items():
+        if _increment(owner, window, start, credits):
+            continue
+        try:
+            # A savepoint, so losing the race does not undo the other window's increment
+            with db.session.begin_nested():
+                db.session.add(CreditUsage(owner=owner, user_id=user_id, window=window,
+                                           window_start=start, credits=credits))
+        except IntegrityError:
+            # Another worker created the row first
+            _increment(owner, window, start, credits)
+        if window == 'hour':
+            CreditUsage.query.filter(
+                CreditUsage.owner == owner,
+                CreditUsage.window == 'hour',
+                CreditUsage.window_start < start - HOUR_ROWS_KEPT
+            ).delete(synchronize_session=False)
+    db.session.commit()
+    _refresh_spent_today()
+
+
+def _refresh_spent_today():
+    day = _windows()['day']
+    total = db.session.query(db.func.sum(CreditUsage.credits))\
+        .filter(CreditUsage.window == 'day', CreditUsage.window_start == day).scalar()
+    _spent_today.update(day=day, credits=total or 0)
+
+
+def spent_today():
+    """Credits spent today by all owners, or None when not yet known.
+
+    Read from memory, refreshed on every charge, so it is cheap enough for
+    the load endpoint; it never queries the database itself.
+    """
+    if _spent_today['day'] != _windows()['day']:
+        return None
+    return _spent_today['credits']
+
+
+def usage(owner):
+    """Credits used in the current day and hour"""
+    windows = _windows()
+    rows = CreditUsage.query.filter(
+        CreditUsage.owner == owner,
+        db.or_(
+            db.and_(CreditUsage.window == 'day', CreditUsage.window_start == windows['day']),
+            db.and_(CreditUsage.window == 'hour', CreditUsage.window_start == windows['hour']),
+        )
+    ).all()
+    used = {'day': 0, 'hour': 0}
+    for row in rows:
+        used[row.window] = row.credits
+    return used
+
+
+def remaining(owner, priority):
+    """Credits the owner may still spend now, or None when unlimited"""
+    daily, burst = limits(priority)
+    if daily is None:
+        return None
+    used = usage(owner)
+    return max(min(daily - used['day'], burst - used['hour']), 0)
+
+
+def allowed(owner, priority):
+    left = remaining(owner, priority)
+    return left is None or left > 0
+
+
+def summary(owner, priority):
+    """Usage and limits for display"""
+    daily, burst = limits(priority)
+    used = usage(owner)
+    return {
+        'day': used['day'],
+        'hour': used['hour'],
+        'daily_limit': daily,
+        'burst_limit': burst,
+        'remaining': remaining(owner, priority),
+    }
+
+
+def daily_totals(days=30):
+    """(day, credits) spent by everyone for the last days, oldest first"""
+    since = _windows()['day'] - timedelta(days=days - 1)
+    return db.session.query(CreditUsage.window_start, db.func.sum(CreditUsage.credits))\
+        .filter(CreditUsage.window == 'day', CreditUsage.window_start >= since)\
+        .group_by(CreditUsage.window_start).order_by(CreditUsage.window_start).all()
+
+
+def next_reset():
+    """When today's daily allowances renew"""
+    return _windows()['day'] + timedelta(days=1)
+
+
+def top_owners(limit=20):
+    """Today's heaviest users and sessions, for the admin dashboard"""
+    return CreditUsage.query.filter_by(window='day', window_start=_windows()['day'])\
+        .order_by(CreditUsage.credits.desc()).limit(limit).all()
@@ -0,0 +1,200 @@
+"""Vectorized ranking of search results.
+
+A ranked view of a result set is a weighted sum of features, computed for
+the whole candidate set at once as NumPy arrays:
+
+* ``relevance``: the position the search returned a result at, discounted
+  logarithmically as in DCG, so the first few places count the most.
+* ``quality``: the rating, adjusted for the number of reviews behind it.
+  The Bayesian average adds ``PRIOR_REVIEWS`` imaginary reviews at the
+  set's mean rating, so a 4.9 from 3 reviews no longer beats a 4.7 from
+  12,000. The Wilson lower bound reads the rating as a share of positive
+  reviews and scores the bottom of its 95% confidence interval, which is
+  harsher on thin evidence.
+* ``recency``: the publication date, halving every ``RECENCY_HALF_LIFE_DAYS``.
+
+A result with no rating, or no date, has no evidence either way and scores
+as the average result of the set on that feature instead of sinking below
+everything. Each feature is scaled to [0, 1] over the set before the
+weights apply, so a weight compares features rather than units.
+
+A ranking type is a set of weights and a quality estimator; ``register``
+adds one and the ``RANKING_WEIGHTS`` setting overrides the weights of a
+type. Taking the top k does not sort the whole set: ``argpartition``
+selects the k best in linear time and only those are sorted. Ties go to
+the more relevant result.
+"""
+import logging
+import time
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.models.search import ResultSet
+
+logger = logging.getLogger('ranking')
+
+# Ranking types
+RELEVANCE = 'relevance'
+RATINGS = 'ratings'
+
+# Quality estimators
+BAYESIAN = 'bayesian'
+WILSON = 'wilson'
+
+RATING_SCALE = 5.0  # Ratings are out of five stars
+PRIOR_RATING = 3.5  # Prior mean when nothing in the set is rated
+PRIOR_REVIEWS = 20  # Weight of the prior mean, in reviews
+UNKNOWN_REVIEWS = 1  # Reviews assumed behind a rating without a count
+WILSON_Z = 1.96  # 95% confidence
+RECENCY_HALF_LIFE_DAYS = 365
+TIE_BREAK = 1e-9  # Score given up per position, so ties keep relevance order
+
+RANKINGS = {}
+
+
+def register(name, estimator=None, **weights):
+    """Add or replace a ranking type.
+
+    Args:
+        estimator (str): BAYESIAN or WILSON; None follows ``RANKING_ESTIMATOR``
+        weights: Weight per feature: relevance, quality and recency
+    """
+    RANKINGS[name] = {'estimator': estimator, 'weights': weights}
+
+
+register(RELEVANCE, relevance=1.0)
+register(RATINGS, quality=1.0, relevance=0.1, recency=0.05)
+
+
+def _config(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def _floats(values):
+    """A float array of values, NaN where one is missing or not a number"""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        array = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                array[index] = float(value)
+            except (TypeError, ValueError):
+                continue
+        return array
+
+
+def _fill_unknown(scores):
+    """Scores with NaN replaced by the mean of the known ones, or zero"""
+    known = ~np.isnan(scores)
+    count = np.count_nonzero(known)
+    if count == len(scores):
+        return scores
+    if not count:
+        return np.zeros_like(scores)
+    return np.where(known, scores, scores[known].sum() / count)
+
+
+def _scaled(values):
+    """Values mapped linearly onto [0, 1]; all zeros when they are all equal"""
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+def relevance_scores(size):
+    """Logarithmic discount of each position"""
+    return 1.0 / np.log2(np.arange(size) + 2.0)
+
+
+def bayesian_average(ratings, counts, prior_reviews=PRIOR_REVIEWS):
+    """Ratings pulled towards the mean rating by prior_reviews reviews; NaN where unrated"""
+    rated = ratings[~np.isnan(ratings)]
+    prior = rated.sum() / len(rated) if len(rated) else PRIOR_RATING
+    return (prior_reviews * prior + counts * ratings) / (prior_reviews + counts)
+
+
+def wilson_lower_bound(ratings, counts, z=WILSON_Z):
+    """Lower bound of the share of positive reviews; NaN where unrated"""
+    share = np.clip(ratings / RATING_SCALE, 0.0, 1.0)
+    z2 = z * z
+    centre = share + z2 / (2 * counts)
+    margin = z * np.sqrt(share * (1 - share) / counts + z2 / (4 * counts * counts))
+    return (centre - margin) / (1 + z2 / counts)
+
+
+def quality_scores(ratings, counts, estimator=BAYESIAN):
+    """Review-adjusted rating of each result"""
+    counts = np.where(np.isnan(counts) | (counts < 1), UNKNOWN_REVIEWS, counts)
+    if estimator == WILSON:
+        scores = wilson_lower_bound(ratings, counts)
+    else:
+        scores = bayesian_average(ratings, counts, _config('RANKING_PRIOR_REVIEWS', PRIOR_REVIEWS))
+    return _fill_unknown(scores)
+
+
+def recency_scores(published, now):
+    """Exponential decay of each result's age"""
+    age_days = np.maximum(now - published, 0.0) / 86400
+    return _fill_unknown(0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS))
+
+
+def ranking_for(ranking_type):
+    """Weights and estimator of a ranking type; unknown types rank by relevance"""
+    ranking = RANKINGS.get(ranking_type)
+    if ranking is None:
+        logger.warning(f"Unknown ranking type {ranking_type}, ranking by relevance")
+        ranking = RANKINGS[RELEVANCE]
+    weights = _config('RANKING_WEIGHTS', {}).get(ranking_type, ranking['weights'])
+    estimator = ranking['estimator'] or _config('RANKING_ESTIMATOR', BAYESIAN)
+    return weights, estimator
+
+
+def scores(results, ranking_type=RELEVANCE, now=None):
+    """Score of every result in a relevance-ordered set, higher first"""
+    weights, estimator = ranking_for(ranking_type)
+    size = len(results)
+    total = np.zeros(size)
+    if weights.get('relevance'):
+        total += weights['relevance'] * _scaled(relevance_scores(size))
+    if weights.get('quality'):
+        quality = quality_scores(_floats(results.column('rating')), _floats(results.column('review_count')),
+                                 estimator)
+        total += weights['quality'] * _scaled(quality)
+    if weights.get('recency'):
+        now = time.time() if now is None else now
+        total += weights['recency'] * _scaled(recency_scores(_floats(results.column('published')), now))
+    return total - np.arange(size) * TIE_BREAK
+
+
+def rank(results, ranking_type=RELEVANCE, limit=None, now=None):
+    """The best results of a relevance-ordered set, best first.
+
+    Args:
+        limit (int): Results to return; None ranks the whole set
+        now (float): Unix time recency is measured from, for tests
+
+    Returns:
+        ResultSet: A new set; the one passed in is never reordered
+    """
+    results = ResultSet.coerce(results)
+    size = len(results)
+    k = size if limit is None else max(min(limit, size), 0)
+    if k == 0:
+        return ResultSet()
+    weights, _ = ranking_for(ranking_type)
+    if not any(weight for name, weight in weights.items() if name != 'relevance'):
+        # Relevance order is the order the set is already in
+        return ResultSet(results[:k])
+
+    score = scores(results, ranking_type, now)
+    if k < size:
+        top = np.argpartition(-score, k - 1)[:k]
+        order = top[np.argsort(-score[top])]
+    else:
+        order = np.argsort(-score)
+    return ResultSet(results[index] for index in order)
@@ -0,0 +1,293 @@
+"""Fair-share scheduler for background search jobs.
+
+Searches used to get a thread each, in arrival order, so one client
+submitting dozens of searches delayed everybody else. Jobs now go through
+one scheduler per worker process:
+
+* Fair queuing per owner (a user, or an anonymous session). Each job is
+  tagged with a virtual start time and a virtual finish time, the start
+  plus its expected duration over its weight. An owner's next job starts
+  where its previous one would finish, so a client with many queued jobs
+  takes turns with everyone else instead of going first.
+* Shortest expected job first: jobs run in order of virtual finish time,
+  so a cached or cheap search overtakes a long ratings extraction queued
+  at the same time, which lowers the mean wait. Virtual time moves up to
+  the finish tag of every job that completes and new jobs are tagged from
+  there, so a long job is overtaken by at most about its own length of
+  shorter work and cannot starve. Durations come from the latency model;
+  a job without one is assumed to take as long as the average job.
+* Priority classes set the weight of each job (admins advance their virtual
+  time slowest) and break ties. Cache warming is background work: it only
+  runs when no interactive job is waiting and never takes the reserved
+  threads, so interactive latency stays predictable.
+* At most ``SEARCH_MAX_PER_WEBSITE`` jobs run against one website at once;
+  further jobs for it wait while jobs for other sites go ahead.
+
+The scheduler lives in the process, like the cache. Its threads start on
+first use, after gunicorn has forked the worker. When the worker shuts down
+the scheduler is drained: it stops taking jobs, gives running ones until
+``SEARCH_DRAIN_TIMEOUT`` to finish, and checkpoints whatever is left so the
+next process can resume it. Before that, ``begin_shutdown`` tells
+long-lived requests such as event streams to end, so gunicorn is not left
+waiting on them until it kills the worker.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+
+logger = logging.getLogger('scheduler')
+
+# Priority classes, most important first
+ADMIN = 'admin'
+AUTHENTICATED = 'authenticated'
+ANONYMOUS = 'anonymous'
+WARMING = 'warming'
+
+PRIORITIES = (ADMIN, AUTHENTICATED, ANONYMOUS, WARMING)
+WEIGHTS = {ADMIN: 4.0, AUTHENTICATED: 2.0, ANONYMOUS: 1.0, WARMING: 1.0}
+
+WORKERS = 4  # Concurrent search jobs per process
+MAX_PER_WEBSITE = 2  # Concurrent jobs against one website
+RESERVED_WORKERS = 1  # Threads background work may never use
+DURATION_SMOOTHING = 0.2  # Weight of the latest job in the average duration
+DEFAULT_JOB_SECONDS = 30  # Assumed duration of a job before any has finished
+DRAIN_TIMEOUT = 15  # Seconds running jobs get to finish at shutdown
+
+
+def smooth(average, value):
+    """Exponentially weighted moving average, starting at the first value"""
+    if average is None:
+        return value
+    return average + DURATION_SMOOTHING * (value - average)
+
+
+class SchedulerDraining(RuntimeError):
+    """Raised when a job is submitted to a scheduler that is shutting down"""
+    pass
+
+
+class Job:
+    """A queued unit of work and its scheduling tags"""
+
+    def __init__(self, fn, owner, priority, website, start_tag, seq, checkpoint=None, expected_seconds=None):
+        self.fn = fn
+        self.checkpoint = checkpoint  # Called if the job is unfinished at shutdown
+        self.owner = owner
+        self.priority = priority
+        self.website = website
+        self.expected_seconds = expected_seconds
+        self.start_tag = start_tag
+        self.finish_tag = start_tag + expected_seconds / WEIGHTS[priority]
+        self.seq = seq
+        self.submitted_at = time.time()
+        self.started_at = None
+
+    @property
+    def interactive(self):
+        return self.priority != WARMING
+
+    def sort_key(self):
+        return (self.finish_tag, PRIORITIES.index(self.priority), self.seq)
+
+    def remaining(self, now):
+        """Expected seconds left, or all of them before the job starts"""
+        if self.started_at is None:
+            return self.expected_seconds
+        return max(self.expected_seconds - (now - self.started_at), 0)
+
+
+class SearchScheduler:
+    """Weighted fair queue of jobs served by a fixed pool of threads"""
+
+    def __init__(self, workers=WORKERS, max_per_website=MAX_PER_WEBSITE, reserved=RESERVED_WORKERS):
+        self.workers = workers
+        self.max_per_website = max_per_website
+        self.reserved = reserved
+        self._cond = threading.Condition()
+        self._pending = []
+        self._running = []
+        self._owner_finish = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._avg_duration = None
+        self._prediction_error = None
+        self._draining = False
+        self._pid = None
+
+    def configure(self, app):
+        """Pick up pool size and caps from the app config"""
+        self.workers = app.config.get('SEARCH_WORKERS', self.workers)
+        self.max_per_website = app.config.get('SEARCH_MAX_PER_WEBSITE', self.max_per_website)
+        self.reserved = min(app.config.get('SEARCH_RESERVED_WORKERS', self.reserved), self.workers - 1)
+
+    def _ensure_started(self):
+        """Start the worker threads once per process; caller holds the lock"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        # Jobs inherited from the parent process belong to its threads
+        self._pending = []
+        self._running = []
+        self._draining = False
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'search-worker-{i}', daemon=True).start()
+
+    def submit(self, fn, owner, priority=ANONYMOUS, website=None, checkpoint=None, expected_seconds=None):
+        """Queue fn to run on a worker thread.
+
+        Args:
+            expected_seconds (float): Predicted run time, see latency; shorter jobs go first
+
+        Returns:
+            Job: The queued job
+        """
+        if priority not in WEIGHTS:
+            raise ValueError(f"Unknown priority class {priority}")
+        with self._cond:
+            self._ensure_started()
+            if self._draining:
+                raise SchedulerDraining("Worker is shutting down")
+            if expected_seconds is None:
+                expected_seconds = self._avg_duration or DEFAULT_JOB_SECONDS
+            start = max(self._virtual_time, self._owner_finish.get(owner, 0.0))
+            job = Job(fn, owner, priority, (website or '').lower(), start, next(self._seq), checkpoint,
+                      expected_seconds)
+            self._owner_finish[owner] = job.finish_tag
+            self._pending.append(job)
+            self._cond.notify()
+        logger.info(f"Queued {priority} job for {owner} ({len(self._pending)} pending)")
+        return job
+
+    def _eligible(self, job, site_counts, background_running):
+        if job.website and site_counts[job.website] >= self.max_per_website:
+            return False
+        if not job.interactive:
+            if any(j.interactive for j in self._pending):
+                return False
+            if background_running >= self.workers - self.reserved:
+                return False
+        return True
+
+    def _next_job(self):
+        """Pop the best eligible job, or None; caller holds the lock"""
+        if self._draining:
+            return None
+        site_counts = Counter(j.website for j in self._running if j.website)
+        background_running = sum(1 for j in self._running if not j.interactive)
+        for job in sorted(self._pending, key=Job.sort_key):
+            if self._eligible(job, site_counts, background_running):
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _start(self, job):
+        """Mark a popped job as running; caller holds the lock"""
+        self._virtual_time = max(self._virtual_time, job.start_tag)
+        job.started_at = time.time()
+        self._running.append(job)
+
+    def _finish(self, job):
+        """Account for a finished job; caller holds the lock"""
+        self._running.remove(job)
+        self._virtual_time = max(self._virtual_time, job.finish_tag)
+        duration = time.time() - job.started_at
+        self._avg_duration = smooth(self._avg_duration, duration)
+        self._prediction_error = smooth(self._prediction_error, abs(duration - job.expected_seconds))
+        if not self._pending and not self._running:
+            # Idle: forget old owners so their tags cannot grow forever
+            self._owner_finish.clear()
+            self._virtual_time = 0.0
+        self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._start(job)
+            try:
+                job.fn()
+            except Exception:
+                logger.exception(f"Search job for {job.owner} failed")
+            finally:
+                with self._cond:
+                    self._finish(job)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Stop taking jobs, wait for running ones, then checkpoint the rest.
+
+        Returns:
+            list: Jobs left unfinished
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            self._draining = True
+            while self._running and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            unfinished = self._running + self._pending
+            self._pending = []
+        logger.info(f"Drained scheduler, {len(unfinished)} jobs unfinished")
+        for job in unfinished:
+            if job.checkpoint is None:
+                continue
+            try:
+                job.checkpoint()
+            except Exception:
+                logger.exception(f"Failed to checkpoint job for {job.owner}")
+        return unfinished
+
+    def estimated_wait(self):
+        """Seconds a new job would wait for the work ahead of it, or None before any job has run"""
+        if self._avg_duration is None:
+            return None
+        now = time.time()
+        ahead = sum(job.remaining(now) for job in self._pending + self._running)
+        return ahead / max(self.workers, 1)
+
+    def stats(self):
+        """Queue depth and running jobs, per priority class"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'draining': self._draining,
+                'pending': len(self._pending),
+                'running': len(self._running),
+                'utilization': len(self._running) / self.workers if self.workers else 1.0,
+                'avg_job_seconds': self._avg_duration,
+                'prediction_error_seconds': self._prediction_error,
+                'estimated_wait': self.estimated_wait(),
+                'pending_by_priority': dict(Counter(j.priority for j in self._pending)),
+                'running_by_website': dict(Counter(j.website for j in self._running if j.website)),
+            }
+
+
+scheduler = SearchScheduler()
+shutting_down = threading.Event()  # Set once the worker has been told to stop
+
+
+def begin_shutdown():
+    """Ask long-lived requests to end so the worker can drain before it is killed"""
+    shutting_down.set()
+
+
+def submit(fn, owner, priority=ANONYMOUS, website=None, checkpoint=None, expected_seconds=None):
+    """Queue a job on the process-wide scheduler"""
+    if scheduler._pid != os.getpid():
+        scheduler.configure(current_app)
+    return scheduler.submit(fn, owner, priority, website, checkpoint, expected_seconds)
+
+
+def drain_on_exit(app):
+    """Drain the process-wide scheduler before a worker exits"""
+    if scheduler._pid != os.getpid():
+        return []
+    with app.app_context():
+        return scheduler.drain(app.config.get('SEARCH_DRAIN_TIMEOUT', DRAIN_TIMEOUT))
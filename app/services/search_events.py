@@ -0,0 +1,130 @@
+"""Server-sent events with the progress and partial results of one search.
+
+The loading page used to poll ``/check_search_status`` every second, and
+the results page polled for enriched cards every two seconds. Both now hold
+one event stream open instead. The stream watches the search in the shared
+store: writes made in this process wake it at once, and writes made by
+another worker are picked up on the next check, every ``POLL_INTERVAL``.
+Comparing versions is a single indexed read, so nothing is decoded or
+sent unless the search actually changed.
+
+Events:
+
+* ``state``: the search state and its progress (stage, done, total)
+* ``results``: the whole result list, the first time it is available
+* ``result``: one item that changed since, such as a newly enriched card
+* ``done``: the search finished, failed or was cancelled; the stream ends
+* ``gone``: the search is unknown or expired
+
+An open stream keeps the search's heartbeat fresh in place of the status
+polls. Each stream holds a request thread, so streams per process are
+capped and last at most ``MAX_STREAM_SECONDS``, after which the browser
+reconnects. Streams also end as soon as the worker starts shutting down,
+so they do not hold up the drain. Clients turned away with a 503 fall back
+to polling.
+"""
+import json
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from app.models.search import json_default
+from app.services.scheduler import shutting_down
+from app.services.search_state import search_state, COMPLETE, ERROR, CANCELLED
+
+logger = logging.getLogger('search_events')
+
+POLL_INTERVAL = 0.5  # Seconds between store checks for writes by other workers
+KEEPALIVE_INTERVAL = 15  # Seconds between comments that keep proxies from closing the stream
+HEARTBEAT_INTERVAL = 5  # Seconds between search heartbeats while the stream is open
+MAX_STREAM_SECONDS = 300  # The browser reconnects after this
+MAX_STREAMS = 4  # Per worker process; each stream holds a request thread
+RETRY_MS = 2000  # Reconnect delay the browser is told to use
+
+FINISHED = (COMPLETE, ERROR, CANCELLED)
+
+
+class StreamSlots:
+    """Counts open streams so they cannot take every request thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+slots = StreamSlots()
+
+
+def format_event(event, data):
+    """One SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+def _item_key(result):
+    return result.url, bool(result.enriched)
+
+
+def stream(search_id, redirect_for, store=None):
+    """Yield SSE messages for a search until it finishes, the stream times out or the worker stops.
+
+    Args:
+        search_id (str): The search to follow
+        redirect_for (callable): Maps a finished snapshot to the URL the page should open
+        store (SearchStateStore): Optional store, for tests
+    """
+    store = store or search_state
+    max_seconds = current_app.config.get('SEARCH_EVENTS_MAX_SECONDS', MAX_STREAM_SECONDS)
+    started = last_sent = last_heartbeat = time.time()
+    seen_version = None
+    sent_items = None  # URL and enriched flag of every item sent so far
+
+    yield f"retry: {RETRY_MS}\n\n"
+    while not shutting_down.is_set():
+        now = time.time()
+        if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+            store.heartbeat(search_id)
+            last_heartbeat = now
+
+        snapshot = store.snapshot(search_id)
+        if snapshot is None:
+            yield format_event('gone', {})
+            return
+
+        version = (snapshot['version'], snapshot['result_version'])
+        if version != seen_version:
+            seen_version = version
+            yield format_event('state', {'state': snapshot['state'], 'progress': snapshot['progress']})
+            results = store.load_results(snapshot['result_key']) if snapshot['result_version'] else None
+            if results is not None:
+                if sent_items is None:
+                    yield format_event('results', results)
+                else:
+                    for result in results:
+                        if result.url and _item_key(result) not in sent_items:
+                            yield format_event('result', result)
+                sent_items = {_item_key(result) for result in results}
+            if snapshot['state'] in FINISHED:
+                yield format_event('done', {'state': snapshot['state'], 'error': snapshot['error'],
+                                            'redirect_url': redirect_for(snapshot)})
+                return
+            last_sent = now
+        elif now - last_sent >= KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = now
+
+        if now - started >= max_seconds or shutting_down.is_set():
+            return
+        store.wait_for_change(POLL_INTERVAL)
@@ -0,0 +1,608 @@
+"""Search state shared by every gunicorn worker.
+
+A search is started by whichever worker handles ``POST /search``, but the
+status polls and the results page can land on any worker. Their state used
+to live in the per-process SimpleCache, which pinned us to one worker. It
+now lives in a small SQLite database (WAL mode, separate from the app
+database) that all workers on a machine share.
+
+Each search moves through ``pending -> running -> complete | error``, with
+an ``enriching`` step before ``complete`` when basic results are shown
+first and filled in with comment analysis afterwards. Every
+transition is a single guarded UPDATE, so two workers can never both claim
+or finish the same search. Rows carry their own expiry and are swept
+periodically.
+
+A completed search does not hold its own copy of the results. It points at
+a result set (a ResultSet, stored column by column) keyed by website, query
+and ranking, so any number of page
+views of the same query share one copy. Identical searches running at the
+same time store into the same set, so storing merges: an enriched item is
+never replaced by a plain copy of the same result. Result sets have a short TTL and
+the table is kept under a byte cap by evicting the least recently read
+sets first, which keeps memory proportional to distinct queries.
+
+The loading page heartbeats its search on every status poll. A search whose
+heartbeat goes stale, or that is replaced by a newer search in the same
+session, is cancelled; the worker running it notices through its
+``SearchJob`` and stops before spending more credits. The job also carries
+the search's deadline, so every stage of the pipeline only gets the time
+that is left.
+
+A worker that shuts down with searches still queued or running moves them
+to ``interrupted`` with a checkpoint of their job: the stage reached, the
+Firecrawl extract job being polled and the time left. Results enriched so
+far are already in the result set. The next process to start claims them
+and picks each one up where it stopped.
+
+Params, checkpoints, progress and result sets are stored in the portable
+encoding (see ``cache_codec``), not marshal, so a checkpoint written before
+a deploy still decodes after a Python upgrade.
+
+Every write bumps a version on the search or its result set, and wakes
+anything in this process waiting in ``wait_for_change``. A progress stream
+only has to compare versions to know whether there is anything new to send.
+
+The store also keeps how long each pipeline stage recently took per
+website, which progress estimates finishing times from.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from app.models.search import SearchResult, ResultSet
+from app.services import quotas
+from app.services.cache_codec import encode_portable, decode_portable
+
+logger = logging.getLogger('search_state')
+
+STATE_TTL = 3600  # Keep finished searches for an hour
+RESULT_TTL = 3600  # Result sets live as long as the searches pointing at them
+MAX_RESULT_BYTES = 64 * 1024 * 1024  # Total size of all stored result sets
+CLEANUP_INTERVAL = 60  # Seconds between expiry sweeps
+HEARTBEAT_TIMEOUT = 30  # Seconds without a status poll before a search is abandoned
+TIMING_HISTORY = 200  # Stage timings kept per stage, website and ranking type
+SCHEMA_VERSION = 7
+
+PENDING = 'pending'
+RUNNING = 'running'
+ENRICHING = 'enriching'
+COMPLETE = 'complete'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+INTERRUPTED = 'interrupted'
+
+# Where an interrupted search picks up again
+SEARCH_STAGE = 'search'
+ENRICH_STAGE = 'enrich'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS search_state (
+    search_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    params BLOB,
+    result_key TEXT,
+    error TEXT,
+    checkpoint BLOB,
+    progress BLOB,
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS result_sets (
+    result_key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_sets_accessed ON result_sets (accessed_at);
+CREATE TABLE IF NOT EXISTS stage_timings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    website TEXT NOT NULL,
+    ranking_type TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    items INTEGER,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stage_timings_key ON stage_timings (stage, website, ranking_type, id);
+'''
+
+
+class SearchStateStore:
+    """SQLite-backed store for per-search parameters, results and errors"""
+
+    def __init__(self, app=None):
+        self._local = threading.local()
+        self._last_cleanup = 0
+        self._changed = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = app.config.get('SEARCH_STATE_DB')
+        if not path:
+            path = os.path.join(os.path.dirname(app.config.get('SQLITE_DB', '')), 'search_state.db')
+        app.extensions['search_state'] = path
+
+    def _connection(self):
+        """Per-thread connection, reopened after a fork"""
+        path = current_app.extensions['search_state']
+        key = (os.getpid(), path)
+        conn = getattr(self._local, 'connections', {}).get(key)
+        if conn is None:
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None, uri=path.startswith('file:'))
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._migrate(conn)
+            if not hasattr(self._local, 'connections'):
+                self._local.connections = {}
+            self._local.connections[key] = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        """Create the tables, dropping ones from an older layout.
+
+        Search state is short-lived, so discarding it on upgrade is fine.
+        """
+        if conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another worker may have migrated while we waited for the lock
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.execute('DROP TABLE IF EXISTS search_state')
+                conn.execute('DROP TABLE IF EXISTS result_sets')
+                conn.execute('DROP TABLE IF EXISTS stage_timings')
+                for statement in SCHEMA.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, timeout):
+        """Block until a write in this process, or for at most timeout seconds.
+
+        Writes by other workers do not wake the caller, so it should check
+        the store again after the timeout either way.
+        """
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _ttl(self):
+        return current_app.config.get('SEARCH_STATE_TTL', STATE_TTL)
+
+    def _maybe_cleanup(self, conn, now):
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        deleted = conn.execute('DELETE FROM search_state WHERE expires_at < ?', (now,)).rowcount
+        deleted_sets = conn.execute('DELETE FROM result_sets WHERE expires_at < ?', (now,)).rowcount
+        if deleted or deleted_sets:
+            logger.info(f"Removed {deleted} expired search states and {deleted_sets} result sets")
+
+    def _evict(self, conn):
+        """Drop least recently read result sets until under the byte cap"""
+        max_bytes = current_app.config.get('SEARCH_RESULT_MAX_BYTES', MAX_RESULT_BYTES)
+        evicted = conn.execute(
+            'DELETE FROM result_sets WHERE result_key IN ('
+            ' SELECT result_key FROM ('
+            '  SELECT result_key, SUM(size) OVER (ORDER BY accessed_at DESC, result_key) AS running'
+            '  FROM result_sets'
+            ' ) WHERE running > ?'
+            ')',
+            (max_bytes,)
+        ).rowcount
+        if evicted:
+            logger.info(f"Evicted {evicted} result sets over the {max_bytes} byte cap")
+
+    @staticmethod
+    def _merge(results, stored):
+        """Results with plain items swapped for enriched copies already stored"""
+        enriched = {item.url: item for item in stored if item.enriched and item.url}
+        if not enriched:
+            return results
+        return ResultSet(item if item.enriched else enriched.get(item.url, item) for item in results)
+
+    def store_results(self, result_key, results):
+        """Store or refresh a shared result set.
+
+        Another search with the same key may have enriched items of the set
+        already; those enrichments are kept rather than overwritten.
+        """
+        now = time.time()
+        ttl = current_app.config.get('SEARCH_RESULT_TTL', RESULT_TTL)
+        results = ResultSet.coerce(results)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT data, version FROM result_sets WHERE result_key = ?', (result_key,)
+            ).fetchone()
+            if row is not None:
+                results = self._merge(results, ResultSet.coerce(decode_portable(row['data'])))
+            data = encode_portable(results)
+            conn.execute(
+                'INSERT OR REPLACE INTO result_sets (result_key, data, size, version, accessed_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (result_key, data, len(data), (row['version'] if row is not None else 0) + 1, now, now + ttl)
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._notify()
+
+    def update_result(self, result_key, url, result):
+        """Replace the item with a given URL in a stored result set.
+
+        Runs as one write transaction, so enrichments finished by different
+        workers at the same time never overwrite each other.
+
+        Returns:
+            bool: False when the set is gone or has no item with that URL
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT data FROM result_sets WHERE result_key = ?', (result_key,)
+            ).fetchone()
+            results = ResultSet.coerce(decode_portable(row['data'])) if row is not None else ResultSet()
+            indexes = [i for i, item in enumerate(results) if item.url == url]
+            for index in indexes:
+                results[index] = SearchResult.coerce(result)
+            if indexes:
+                data = encode_portable(results)
+                conn.execute(
+                    'UPDATE result_sets SET data = ?, size = ?, version = version + 1, accessed_at = ? '
+                    'WHERE result_key = ?',
+                    (data, len(data), time.time(), result_key)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if indexes:
+            self._notify()
+        return bool(indexes)
+
+    def load_results(self, result_key):
+        """A stored result set, or None when it expired or was evicted"""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT data FROM result_sets WHERE result_key = ? AND expires_at >= ?',
+            (result_key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE result_sets SET accessed_at = ? WHERE result_key = ?', (now, result_key))
+        # Sets stored before results were columns decode to dicts
+        return ResultSet.coerce(decode_portable(row['data']))
+
+    def _transition(self, search_id, to_state, from_states, **fields):
+        """Atomically move a search to a new state.
+
+        Returns:
+            bool: False when the search is missing or not in one of from_states
+        """
+        now = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        sql = f"UPDATE search_state SET state = ?, version = version + 1, updated_at = ?, expires_at = ?"
+        if assignments:
+            sql += f", {assignments}"
+        sql += f" WHERE search_id = ? AND state IN ({', '.join('?' * len(from_states))})"
+        params = [to_state, now, now + self._ttl(), *fields.values(), search_id, *from_states]
+        changed = self._connection().execute(sql, params).rowcount == 1
+        if changed:
+            self._notify()
+        return changed
+
+    def create(self, search_id, params):
+        """Register a new pending search"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO search_state (search_id, state, params, created_at, updated_at, heartbeat_at, expires_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (search_id, PENDING, encode_portable(params), now, now, now, now + self._ttl())
+        )
+        self._maybe_cleanup(conn, now)
+
+    def start(self, search_id):
+        """Claim a pending search for execution"""
+        return self._transition(search_id, RUNNING, (PENDING,))
+
+    def complete(self, search_id, result, result_key=None):
+        """Point a running search at its results.
+
+        Searches completed with the same result_key share one stored copy;
+        without a key the search gets a result set of its own.
+        """
+        result_key = result_key or f"search:{search_id}"
+        self.store_results(result_key, result)
+        return self._transition(search_id, COMPLETE, (PENDING, RUNNING, ENRICHING), result_key=result_key)
+
+    def publish_basic(self, search_id, result, result_key=None):
+        """Make basic results visible while enrichment continues"""
+        result_key = result_key or f"search:{search_id}"
+        self.store_results(result_key, result)
+        return self._transition(search_id, ENRICHING, (PENDING, RUNNING), result_key=result_key)
+
+    def fail(self, search_id, error):
+        """Record why a search failed"""
+        return self._transition(search_id, ERROR, (PENDING, RUNNING), error=error)
+
+    def cancel(self, search_id, reason='Search cancelled'):
+        """Cancel a search that has not finished yet"""
+        cancelled = self._transition(search_id, CANCELLED, (PENDING, RUNNING, ENRICHING), error=reason)
+        if cancelled:
+            logger.info(f"Cancelled search {search_id}: {reason}")
+        return cancelled
+
+    def suspend(self, search_id, checkpoint):
+        """Park an unfinished search for another process to resume"""
+        suspended = self._transition(search_id, INTERRUPTED, (PENDING, RUNNING, ENRICHING),
+                                     checkpoint=encode_portable(checkpoint))
+        if suspended:
+            logger.info(f"Checkpointed search {search_id} at the {checkpoint.get('stage')} stage")
+        return suspended
+
+    def claim_interrupted(self):
+        """Claim every interrupted search for this process to resume.
+
+        Returns:
+            list: (search_id, params, checkpoint) for each claimed search
+        """
+        rows = self._connection().execute(
+            'SELECT search_id, params, checkpoint FROM search_state WHERE state = ? AND expires_at >= ?',
+            (INTERRUPTED, time.time())
+        ).fetchall()
+        claimed = []
+        for row in rows:
+            # The client gets a fresh heartbeat window to find the search again
+            if self._transition(row['search_id'], PENDING, (INTERRUPTED,), heartbeat_at=time.time()):
+                claimed.append((row['search_id'], decode_portable(row['params']),
+                                decode_portable(row['checkpoint']) if row['checkpoint'] is not None else {}))
+        return claimed
+
+    def set_progress(self, search_id, progress):
+        """Record how far an unfinished search has got, for progress streams"""
+        updated = self._connection().execute(
+            'UPDATE search_state SET progress = ?, version = version + 1, updated_at = ? '
+            'WHERE search_id = ? AND state IN (?, ?, ?)',
+            (encode_portable(progress), time.time(), search_id, PENDING, RUNNING, ENRICHING)
+        ).rowcount == 1
+        if updated:
+            self._notify()
+        return updated
+
+    def record_timing(self, website, ranking_type, stage, seconds, items=None):
+        """Keep how long a pipeline stage took, dropping the oldest beyond TIMING_HISTORY"""
+        conn = self._connection()
+        key = (stage, website, ranking_type)
+        conn.execute(
+            'INSERT INTO stage_timings (stage, website, ranking_type, seconds, items, finished_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (*key, seconds, items, time.time())
+        )
+        conn.execute(
+            'DELETE FROM stage_timings WHERE stage = ? AND website = ? AND ranking_type = ? AND id <= ('
+            ' SELECT id FROM stage_timings WHERE stage = ? AND website = ? AND ranking_type = ?'
+            ' ORDER BY id DESC LIMIT 1 OFFSET ?'
+            ')',
+            (*key, *key, TIMING_HISTORY)
+        )
+
+    def timings(self, stage, website=None, ranking_type=None, limit=TIMING_HISTORY):
+        """Recent (seconds, items) timings of a stage, newest first.
+
+        Leaving out website or ranking_type pools the timings across them.
+        """
+        sql = 'SELECT seconds, items FROM stage_timings WHERE stage = ?'
+        params = [stage]
+        if website is not None:
+            sql += ' AND website = ?'
+            params.append(website)
+        if ranking_type is not None:
+            sql += ' AND ranking_type = ?'
+            params.append(ranking_type)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        return [(row['seconds'], row['items']) for row in self._connection().execute(sql, params)]
+
+    def snapshot(self, search_id):
+        """State, progress and versions of a search without loading its results"""
+        row = self._connection().execute(
+            'SELECT s.state, s.error, s.progress, s.result_key, s.version, r.version AS result_version '
+            'FROM search_state s LEFT JOIN result_sets r ON r.result_key = s.result_key '
+            'WHERE s.search_id = ? AND s.expires_at >= ?',
+            (search_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'state': row['state'],
+            'error': row['error'],
+            'progress': decode_portable(row['progress']) if row['progress'] is not None else None,
+            'result_key': row['result_key'],
+            'version': row['version'],
+            'result_version': row['result_version'],
+        }
+
+    def heartbeat(self, search_id):
+        """Record that a client is still waiting for a search"""
+        self._connection().execute(
+            'UPDATE search_state SET heartbeat_at = ? WHERE search_id = ?',
+            (time.time(), search_id)
+        )
+
+    def is_cancelled(self, search_id):
+        """Whether a search was cancelled or abandoned by its client.
+
+        An unfinished search whose heartbeat has gone stale is cancelled here,
+        so every worker agrees on its fate.
+        """
+        row = self._connection().execute(
+            'SELECT state, heartbeat_at FROM search_state WHERE search_id = ?', (search_id,)
+        ).fetchone()
+        if row is None or row['state'] in (CANCELLED, INTERRUPTED):
+            return True
+        if row['state'] not in (PENDING, RUNNING, ENRICHING):
+            return False
+        timeout = current_app.config.get('SEARCH_HEARTBEAT_TIMEOUT', HEARTBEAT_TIMEOUT)
+        if time.time() - row['heartbeat_at'] > timeout:
+            self.cancel(search_id, 'Search abandoned')
+            return True
+        return False
+
+    def get(self, search_id):
+        """Current state of a search, or None when unknown or expired"""
+        row = self._connection().execute(
+            'SELECT * FROM search_state WHERE search_id = ? AND expires_at >= ?',
+            (search_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'search_id': row['search_id'],
+            'state': row['state'],
+            'params': decode_portable(row['params']) if row['params'] is not None else None,
+            'result_key': row['result_key'],
+            'result': self.load_results(row['result_key']) if row['result_key'] else None,
+            'error': row['error'],
+            'progress': decode_portable(row['progress']) if row['progress'] is not None else None,
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'heartbeat_at': row['heartbeat_at'],
+        }
+
+    def cleanup(self):
+        """Remove expired searches now"""
+        self._last_cleanup = 0
+        self._maybe_cleanup(self._connection(), time.time())
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search once it has been cancelled"""
+    pass
+
+
+class DeadlineExceeded(SearchCancelled):
+    """Raised inside a search once its time budget is used up"""
+    pass
+
+
+class SearchJob:
+    """Handle a running search checks between paid calls to see if it should stop"""
+
+    def __init__(self, search_id, deadline=None, owner=None, priority=None, user_id=None, store=None):
+        self.search_id = search_id
+        self.deadline = deadline  # Absolute time.time() value, or None for no limit
+        self.owner = owner  # Who credits are charged to, see quotas
+        self.priority = priority
+        self.user_id = user_id
+        self.store = store or search_state
+        self.stage = SEARCH_STAGE
+        self.result_key = None  # Set once basic results are stored
+        self.extract_id = None  # Firecrawl extract job being polled, if any
+        self.progress = None  # StageProgress reporting the stages reached, see progress
+
+    @classmethod
+    def from_checkpoint(cls, search_id, checkpoint):
+        """Rebuild the job of an interrupted search"""
+        remaining = checkpoint.get('remaining')
+        job = cls(search_id, deadline=time.time() + remaining if remaining is not None else None,
+                  owner=checkpoint.get('owner'), priority=checkpoint.get('priority'),
+                  user_id=checkpoint.get('user_id'))
+        job.stage = checkpoint.get('stage', SEARCH_STAGE)
+        job.result_key = checkpoint.get('result_key')
+        job.extract_id = checkpoint.get('extract_id')
+        return job
+
+    def checkpoint(self):
+        """Park the search so another process can resume it.
+
+        The time already spent is kept off the budget, so the resumed search
+        gets what was left when this one stopped.
+        """
+        return self.store.suspend(self.search_id, {
+            'stage': self.stage,
+            'result_key': self.result_key,
+            'extract_id': self.extract_id,
+            'remaining': self.remaining(),
+            'owner': self.owner,
+            'priority': self.priority,
+            'user_id': self.user_id,
+        })
+
+    @property
+    def cancelled(self):
+        # On-demand work for a page that is already showing has no search to cancel
+        return self.search_id is not None and self.store.is_cancelled(self.search_id)
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without one"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0)
+
+    def budget(self, limit):
+        """The smaller of a stage's own limit and the time left"""
+        remaining = self.remaining()
+        return limit if remaining is None else min(limit, remaining)
+
+    def sleep(self, seconds):
+        """Wait before a retry, unless the deadline would pass first.
+
+        Raises:
+            DeadlineExceeded: Straight away when the wait would outlast the time left
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= seconds:
+            raise DeadlineExceeded(f"Search {self.search_id} has {remaining:.0f}s left, "
+                                   f"too little for a {seconds}s retry backoff")
+        time.sleep(seconds)
+
+    def over_quota(self):
+        """Whether the owner has no credits left for paid calls"""
+        return self.owner is not None and not quotas.allowed(self.owner, self.priority)
+
+    def charge(self, credits=1):
+        """Count credits spent by this search against its owner"""
+        if self.owner is not None:
+            quotas.charge(self.owner, credits, self.user_id)
+
+    def report(self, stage, done=None, total=None):
+        """Record the pipeline stage the search has reached"""
+        if self.progress is not None:
+            self.progress.report(stage, done, total)
+
+    def check(self):
+        """Raise SearchCancelled or DeadlineExceeded when the search should stop"""
+        if self.remaining() == 0:
+            raise DeadlineExceeded(f"Search {self.search_id} ran out of time")
+        if self.cancelled:
+            raise SearchCancelled(f"Search {self.search_id} was cancelled")
+
+
+search_state = SearchStateStore()
@@ -4,7 +4,19 @@ from dotenv import load_dotenv
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
-class Config:
+class PeerCacheConfig:
+    """Peer cache sharing between instances, used by both configuration modules.
+
+    CACHE_PEERS is a comma-separated list of base URLs (e.g. http://10.0.0.2:8080)
+    and CACHE_PEER_SELF this instance's own URL. Sharing stays off unless
+    CACHE_PEER_SECRET is set as well.
+    """
+    CACHE_PEERS = [p.strip() for p in (os.environ.get('CACHE_PEERS') or '').split(',') if p.strip()]
+    CACHE_PEER_SELF = os.environ.get('CACHE_PEER_SELF')
+    CACHE_PEER_SECRET = os.environ.get('CACHE_PEER_SECRET')
+    CACHE_PEER_TIMEOUT = float(os.environ.get('CACHE_PEER_TIMEOUT') or 0.5)
+
+class Config(PeerCacheConfig):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:////data/app.db' if os.environ.get('FLASK_ENV') == 'production' else 'sqlite:///app.db'
@@ -1,21 +1,40 @@
 import multiprocessing
+import os
+import signal
 
 # Server socket
 bind = "0.0.0.0:8080"
 
-# Worker processes - Reduced to prevent memory issues
-workers = 1  # Single worker to prevent memory issues
-worker_class = "sync"
+# Worker processes - search state lives in SQLite, so any worker can serve
+# the status polls and results for a search started on another one. The
+# cache, its index and snapshot, rate limits and the scheduler are still
+# per process, so stay on one worker until they are shared; see
+# docs/serving.md before raising this
+workers = int(os.environ.get('GUNICORN_WORKERS') or 1)
+
+# Each worker serves requests on a pool of threads, so a slow render or
+# database write no longer holds up the status polls queued behind it.
+# Sizing and benchmarks are in docs/serving.md; GUNICORN_WORKER_CLASS=sync
+# restores the old one-request-per-worker mode.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS') or 8)
 
 # Timeouts - Increased for slow Firecrawl requests
 timeout = 600  # 10 minutes
 keepalive = 5
-graceful_timeout = 600  # 10 minutes for graceful shutdown
+# The master kills a worker graceful_timeout after telling it to stop, and
+# worker_exit counts towards it: in-flight requests, the search drain
+# (SEARCH_DRAIN_TIMEOUT, 15s) and the cache snapshot must all fit, and the
+# whole must stay below Fly's kill_timeout (30s). Event streams end as soon
+# as shutdown begins so they do not use up the time.
+graceful_timeout = 28
 
 # Memory management
 worker_tmp_dir = "/dev/shm"  # Use shared memory for better performance
-max_requests = 50  # Restart worker after 50 requests to prevent memory leaks
-max_requests_jitter = 10  # Add some randomness to prevent all workers restarting at once
+# Restart workers now and then to contain leaks. Status polls count as
+# requests and every restart drains the worker's searches, so keep this high
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 2000)
+max_requests_jitter = 200  # Add some randomness to prevent all workers restarting at once
 
 # Logging
 accesslog = "-"
@@ -29,8 +48,36 @@ limit_request_field_size = 8190
 
 # Worker settings
 preload_app = True  # Preload application to reduce startup time
-worker_connections = 100
 
 # Memory limits
 worker_max_memory_percent = 70  # Restart worker if memory usage exceeds 70%
-worker_max_memory_usage = 128  # Maximum memory per worker in MB 
\ No newline at end of file
+worker_max_memory_usage = 128  # Maximum memory per worker in MB 
+
+# Server hooks
+def post_worker_init(worker):
+    """Pick up searches a previous worker checkpointed before it exited"""
+    from app.main.routes import resume_interrupted_searches
+    from app.services.scheduler import begin_shutdown
+    resume_interrupted_searches(worker.wsgi)
+
+    # gunicorn has no hook for a graceful stop, so wrap its SIGTERM handler
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        begin_shutdown()
+        handle_exit(signum, frame)
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_int(worker):
+    """End open event streams when the worker is interrupted"""
+    from app.services.scheduler import begin_shutdown
+    begin_shutdown()
+
+
+def worker_exit(server, worker):
+    """Drain searches and flush a final cache snapshot before the worker goes away"""
+    from app.services.scheduler import drain_on_exit
+    from app.services.cache_snapshot import save_on_exit
+    drain_on_exit(worker.wsgi)
+    save_on_exit(worker.wsgi)
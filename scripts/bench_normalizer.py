@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.firecrawl_service import NestedModel
+from app.services.normalizer import normalize_response, _items
+
+# Names the model has been seen to use instead of the schema's
+DRIFT = {'tips': 'tipsTricks', 'image_url': 'imageUrl', 'summary': 'description'}
+
+def make_item(i: int, rng: random.Random) -> dict:
+    """One result as the extract API returns it, with some field names drifted"""
+    item = {
+        'title': f'Recipe {i}',
+        'summary': 'Soft and chewy. ' * 10,
+        'big_difference': 'Browned butter',
+        'key_takeaways': ['Chill the dough', 'Use bread flour'],
+        'pros': ['Easy'],
+        'cons': ['Sweet'],
+        'tips': ['Weigh the flour'],
+        'url': f'https://example.com/recipe/{i}',
+        'image_url': f'https://example.com/recipe/{i}.jpg',
+        'rating': rng.choice([4.5, '4.2', 0, None]),
+        'comments': [{'text': 'Great'}] * 3,
+    }
+    for name, drifted in DRIFT.items():
+        if rng.random() < 0.3:
+            item[drifted] = item.pop(name)
+    return item
+
+def make_response(items: int, seed: int = 0) -> dict:
+    """A nested extract envelope holding the given number of results"""
+    rng = random.Random(seed)
+    results = [make_item(i, rng) for i in range(items)]
+    main = results.pop(0)
+    main['results'] = results
+    return {'success': True, 'status': 'completed', 'data': {'data': main}}
+
+def legacy_normalize(response: dict) -> list:
+    """The hand-written loop the search path used before the normalizer"""
+    processed_results = []
+    data = response.get('data', {})
+    if isinstance(data, dict):
+        inner_data = data.get('data', {})
+        if isinstance(inner_data, dict):
+            items = [inner_data] + (inner_data.get('results', []) if isinstance(inner_data.get('results'), list) else [])
+            for idx, item in enumerate(items, start=1):
+                processed_results.append({
+                    "rank": idx,
+                    "title": item.get("title", "Untitled"),
+                    "summary": item.get("summary", ""),
+                    "big_difference": item.get("big_difference", ""),
+                    "key_takeaways": item.get("key_takeaways", []),
+                    "pros": item.get("pros", []),
+                    "cons": item.get("cons", []),
+                    "tips_and_tricks": item.get("tips", []),
+                    "url": item.get("url", ""),
+                    "image_url": item.get("image_url", ""),
+                    "rating": float(item.get("rating", 0)) if item.get("rating") else None
+                })
+    return processed_results
+
+def model_normalize(response: dict) -> list:
+    """Validating each result with a model, as the single-page extract path did"""
+    records = []
+    for rank, item in enumerate(_items(response), start=1):
+        try:
+            records.append(NestedModel(**dict(item, rank=rank)).model_dump())
+        except Exception:
+            continue
+    return records
+
+def time_call(fn, response: dict, repeat: int) -> float:
+    """Best of three runs, in microseconds per call"""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(response)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the response normalizer with the parsing it replaced')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[5, 50, 1000],
+                      help='Results per response (default: 5 50 1000)')
+    parser.add_argument('--repeat', type=int, default=200,
+                      help='Calls per timing run (default: 200)')
+    parser.add_argument('--json', action='store_true',
+                      help='Print results as JSON')
+
+    args = parser.parse_args()
+
+    report = {}
+    for size in args.sizes:
+        response = make_response(size)
+        repeat = max(args.repeat * 50 // size, 5)
+        legacy_us = time_call(legacy_normalize, response, repeat)
+        model_us = time_call(model_normalize, response, repeat)
+        normalizer_us = time_call(normalize_response, response, repeat)
+        report[size] = {
+            'legacy_us': round(legacy_us, 1),
+            'model_us': round(model_us, 1),
+            'normalizer_us': round(normalizer_us, 1),
+            'legacy_us_per_item': round(legacy_us / size, 2),
+            'model_us_per_item': round(model_us / size, 2),
+            'normalizer_us_per_item': round(normalizer_us / size, 2),
+            # The legacy loop misses drifted names; the normalizer fills them all
+            'legacy_missing_fields': sum(1 for r in legacy_normalize(response)
+                                         for field in ('summary', 'tips_and_tricks', 'image_url') if not r[field]),
+            'normalizer_missing_fields': sum(1 for r in normalize_response(response)
+                                             for field in ('summary', 'tips_and_tricks', 'image_url') if not r[field]),
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'items':>6} {'loop us':>9} {'model us':>9} {'new us':>9} {'loop/item':>10} {'model/item':>11} "
+          f"{'new/item':>9} {'missed old':>11} {'missed new':>11}")
+    for size, stats in report.items():
+        print(f"{size:>6} {stats['legacy_us']:>9} {stats['model_us']:>9} {stats['normalizer_us']:>9} "
+              f"{stats['legacy_us_per_item']:>10} {stats['model_us_per_item']:>11} {stats['normalizer_us_per_item']:>9} "
+              f"{stats['legacy_missing_fields']:>11} {stats['normalizer_missing_fields']:>11}")
+
+if __name__ == '__main__':
+    main()
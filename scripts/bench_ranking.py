@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import math
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.models.search import ResultSet
+from app.services.ranking import rank, RATINGS, PRIOR_REVIEWS, RECENCY_HALF_LIFE_DAYS, TIE_BREAK
+
+def make_results(count: int, seed: int = 0) -> ResultSet:
+    """A relevance-ordered candidate pool with some unrated results"""
+    rng = random.Random(seed)
+    return ResultSet.coerce([
+        {'title': f'Recipe {i}', 'url': f'https://example.com/recipe/{i}',
+         'rating': round(rng.uniform(2.5, 5.0), 1) if rng.random() < 0.8 else None,
+         'review_count': rng.randint(0, 20000) if rng.random() < 0.7 else None,
+         'published': time.time() - rng.uniform(0, 5 * 365) * 86400}
+        for i in range(count)
+    ])
+
+def sort_top(results: ResultSet, limit: int) -> list:
+    """The ranking this replaced: sort everything by raw rating, keep the top"""
+    return sorted(results, key=lambda x: x.rating or 0, reverse=True)[:limit]
+
+def python_top(results: ResultSet, limit: int) -> list:
+    """The engine's ratings scoring written as plain Python loops"""
+    def scaled(values):
+        low, high = min(values), max(values)
+        return [(v - low) / (high - low) if high > low else 0.0 for v in values]
+
+    def filled(values):
+        known = [v for v in values if v is not None]
+        mean = sum(known) / len(known) if known else 0.0
+        return [mean if v is None else v for v in values]
+
+    now = time.time()
+    rated = [r.rating for r in results if r.rating is not None]
+    prior = sum(rated) / len(rated) if rated else 3.5
+    quality = filled([None if r.rating is None else
+                      (PRIOR_REVIEWS * prior + (r.review_count or 1) * r.rating) / (PRIOR_REVIEWS + (r.review_count or 1))
+                      for r in results])
+    recency = filled([None if r.published is None else
+                      0.5 ** (max(now - r.published, 0) / 86400 / RECENCY_HALF_LIFE_DAYS) for r in results])
+    relevance = [1 / math.log2(i + 2) for i in range(len(results))]
+    score = [q + 0.1 * v + 0.05 * c - i * TIE_BREAK
+             for i, (q, v, c) in enumerate(zip(scaled(quality), scaled(relevance), scaled(recency)))]
+    order = sorted(range(len(results)), key=score.__getitem__, reverse=True)[:limit]
+    return [results[i] for i in order]
+
+def time_call(fn, repeat: int) -> float:
+    """Best of three runs, in microseconds per call"""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the ranking engine with sorting by rating and with the same scoring in Python')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 500, 5000],
+                      help='Candidates per set (default: 10 100 500 5000)')
+    parser.add_argument('--limit', type=int, default=10,
+                      help='Results kept (default: 10)')
+    parser.add_argument('--repeat', type=int, default=200,
+                      help='Calls per timing run (default: 200)')
+    parser.add_argument('--json', action='store_true',
+                      help='Print results as JSON')
+
+    args = parser.parse_args()
+
+    report = {}
+    for size in args.sizes:
+        results = make_results(size)
+        repeat = max(args.repeat * 100 // size, 5)
+        report[size] = {
+            'sort_us': round(time_call(lambda: sort_top(results, args.limit), repeat), 1),
+            'python_us': round(time_call(lambda: python_top(results, args.limit), repeat), 1),
+            'engine_us': round(time_call(lambda: rank(results, RATINGS, limit=args.limit), repeat), 1),
+            'engine_full_us': round(time_call(lambda: rank(results, RATINGS), repeat), 1),
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'items':>6} {'sort us':>9} {'python us':>10} {'top-k us':>9} {'full us':>9}")
+    for size, stats in report.items():
+        print(f"{size:>6} {stats['sort_us']:>9} {stats['python_us']:>10} {stats['engine_us']:>9} "
+              f"{stats['engine_full_us']:>9}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.models.search import ResultSet
+from app.services.cache_codec import encode, decode
+
+def make_results(count: int) -> list:
+    """Basic search results as the pipeline used to pass them around"""
+    return [
+        {
+            'rank': i + 1, 'title': f'Recipe {i}', 'summary': 'Soft and chewy. ' * 10,
+            'big_difference': 'Browned butter', 'key_takeaways': [], 'pros': [], 'cons': [],
+            'tips_and_tricks': [], 'url': f'https://example.com/recipe/{i}', 'image_url': '',
+            'rating': 4.0 + i / 100 if i % 3 else None,
+        }
+        for i in range(count)
+    ]
+
+def allocated(build) -> int:
+    """Bytes still allocated by the value build returns"""
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+def time_call(fn, repeat: int) -> float:
+    """Best of three runs, in microseconds per call"""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare result dicts with the slotted ResultSet')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[25, 1000],
+                      help='Results per set (default: 25 1000)')
+    parser.add_argument('--repeat', type=int, default=200,
+                      help='Calls per timing run (default: 200)')
+    parser.add_argument('--json', action='store_true',
+                      help='Print results as JSON')
+
+    args = parser.parse_args()
+
+    report = {}
+    for size in args.sizes:
+        dicts = make_results(size)
+        results = ResultSet.coerce(dicts)
+        dict_blob, set_blob = encode(dicts), encode(results)
+        report[size] = {
+            # Strings are shared by both, so this is the cost of the containers
+            'dict_bytes': allocated(lambda: [dict(d) for d in dicts]),
+            'set_bytes': allocated(lambda: ResultSet(r.copy() for r in results)),
+            'dict_encoded': len(dict_blob),
+            'set_encoded': len(set_blob),
+            'dict_decode_us': round(time_call(lambda: decode(dict_blob), args.repeat), 1),
+            'set_decode_us': round(time_call(lambda: decode(set_blob), args.repeat), 1),
+            'dict_access_us': round(time_call(lambda: [d.get('rating') or 0 for d in dicts], args.repeat), 1),
+            'set_access_us': round(time_call(lambda: [r.rating or 0 for r in results], args.repeat), 1),
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'items':>6} {'dict B':>9} {'set B':>9} {'dict enc':>9} {'set enc':>8} "
+          f"{'dict dec us':>12} {'set dec us':>11} {'dict get us':>12} {'attr us':>8}")
+    for size, stats in report.items():
+        print(f"{size:>6} {stats['dict_bytes']:>9} {stats['set_bytes']:>9} {stats['dict_encoded']:>9} "
+              f"{stats['set_encoded']:>8} {stats['dict_decode_us']:>12} {stats['set_decode_us']:>11} "
+              f"{stats['dict_access_us']:>12} {stats['set_access_us']:>8}")
+
+if __name__ == '__main__':
+    main()
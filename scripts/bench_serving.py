@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_THREADS': '1'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+}
+RESULTS = [
+    {'title': f'Recipe {i}', 'url': f'https://example.com/recipe/{i}', 'summary': 'Soft and chewy. ' * 20,
+     'rating': 4.0 + i / 100, 'enriched': True, 'pros': 'Easy', 'cons': 'Sweet'}
+    for i in range(25)
+]
+
+def seed(data_dir: str) -> tuple:
+    """
+    Store a completed search for the results page to render.
+
+    Returns:
+        tuple: (search_id, session cookie pointing at that search)
+    """
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from app.services.search_state import search_state
+
+    app = create_app('development')
+    search_id = str(uuid.uuid4())
+    with app.app_context():
+        search_state.create(search_id, {'website': 'example.com', 'query': 'cookies', 'ranking_type': 'relevance'})
+        search_state.start(search_id)
+        search_state.complete(search_id, RESULTS)
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie = serializer.dumps({'search_id': search_id, 'client_id': str(uuid.uuid4())})
+    return search_id, cookie
+
+def start_server(mode: str, port: int, env: dict) -> subprocess.Popen:
+    """Start gunicorn with the repo's config in the given mode and wait until it answers"""
+    server_env = dict(env, **MODES[mode])
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py', '--bind', f'127.0.0.1:{port}',
+         '--access-logfile', '/dev/null', "app:create_app('development')"],
+        cwd=ROOT, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start in {mode} mode")
+
+def run_load(urls: list, total: int, concurrency: int, cookie: str) -> dict:
+    """
+    Send total requests from concurrency clients, cycling through urls.
+
+    Returns:
+        dict: Requests per second, p50 and p99 latency in milliseconds, and errors
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        session = requests.Session()
+        session.cookies.set('session', cookie)
+        for i in counter:
+            url = urls[i % len(urls)]
+            start = time.perf_counter()
+            try:
+                response = session.get(url, allow_redirects=False, timeout=30)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(url)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        'errors': len(errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gunicorn serving modes on the hot endpoints')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'gthread'],
+                      help='Serving modes to benchmark (default: sync gthread)')
+    parser.add_argument('--requests', type=int, default=2000,
+                      help='Requests per endpoint (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=32,
+                      help='Concurrent clients (default: 32)')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Gunicorn worker processes (default: 1, as GUNICORN_WORKERS)')
+    parser.add_argument('--threads', type=int, default=8,
+                      help='Threads per worker in gthread mode (default: 8)')
+    parser.add_argument('--port', type=int, default=8091,
+                      help='Port to run the server on (default: 8091)')
+    parser.add_argument('--json', action='store_true',
+                      help='Print results as JSON')
+
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='the-one-bench-')
+    env = dict(os.environ,
+               SQLITE_DB=os.path.join(data_dir, 'app.db'),
+               CACHE_SNAPSHOT_INTERVAL='0',
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               # The benchmark is one client hammering the server; keep it under the rate limits
+               ADMISSION_STATUS_PER_MINUTE='100000000', ADMISSION_STATUS_BURST='100000000')
+    os.environ.update(env)
+
+    report = {}
+    try:
+        search_id, cookie = seed(data_dir)
+        base = f'http://127.0.0.1:{args.port}'
+        endpoints = {
+            '/': [f'{base}/'],
+            '/check_search_status': [f'{base}/check_search_status'],
+            '/results/<id>': [f'{base}/results/{search_id}'],
+        }
+        endpoints['mixed'] = [url for urls in endpoints.values() for url in urls]
+        for mode in args.modes:
+            server = start_server(mode, args.port, env)
+            try:
+                report[mode] = {name: run_load(urls, args.requests, args.concurrency, cookie)
+                                for name, urls in endpoints.items()}
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'mode':<8} {'endpoint':<22} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode, endpoints in report.items():
+        for name, stats in endpoints.items():
+            print(f"{mode:<8} {name:<22} {stats['rps']:>9} {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+def start_cluster(ports: list, secret: str) -> list:
+    """
+    Start one app process per port, all configured as cache peers of each other.
+    
+    Args:
+        ports (list): Ports to listen on, one process each
+        secret (str): Shared secret for peer requests
+        
+    Returns:
+        list: The running processes
+    """
+    peers = ','.join(f'http://127.0.0.1:{port}' for port in ports)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    processes = []
+    for port in ports:
+        env = dict(os.environ,
+                   CACHE_PEERS=peers,
+                   CACHE_PEER_SELF=f'http://127.0.0.1:{port}',
+                   CACHE_PEER_SECRET=secret)
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'flask', '--app', 'run:app', 'run', '--port', str(port)],
+            cwd=root, env=env
+        ))
+        print(f"Started instance on port {port} (pid {processes[-1].pid})")
+        time.sleep(2)  # Let each instance create the shared SQLite tables before the next starts
+    return processes
+
+def main():
+    parser = argparse.ArgumentParser(description='Run several local instances sharing one peer cache')
+    parser.add_argument('--ports', type=int, nargs='+', default=[5001, 5002, 5003],
+                      help='Ports to run instances on (default: 5001 5002 5003)')
+    parser.add_argument('--secret', default='local-peer-secret',
+                      help='Shared secret for peer requests')
+
+    args = parser.parse_args()
+
+    processes = start_cluster(args.ports, args.secret)
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,8 @@ class TestConfig:
     # Cache settings
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes for testing
+    CACHE_SNAPSHOT_PATH = None  # No cache snapshots in tests
+    SEARCH_STATE_DB = 'file:search_state_test?mode=memory&cache=shared'
     
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
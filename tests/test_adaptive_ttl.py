@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import patch
+from app.extensions import cache
+from app.services.adaptive_ttl import churn, observe, query_class, ttl_for
+from app.services.cache_index import cache_index
+
+
+def results(*urls):
+    return [{'url': url, 'title': url} for url in urls]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    with app.app_context():
+        cache.clear()
+        cache_index.clear()
+        yield
+
+
+def test_churn():
+    """Test churn is 0 for identical sets and 1 for disjoint ones."""
+    assert churn(['a', 'b', 'c'], ['a', 'b', 'c']) == 0.0
+    assert churn(['a', 'b'], ['c', 'd']) == 1.0
+    assert 0 < churn(['a', 'b', 'c'], ['b', 'a', 'c']) < churn(['a', 'b', 'c'], ['a', 'x', 'y'])
+
+
+def test_query_class():
+    """Test broad and long-tail queries fall in different classes."""
+    assert query_class('Cookies') == 'head'
+    assert query_class('gluten free chocolate chip cookies') == 'tail'
+
+
+def test_default_ttl_without_history(app):
+    """Test unseen sites use the default timeout."""
+    assert ttl_for('allrecipes.com', 'cookies') == app.config['CACHE_DEFAULT_TIMEOUT']
+
+
+def refresh(website, query, items, hours_later):
+    """Observe a result set fetched the given number of hours after the previous one"""
+    with patch('app.services.adaptive_ttl.time') as mock_time:
+        mock_time.time.return_value = 1_000_000 + hours_later * 3600
+        observe(website, query, items)
+
+
+def test_stable_site_gets_long_ttl(app):
+    """Test unchanged results push the TTL to the upper bound."""
+    for day in range(3):
+        refresh('allrecipes.com', 'cookies', results('a', 'b', 'c'), day * 24)
+    assert ttl_for('allrecipes.com', 'cookies') == app.config['CACHE_TTL_MAX']
+
+
+def test_volatile_site_gets_short_ttl(app):
+    """Test fully changing results shrink the TTL, within bounds."""
+    for hour in range(3):
+        refresh('marketplace.com', 'lamp', results(f'{hour}a', f'{hour}b'), hour)
+    ttl = ttl_for('marketplace.com', 'lamp')
+    assert ttl == app.config['CACHE_TTL_MIN']
+    assert ttl < ttl_for('allrecipes.com', 'cookies')
+
+
+def test_sites_tracked_independently(app):
+    """Test one site's churn does not shorten another's TTL."""
+    refresh('allrecipes.com', 'cookies', results('a', 'b'), 0)
+    refresh('allrecipes.com', 'cookies', results('a', 'b'), 24)
+    refresh('marketplace.com', 'lamp', results('x'), 0)
+    refresh('marketplace.com', 'lamp', results('y'), 1)
+    assert ttl_for('allrecipes.com', 'cookies') > ttl_for('marketplace.com', 'lamp')
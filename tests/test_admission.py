@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import patch
+from app.services.admission import RateLimiter, TokenBucket
+from app.services.scheduler import scheduler
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=1, capacity=2, now=0)
+    assert bucket.wait(0) == 0
+    bucket.tokens = 0
+    assert bucket.wait(0.5) == pytest.approx(0.5)
+    assert bucket.wait(10) == 0
+    assert bucket.tokens == 2
+
+
+def test_rate_limiter_takes_from_all_buckets_or_none():
+    limiter = RateLimiter()
+    limits = [('ip', 60, 3), ('client', 60, 1)]
+    assert limiter.hit(limits, now=100) == 0
+    assert limiter.hit(limits, now=100) == pytest.approx(1)
+    # The IP bucket was not charged for the rejected request
+    assert limiter.hit([('ip', 60, 3)], now=100) == 0
+    assert limiter.hit([('ip', 60, 3)], now=100) == 0
+
+
+def test_rate_limiter_prunes_buckets():
+    limiter = RateLimiter(max_buckets=10)
+    for i in range(25):
+        limiter.hit([(f'client:{i}', 60, 1)], now=100 + i)
+    assert len(limiter._buckets) <= 10
+
+
+def test_search_is_rate_limited(client, app):
+    app.config['ADMISSION_SEARCH_BURST'] = 2
+    form = {'website': 'example.com', 'query': 'cookies'}
+    with patch('app.main.routes.scheduler.submit'):
+        assert client.post('/search', data=form).status_code == 302
+        assert client.post('/search', data=form).status_code == 302
+        response = client.post('/search', data=form)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert b'too quickly' in response.data
+
+
+def test_status_polling_gets_json_429(client, app):
+    app.config['ADMISSION_STATUS_BURST'] = 1
+    headers = {'Accept': 'application/json'}
+    assert client.get('/check_search_status', headers=headers).status_code == 200
+    response = client.get('/check_search_status', headers=headers)
+    assert response.status_code == 429
+    assert response.get_json()['retry_after'] >= 1
+    assert 'Retry-After' in response.headers
+
+
+def test_search_is_shed_when_queue_is_deep(client, app):
+    app.config['ADMISSION_MAX_QUEUE'] = 4
+    busy = {'workers': 2, 'pending': 2, 'running': 2, 'utilization': 1.0, 'estimated_wait': 60.0}
+    with patch.object(scheduler, 'stats', return_value=busy), \
+            patch('app.main.routes.scheduler.submit') as submit:
+        response = client.post('/search', data={'website': 'example.com', 'query': 'cookies'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '60'
+    assert not submit.called
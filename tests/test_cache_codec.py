@@ -0,0 +1,106 @@
+import pickle
+import pytest
+from datetime import datetime
+from app.models import SearchResult, ResultSet
+from app.services.cache_codec import (
+    encode, decode, cache_get, cache_set, encode_portable, decode_portable, PortableError,
+    FORMAT_MARSHAL, FORMAT_MARSHAL_ZLIB, FORMAT_PICKLE
+)
+
+
+def sample_results(count=10):
+    return [
+        {
+            'rank': idx,
+            'title': f'Chocolate Chip Cookies #{idx}',
+            'summary': 'Crispy edges and a chewy center. ' * 5,
+            'pros': ['Easy', 'Quick'],
+            'cons': [],
+            'url': f'https://allrecipes.com/recipe/{idx}',
+            'image_url': None,
+            'rating': 4.5 + idx / 100,
+        }
+        for idx in range(1, count + 1)
+    ]
+
+
+def test_round_trip_records():
+    """Test lists of same-shaped dicts survive encoding unchanged."""
+    results = sample_results()
+    assert decode(encode(results)) == results
+    assert decode(encode({'website': 'allrecipes.com', 'results': results})) == {
+        'website': 'allrecipes.com', 'results': results
+    }
+
+
+def test_round_trip_mixed_values():
+    """Test mixed shapes, tuples and scalars round trip."""
+    for value in ([{'a': 1}, {'b': 2}], ('x', 1), 'error message', 3.5, [], {}, None, True):
+        assert decode(encode(value)) == value
+
+
+def test_small_values_not_compressed():
+    """Test values under the threshold skip compression."""
+    assert encode({'website': 'allrecipes.com'})[:1] == FORMAT_MARSHAL
+
+
+def test_large_values_compressed_and_smaller_than_pickle():
+    """Test result sets compress well below their pickled size."""
+    results = sample_results(50)
+    blob = encode(results)
+    assert blob[:1] == FORMAT_MARSHAL_ZLIB
+    assert len(blob) < len(pickle.dumps(results)) / 3
+
+
+def test_unmarshallable_values_fall_back_to_pickle():
+    """Test values marshal cannot handle still round trip."""
+    value = {'created_at': datetime(2024, 1, 1)}
+    assert encode(value)[:1] == FORMAT_PICKLE
+    assert decode(encode(value)) == value
+
+
+def test_legacy_values_pass_through():
+    """Test values cached before the codec are returned unchanged."""
+    assert decode([{'title': 'Old'}]) == [{'title': 'Old'}]
+
+
+def test_cache_helpers(app):
+    """Test cache_set and cache_get go through the codec."""
+    with app.app_context():
+        cache_set('codec_key', sample_results())
+        assert cache_get('codec_key') == sample_results()
+        assert cache_get('missing_key') is None
+
+
+def test_result_sets_are_stored_as_columns():
+    """Test result sets round trip as columns, smaller than the same dicts."""
+    results = ResultSet.coerce(sample_results(25))
+    decoded = decode(encode(results))
+    assert isinstance(decoded, ResultSet)
+    assert decoded == results
+    assert decoded[3].title == 'Chocolate Chip Cookies #4'
+    assert len(encode(results)) < len(encode(sample_results(25)))
+
+    single = decode(encode(results[0]))
+    assert isinstance(single, SearchResult) and single == results[0]
+
+
+def test_portable_round_trip():
+    """Test the portable encoding carries result sets, tuples and plain data."""
+    results = ResultSet.coerce(sample_results(25))
+    for value in (results, results[0], {'results': results, 'pair': ('a', 1)}, sample_results(), 'text', None):
+        assert decode_portable(encode_portable(value)) == value
+    assert isinstance(decode_portable(encode_portable(results)), ResultSet)
+    assert encode_portable(results)[:4] == b'THEJ'
+
+
+def test_portable_refuses_unsafe_and_malformed_input():
+    """Test the portable encoding never falls back to pickle and rejects foreign bytes."""
+    with pytest.raises(PortableError):
+        encode_portable({'created_at': datetime(2024, 1, 1)})
+    pickled = encode({'created_at': datetime(2024, 1, 1)})
+    for blob in (pickled, encode(sample_results()), b'THEJ\x09\x00[]', b'THEJ\x01\x00{bad', b''):
+        with pytest.raises(PortableError):
+            decode_portable(blob)
+    with pytest.raises(PortableError):
+        decode_portable(encode_portable(sample_results(50)), max_bytes=100)
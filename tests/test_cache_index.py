@@ -0,0 +1,84 @@
+import pytest
+from app.extensions import cache, db
+from app.models import User
+from app.services.cache_codec import cache_get, cache_set
+from app.services.cache_index import cache_index, canonical_query, search_tags, website_tag, schema_tag
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    with app.app_context():
+        cache.clear()
+        cache_index.clear()
+        yield
+
+
+@pytest.fixture
+def admin_client(app, client):
+    """Client logged in as an admin user."""
+    user = User(username='admin', email='admin@example.com', is_admin=True)
+    user.set_password('TestPass123!')
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return client
+
+
+def test_canonical_query():
+    """Test queries differing only in case and spacing share a tag."""
+    assert canonical_query('  Chocolate   Chip Cookies ') == 'chocolate chip cookies'
+    assert search_tags('www.AllRecipes.com', 'Cookies') == search_tags('allrecipes.com', 'cookies')
+
+
+def test_invalidate_by_website_keeps_other_entries(app):
+    """Test a website purge leaves other websites warm."""
+    cache_set('a', [1], tags=search_tags('allrecipes.com', 'cookies'))
+    cache_set('b', [2], tags=search_tags('allrecipes.com', 'brownies'))
+    cache_set('c', [3], tags=search_tags('etsy.com', 'mugs'))
+
+    assert cache_index.invalidate_tag(website_tag('allrecipes.com')) == 2
+    assert cache_get('a') is None
+    assert cache_get('b') is None
+    assert cache_get('c') == [3]
+
+
+def test_entries_tagged_with_schema_version(app):
+    """Test every entry carries the schema version tag."""
+    cache_set('a', [1])
+    assert cache_index.keys_for_tag(schema_tag()) == {'a'}
+
+
+def test_stats_and_rankings(app):
+    """Test hit counting, sizes and hit ratio."""
+    cache_set('small', 'x')
+    cache_set('large', 'x' * 500)
+    cache_get('small')
+    cache_get('small')
+    cache_get('missing')
+
+    assert cache_index.largest(1)[0]['key'] == 'large'
+    assert cache_index.most_hit(1)[0]['key'] == 'small'
+    stats = cache_index.stats()
+    assert stats['entries'] == 2
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+
+def test_cache_inspector_admin(app, admin_client):
+    """Test the admin inspector lists entries and invalidates by tag."""
+    cache_set('search_result_1', [{'title': 'Cookies'}], tags=search_tags('allrecipes.com', 'cookies'))
+
+    response = admin_client.get('/admin/cache')
+    assert response.status_code == 200
+    assert b'search_result_1' in response.data
+    assert b'website:allrecipes.com' in response.data
+
+    response = admin_client.post('/admin/cache/invalidate', data={'tag': 'website:allrecipes.com'})
+    assert response.status_code == 302
+    assert cache_get('search_result_1') is None
+
+
+def test_cache_inspector_requires_admin(app, client):
+    """Test anonymous users are sent to login."""
+    response = client.get('/admin/cache')
+    assert response.status_code == 302
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+import pytest
+from app.extensions import cache
+from app.services.cache_codec import cache_get, cache_set
+from app.services.cache_index import cache_index, search_tags, website_tag
+from app.services.cache_snapshot import save_snapshot, load_snapshot, read_snapshot, SnapshotError
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    with app.app_context():
+        cache.clear()
+        cache_index.clear()
+        yield
+
+
+def test_snapshot_round_trip(app, tmp_path):
+    """Test a snapshot restores values, tags and hit counts into an empty cache."""
+    path = str(tmp_path / 'snapshot.bin')
+    cache_set('search:1', [{'title': 'Cookies', 'rating': 4.8}], tags=search_tags('allrecipes.com', 'cookies'))
+    cache_get('search:1')
+    assert save_snapshot(path) == 1
+
+    cache.clear()
+    cache_index.clear()
+    assert load_snapshot(path) == 1
+    assert cache_get('search:1') == [{'title': 'Cookies', 'rating': 4.8}]
+    assert cache_index.keys_for_tag(website_tag('allrecipes.com')) == {'search:1'}
+    assert cache_index.most_hit(1)[0]['hits'] == 2
+
+
+def test_snapshot_skips_expired_and_volatile(app, tmp_path):
+    """Test expired and volatile entries are not restored."""
+    path = str(tmp_path / 'snapshot.bin')
+    cache_set('short', 'x', timeout=1)
+    cache.set('local', b'\x01local')
+    cache_index.record_write('local', 6, volatile=True)
+    save_snapshot(path)
+    assert [entry[0] for entry in read_snapshot(path)] == ['short']
+
+    cache.clear()
+    cache_index.clear()
+    time.sleep(1.1)
+    assert load_snapshot(path) == 0
+
+
+def test_restore_does_not_overwrite_newer_values(app, tmp_path):
+    """Test values written since boot win over the snapshot."""
+    path = str(tmp_path / 'snapshot.bin')
+    cache_set('key', 'old')
+    save_snapshot(path)
+    cache_set('key', 'new')
+    assert load_snapshot(path) == 0
+    assert cache_get('key') == 'new'
+
+
+def test_invalid_snapshot_rejected(tmp_path):
+    """Test files that are not snapshots raise SnapshotError."""
+    path = tmp_path / 'bogus.bin'
+    path.write_bytes(b'not a snapshot')
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+
+def test_snapshot_holds_no_marshal_or_pickle(app, tmp_path):
+    """Test snapshots are portable JSON and leave out values that are not."""
+    path = tmp_path / 'snapshot.bin'
+    cache_set('results', [{'title': 'Cookies'}])
+    cache_set('dated', {'created_at': datetime(2024, 1, 1)})
+    save_snapshot(str(path))
+    assert [entry[0] for entry in read_snapshot(str(path))] == ['results']
+
+    data = path.read_bytes()
+    path.write_bytes(data[:8] + bytes([1]) + data[9:])
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+
+def test_cli_export_import(app, runner, tmp_path):
+    """Test the cache export and import commands."""
+    source = str(tmp_path / 'snapshot.bin')
+    cache_set('key', 'value')
+    save_snapshot(source)
+
+    exported = str(tmp_path / 'exported.bin')
+    result = runner.invoke(args=['cache', 'export', exported, '--source', source])
+    assert 'Exported 1 cache entries' in result.output
+
+    installed = str(tmp_path / 'installed.bin')
+    result = runner.invoke(args=['cache', 'import', exported, '--destination', installed])
+    assert 'Imported 1 cache entries' in result.output
+    assert read_snapshot(installed) == read_snapshot(source)
+
+    result = runner.invoke(args=['cache', 'import', str(tmp_path / 'missing.bin'), '--destination', installed])
+    assert result.exit_code != 0
@@ -0,0 +1,103 @@
+import threading
+import uuid
+import pytest
+from unittest.mock import patch
+from app.extensions import cache
+from app.main import routes
+from app.services.firecrawl_service import search_website
+from app.services.scheduler import SearchScheduler, SchedulerDraining, AUTHENTICATED
+from app.services.search_state import (search_state, SearchJob, ENRICHING, INTERRUPTED, PENDING,
+                                       ENRICH_STAGE)
+
+
+BASIC = [{'title': 'Chewy Cookies', 'url': 'https://example.com/recipe/1'}]
+
+
+def run_inline(fn, **kwargs):
+    fn()
+
+
+@pytest.fixture
+def running(app):
+    cache.clear()
+    search_id = str(uuid.uuid4())
+    search_state.create(search_id, {'website': 'example.com', 'query': 'cookies'})
+    search_state.start(search_id)
+    return search_id
+
+
+def test_drain_checkpoints_unfinished_jobs():
+    scheduler = SearchScheduler(workers=1, max_per_website=5, reserved=0)
+    started = threading.Event()
+    release = threading.Event()
+    checkpointed = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit(blocker, 'user:1', AUTHENTICATED, checkpoint=lambda: checkpointed.append('blocker'))
+    assert started.wait(5)
+    scheduler.submit(lambda: None, 'user:2', AUTHENTICATED, checkpoint=lambda: checkpointed.append('queued'))
+
+    unfinished = scheduler.drain(timeout=0.05)
+    release.set()
+    assert len(unfinished) == 2
+    assert sorted(checkpointed) == ['blocker', 'queued']
+    with pytest.raises(SchedulerDraining):
+        scheduler.submit(lambda: None, 'user:3', AUTHENTICATED)
+
+
+def test_checkpoint_and_claim(running):
+    job = SearchJob(running, deadline=None, owner='user:7', priority=AUTHENTICATED, user_id=7)
+    job.stage = ENRICH_STAGE
+    job.result_key = 'results:cookies'
+    job.extract_id = 'extract-1'
+    assert job.checkpoint()
+    assert search_state.get(running)['state'] == INTERRUPTED
+    assert job.cancelled  # The thread in the old process stops
+
+    claimed = search_state.claim_interrupted()
+    assert [search_id for search_id, _, _ in claimed] == [running]
+    assert search_state.claim_interrupted() == []
+    assert search_state.get(running)['state'] == PENDING
+
+    _, params, checkpoint = claimed[0]
+    resumed = SearchJob.from_checkpoint(running, checkpoint)
+    assert params['query'] == 'cookies'
+    assert (resumed.stage, resumed.result_key, resumed.extract_id) == (ENRICH_STAGE, 'results:cookies', 'extract-1')
+    assert (resumed.owner, resumed.user_id) == ('user:7', 7)
+
+
+@patch('app.services.firecrawl_service.FirecrawlApp')
+def test_resumed_search_polls_the_same_extract_job(mock_firecrawl, running):
+    """Test a resumed search does not pay for a second extract job."""
+    firecrawl = mock_firecrawl.return_value
+    firecrawl.get_extract_status.return_value = {'status': 'completed', 'data': {'results': BASIC}}
+    job = SearchJob(running)
+    job.extract_id = 'extract-1'
+
+    assert search_website('example.com', 'cookies', job=job, detailed=False)
+    firecrawl.get_extract_status.assert_called_with('extract-1')
+    assert not firecrawl.async_extract.called
+    assert job.extract_id is None
+
+
+@patch('app.main.routes.scheduler.submit', run_inline)
+@patch('app.main.routes.enrich_search')
+@patch('app.main.routes.search_website')
+def test_interrupted_enrichment_resumes_on_next_process(mock_search, mock_enrich, client, running):
+    search_state.publish_basic(running, BASIC, result_key='results:cookies')
+    job = SearchJob(running)
+    job.stage = ENRICH_STAGE
+    job.result_key = 'results:cookies'
+    job.checkpoint()
+
+    def check_published(search_id, result_key, results, ranking_type, job):
+        assert search_state.get(search_id)['state'] == ENRICHING
+        assert results == BASIC
+    mock_enrich.side_effect = check_published
+
+    routes.resume_interrupted_searches(client.application)
+    assert mock_enrich.called
+    assert not mock_search.called
@@ -0,0 +1,161 @@
+import time
+import uuid
+import pytest
+from unittest.mock import patch
+from app.extensions import cache
+from app.services.enrichment import enrich_search, enrich_one
+from app.services.firecrawl_service import FirecrawlAPIManager, APIError, enrich_result
+from app.services.search_state import search_state, SearchJob, DeadlineExceeded, COMPLETE, ENRICHING
+
+
+BASIC = [
+    {'title': 'Chewy Cookies', 'summary': 'Soft.', 'rating': 4.1, 'url': 'https://example.com/recipe/1'},
+    {'title': 'Mystery Cookies', 'summary': 'No page.'},
+    {'title': 'Crispy Cookies', 'summary': 'Crunchy.', 'rating': 4.5, 'url': 'https://example.com/recipe/2'},
+    {'title': 'Oat Cookies', 'summary': 'Hearty.', 'rating': 3.9, 'url': 'https://example.com/recipe/3'},
+]
+
+
+def run_inline(fn, **kwargs):
+    """Runs a queued search immediately so tests can inspect its outcome"""
+    fn()
+
+
+def details(url, job=None):
+    return {'summary': f'Commenters on {url} love it.', 'pros': 'Easy', 'cons': 'Sweet', 'rating': 4.9}
+
+
+@pytest.fixture
+def published(app):
+    cache.clear()
+    search_id = str(uuid.uuid4())
+    search_state.create(search_id, {'website': 'example.com', 'query': 'cookies'})
+    search_state.start(search_id)
+    search_state.publish_basic(search_id, BASIC, result_key=f'enrich:{search_id}')
+    return search_id
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_result_adds_comment_analysis(mock_extract, app):
+    result = enrich_result(BASIC[0])
+    assert result['enriched'] is True
+    assert result['pros'] == 'Easy'
+    assert result['rating'] == 4.9
+    assert result['title'] == 'Chewy Cookies'
+    assert 'enriched' not in BASIC[0]
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=APIError('boom'))
+def test_enrich_result_keeps_basic_result_on_error(mock_extract, app):
+    result = enrich_result(BASIC[0])
+    assert result == dict(BASIC[0], enriched=True)
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_search_only_prefetches_top_results(mock_extract, published):
+    """Test only the top results are enriched before anyone asks for them."""
+    results = enrich_search(published, f'enrich:{published}', BASIC, 'ratings', prefetch=2)
+    state = search_state.get(published)
+    assert state['state'] == COMPLETE
+    enriched = {r['title'] for r in state['result'] if r.get('enriched')}
+    assert enriched == {'Chewy Cookies'}  # The result without a URL costs nothing
+    assert results[0]['rating'] == 4.9
+    assert mock_extract.call_count == 1
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_one_updates_shared_result_set(mock_extract, published):
+    result = enrich_one(published, 'https://example.com/recipe/3')
+    assert result['enriched'] is True
+    assert result['pros'] == 'Easy'
+
+    stored = search_state.get(published)['result']
+    assert [bool(r.get('enriched')) for r in stored] == [False, False, False, True]
+    assert enrich_one(published, 'https://example.com/recipe/3') == result
+    assert mock_extract.call_count == 1
+    assert enrich_one(published, 'https://example.com/unknown') is None
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_endpoint(mock_extract, client, published):
+    response = client.post(f'/results/{published}/enrich', json={'url': 'https://example.com/recipe/2'})
+    assert response.status_code == 200
+    assert response.get_json()['result']['cons'] == 'Sweet'
+
+    assert client.post(f'/results/{published}/enrich', json={}).status_code == 400
+    assert client.post('/results/missing/enrich', json={'url': 'https://example.com/recipe/2'}).status_code == 404
+
+
+@patch.object(FirecrawlAPIManager, 'extract')
+def test_enrich_endpoint_gives_each_analysis_a_short_deadline(mock_extract, client, app, published):
+    app.config['ENRICHMENT_ON_DEMAND_SECONDS'] = 10
+
+    def out_of_time(url, job=None):
+        assert 0 < job.remaining() <= 10
+        raise DeadlineExceeded('too slow')
+    mock_extract.side_effect = out_of_time
+
+    response = client.post(f'/results/{published}/enrich', json={'url': 'https://example.com/recipe/2'})
+    assert response.status_code == 504
+    assert response.get_json()['retry_after']
+    assert not any(r.enriched for r in search_state.get(published)['result'])
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_endpoint_caps_concurrent_analyses(mock_extract, client, app, published):
+    app.config['ENRICHMENT_MAX_ON_DEMAND'] = 0
+    response = client.post(f'/results/{published}/enrich', json={'url': 'https://example.com/recipe/2'},
+                           headers={'Accept': 'application/json'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert not mock_extract.called
+
+
+@patch.object(FirecrawlAPIManager, 'extract', side_effect=details)
+def test_enrich_search_stops_at_deadline(mock_extract, published):
+    job = SearchJob(published, deadline=time.time() + 60)
+
+    def use_up_budget(url, job=None):
+        job.deadline = time.time() - 1
+        return details(url)
+    mock_extract.side_effect = use_up_budget
+
+    enrich_search(published, f'enrich:{published}', BASIC, job=job, prefetch=4)
+    state = search_state.get(published)
+    assert state['state'] == COMPLETE
+    assert [bool(r.get('enriched')) for r in state['result']] == [True, False, False, False]
+
+
+def test_details_endpoint_reports_enriched_results(client, published):
+    response = client.get(f'/results/{published}/details')
+    assert response.get_json() == {'complete': False, 'results': []}
+
+    enriched = [dict(BASIC[0], enriched=True, pros='Easy')] + BASIC[1:]
+    search_state.store_results(f'enrich:{published}', enriched)
+    data = client.get(f'/results/{published}/details').get_json()
+    assert data['complete'] is False
+    assert [r['url'] for r in data['results']] == ['https://example.com/recipe/1']
+
+    search_state.complete(published, enriched, result_key=f'enrich:{published}')
+    assert client.get(f'/results/{published}/details').get_json()['complete'] is True
+
+
+@patch('app.main.routes.scheduler.submit', run_inline)
+@patch('app.main.routes.enrich_search')
+@patch('app.main.routes.search_website', return_value=BASIC)
+def test_search_publishes_basic_results_before_enrichment(mock_search, mock_enrich, client):
+    """Test the loading page can move on as soon as the cheap search is done."""
+    def check_published(search_id, result_key, results, ranking_type, job):
+        assert search_state.get(search_id)['state'] == ENRICHING
+    mock_enrich.side_effect = check_published
+
+    client.post('/search', data={'website': 'example.com', 'query': 'cookies'})
+    assert mock_search.call_args.kwargs['detailed'] is False
+    assert mock_enrich.called
+
+    with client.session_transaction() as sess:
+        search_id = sess['search_id']
+    data = client.get('/check_search_status').get_json()
+    assert data['redirect_url'].endswith(f'/results/{search_id}')
+    response = client.get(f'/results/{search_id}')
+    assert b'Analyzing comments' in response.data
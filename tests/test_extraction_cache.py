@@ -0,0 +1,129 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from app.extensions import cache
+from app.services.cache_codec import cache_get, cache_set
+from app.services.firecrawl_service import FirecrawlAPIManager
+from app.services import extraction_cache
+from app.services.extraction_cache import canonical_url, extraction_cache_key, get_or_extract, wait_for_validators
+
+
+def make_response(status_code=200, content=b'<html>recipe</html>', headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    with app.app_context():
+        cache.clear()
+        yield
+
+
+def test_canonical_url():
+    """Test equivalent URLs share one canonical form."""
+    expected = 'https://allrecipes.com/recipe/10813/cookies?page=2'
+    assert canonical_url('http://www.AllRecipes.com/recipe/10813/cookies/?page=2') == expected
+    assert canonical_url('https://allrecipes.com/recipe/10813/cookies?utm_source=x&page=2#reviews') == expected
+    assert extraction_cache_key('http://www.allrecipes.com/a/') == extraction_cache_key('https://allrecipes.com/a')
+
+
+@patch('app.services.extraction_cache.requests.get')
+@patch('app.services.extraction_cache.requests.head')
+def test_fresh_entry_is_shared(mock_head, mock_get, app):
+    """Test a page is only extracted once while its entry is fresh."""
+    mock_head.return_value = make_response(content=b'', headers={'ETag': '"v1"'})
+    extract = MagicMock(return_value={'title': 'Cookies'})
+
+    first = get_or_extract('https://www.allrecipes.com/recipe/1', extract)
+    wait_for_validators()
+    second = get_or_extract('https://allrecipes.com/recipe/1/?utm_medium=email', extract)
+
+    assert first == second == {'title': 'Cookies'}
+    assert extract.call_count == 1
+    assert mock_head.call_count == 1  # Validators captured once on store
+    assert mock_get.call_count == 0  # The HEAD response already carried an ETag
+
+
+@patch('app.services.extraction_cache.requests.get')
+@patch('app.services.extraction_cache.requests.head')
+def test_validators_captured_off_the_search_path(mock_head, mock_get, app):
+    """Test a miss returns before its validators are fetched."""
+    release = threading.Event()
+
+    def slow_head(*args, **kwargs):
+        release.wait(5)
+        return make_response(content=b'', headers={'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+    mock_head.side_effect = slow_head
+    key = extraction_cache_key('https://allrecipes.com/recipe/1')
+    assert get_or_extract('https://allrecipes.com/recipe/1', MagicMock(return_value={'title': 'Cookies'})) == {
+        'title': 'Cookies'}
+    assert cache_get(key)['last_modified'] is None
+
+    release.set()
+    wait_for_validators()
+    assert cache_get(key)['last_modified'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert mock_get.call_count == 0
+
+
+@patch('app.services.extraction_cache.requests.get')
+@patch('app.services.extraction_cache.requests.head')
+def test_stale_entry_revalidated_with_304(mock_head, mock_get, app):
+    """Test a stale entry is kept when the server answers 304."""
+    mock_head.return_value = make_response(content=b'', headers={'ETag': '"v1"'})
+    extract = MagicMock(return_value={'title': 'Cookies'})
+    get_or_extract('https://allrecipes.com/recipe/1', extract)
+    wait_for_validators()
+
+    key = extraction_cache_key('https://allrecipes.com/recipe/1')
+    entry = cache_get(key)
+    entry['validated_at'] = time.time() - extraction_cache.EXTRACTION_CACHE_TTL - 1
+    cache_set(key, entry)
+
+    mock_get.return_value = make_response(status_code=304)
+    assert get_or_extract('https://allrecipes.com/recipe/1', extract) == {'title': 'Cookies'}
+    assert extract.call_count == 1
+    assert mock_get.call_args.kwargs['headers']['If-None-Match'] == '"v1"'
+    assert time.time() - cache_get(key)['validated_at'] < 5
+
+
+@patch('app.services.extraction_cache.requests.get')
+@patch('app.services.extraction_cache.requests.head')
+def test_stale_entry_reextracted_when_content_changes(mock_head, mock_get, app):
+    """Test a changed page is extracted again."""
+    mock_head.return_value = make_response(content=b'')
+    mock_get.return_value = make_response(content=b'<html>old</html>')
+    extract = MagicMock(side_effect=[{'title': 'Old'}, {'title': 'New'}])
+    get_or_extract('https://allrecipes.com/recipe/1', extract)
+    wait_for_validators()
+
+    key = extraction_cache_key('https://allrecipes.com/recipe/1')
+    entry = cache_get(key)
+    entry['validated_at'] = 0
+    cache_set(key, entry)
+
+    mock_get.return_value = make_response(content=b'<html>new</html>')
+    assert get_or_extract('https://allrecipes.com/recipe/1', extract) == {'title': 'New'}
+    assert extract.call_count == 2
+    assert cache_get(key)['record'] == {'title': 'New'}
+
+
+@patch('app.services.extraction_cache.requests.get')
+@patch('app.services.extraction_cache.requests.head')
+def test_summarized_and_unsummarized_extracts_are_cached_apart(mock_head, mock_get, app):
+    """Test summarize_comments, which changes the prompt, does not share cache entries."""
+    mock_head.return_value = make_response(content=b'', headers={'ETag': '"v1"'})
+    url = 'https://allrecipes.com/recipe/1'
+    record = lambda page_url, include_comments, summarize_comments, job: {'summarized': summarize_comments}
+    with patch.object(FirecrawlAPIManager, '_extract_uncached', side_effect=record) as extract:
+        manager = FirecrawlAPIManager()
+        assert manager.extract(url) == {'summarized': True}
+        assert manager.extract(url, summarize_comments=False) == {'summarized': False}
+        assert manager.extract(url) == {'summarized': True}
+    wait_for_validators()
+    assert extract.call_count == 2
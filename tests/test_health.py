@@ -0,0 +1,30 @@
+from unittest.mock import patch
+from app.services import quotas
+from app.services.scheduler import scheduler
+
+
+def test_healthz(client):
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ok'}
+
+
+def test_load_reports_capacity(client):
+    data = client.get('/load').get_json()
+    assert data['status'] == 'ok'
+    assert set(data) >= {'queue', 'estimated_wait_seconds', 'credits', 'cache', 'memory'}
+    assert data['queue']['pending'] == 0
+    assert data['memory']['available_bytes'] > 0
+    assert 0 <= data['cache']['hit_ratio'] <= 1
+
+
+def test_load_reports_busy_queue_and_credits(client, app):
+    app.config['FIRECRAWL_DAILY_LIMIT'] = 100
+    quotas.charge('session:a', credits=3)
+    quotas.charge('user:1', credits=2)
+    busy = dict(scheduler.stats(), workers=2, pending=12, running=2, utilization=1.0, estimated_wait=360.0)
+    with patch.object(scheduler, 'stats', return_value=busy):
+        data = client.get('/load').get_json()
+    assert data['status'] == 'busy'
+    assert data['estimated_wait_seconds'] == 360.0
+    assert data['credits'] == {'daily_limit': 100, 'used_today': 5, 'remaining': 95}
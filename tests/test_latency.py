@@ -0,0 +1,59 @@
+import pytest
+from app.services.latency import (latency_model, quantile, DEFAULT_SECONDS, CACHED_SECONDS,
+                                  SEARCHING, PARSING, RANKING, ENRICHING)
+from app.services.search_state import search_state
+
+
+@pytest.fixture(autouse=True)
+def no_history(app):
+    # The in-memory store lives as long as the test process
+    search_state._connection().execute('DELETE FROM stage_timings')
+    latency_model.clear()
+
+
+def test_quantile_interpolates():
+    assert quantile([], 0.5) is None
+    assert quantile([4], 0.9) == 4
+    assert quantile([1, 2, 3, 4], 0.5) == 2.5
+    assert quantile([0, 10], 0.9) == pytest.approx(9)
+
+
+def test_estimates_fall_back_until_there_is_history():
+    assert latency_model.stage_seconds(SEARCHING, 'example.com', 'relevance') == DEFAULT_SECONDS[SEARCHING]
+    for seconds in (10, 12, 50):
+        latency_model.record('other.com', 'relevance', SEARCHING, seconds)
+    # Pooled across websites until this one has history of its own
+    assert latency_model.stage_seconds(SEARCHING, 'example.com', 'relevance') == 12
+    for seconds in (2, 3, 4):
+        latency_model.record('example.com', 'relevance', SEARCHING, seconds)
+    assert latency_model.stage_seconds(SEARCHING, 'example.com', 'relevance') == 3
+    assert latency_model.stage_seconds(SEARCHING, 'example.com', 'relevance', q=1.0) == 4
+
+
+def test_enriching_estimate_is_per_item():
+    for seconds, items in ((20, 2), (30, 3), (8, 1), (5, 0)):
+        latency_model.record('example.com', 'relevance', ENRICHING, seconds, items)
+    assert latency_model.stage_seconds(ENRICHING, 'example.com', 'relevance') == 10
+
+
+def test_predicted_job_duration():
+    for stage, seconds in ((SEARCHING, 40), (PARSING, 1), (RANKING, 1), (ENRICHING, 10)):
+        for _ in range(3):
+            latency_model.record('example.com', 'ratings', stage, seconds, 1 if stage == ENRICHING else None)
+    assert latency_model.predict('Example.com', 'ratings', prefetch=2) == 62
+    assert latency_model.predict('example.com', 'ratings', prefetch=2, basic=False) == 20
+    # Cached basic results skip the API calls but are still enriched
+    assert latency_model.predict('example.com', 'ratings', cached=True, prefetch=2) == 20 + CACHED_SECONDS
+    assert latency_model.predict('example.com', 'ratings', cached=True) == CACHED_SECONDS
+
+
+def test_windows_are_cached_between_refreshes():
+    for seconds in (5, 5, 5):
+        latency_model.record('example.com', 'relevance', PARSING, seconds)
+    assert latency_model.stage_seconds(PARSING, 'example.com', 'relevance') == 5
+    # Another worker's timings show up once the window is refreshed
+    for seconds in (9, 9, 9, 9):
+        search_state.record_timing('example.com', 'relevance', PARSING, seconds)
+    assert latency_model.stage_seconds(PARSING, 'example.com', 'relevance') == 5
+    latency_model.clear()
+    assert latency_model.stage_seconds(PARSING, 'example.com', 'relevance') == 9
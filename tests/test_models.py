@@ -1,5 +1,5 @@
 import pytest
-from app.models import User, UserSearchHistory
+from app.models import User, UserSearchHistory, SearchResult, ResultSet
 from datetime import datetime
 
 def test_user_creation(app):
@@ -111,4 +111,41 @@ def test_search_history_model(app):
         assert history.search_query == 'chocolate cake'
         assert history.ranking_type == 'relevance'
         assert history.created_at == datetime(2024, 1, 1, 12, 0, 0)
-        assert str(history) == '<UserSearchHistory allrecipes.com:chocolate cake>' 
\ No newline at end of file
+        assert str(history) == '<UserSearchHistory allrecipes.com:chocolate cake>'
+
+
+def test_search_result_reads_like_a_dict():
+    """Test SearchResult keeps the dict interface the pipeline was written against."""
+    result = SearchResult.from_dict({'title': 'Cookies', 'url': 'https://example.com/1', 'source': 'feed'})
+    assert result.title == result['title'] == result.get('title') == 'Cookies'
+    assert result.pros == [] and result.rating is None
+    assert result['source'] == 'feed' and result.get('missing', 1) == 1
+    assert 'source' in result and 'rating' not in result
+    with pytest.raises(KeyError):
+        result['missing']
+
+    result['rating'] = 4.5
+    result['note'] = 'new'
+    assert result.rating == 4.5 and result.extra == {'source': 'feed', 'note': 'new'}
+    assert dict(result) == result.to_dict()
+    assert result == {'title': 'Cookies', 'url': 'https://example.com/1', 'rating': 4.5,
+                      'source': 'feed', 'note': 'new'}
+
+    copied = result.copy(enriched=True)
+    assert copied.enriched and not result.enriched
+
+
+def test_result_set_columns_round_trip():
+    """Test a result set rebuilds from its columns and leaves out unset fields."""
+    results = ResultSet.coerce([
+        {'title': 'A', 'url': 'a', 'rating': 4.0, 'pros': ['Easy']},
+        {'title': 'B', 'url': 'b', 'raw_response': 'text'},
+    ])
+    columns = results.to_columns()
+    assert set(columns) == {'title', 'url', 'rating', 'pros', 'extra'}
+    assert results.column('rating') == [4.0, None]
+
+    rebuilt = ResultSet.from_columns(columns, len(results))
+    assert rebuilt == results
+    assert rebuilt[1].pros == [] and rebuilt[1].pros is not rebuilt[0].cons
+    assert ResultSet.coerce(rebuilt) is rebuilt
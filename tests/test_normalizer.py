@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from app.services.normalizer import normalize_response, normalize_record
+
+
+def test_nested_envelope_keeps_relevance_order():
+    response = {'success': True, 'data': {'data': {
+        'title': 'First', 'url': 'https://example.com/1', 'tips': ['Chill it'],
+        'results': [{'title': 'Second', 'url': 'https://example.com/2'}],
+    }}}
+    records = normalize_response(response)
+    assert [(r['rank'], r['title']) for r in records] == [(1, 'First'), (2, 'Second')]
+    assert records[0]['tips_and_tricks'] == ['Chill it']
+    assert records[1]['summary'] == '' and records[1]['pros'] == []
+
+
+def test_flat_shapes_and_objects():
+    flat = normalize_response({'data': {'results': [{'title': 'A', 'url': 'u'}]}})
+    assert [r['title'] for r in flat] == ['A']
+    bare = normalize_response({'results': [{'name': 'B', 'link': 'v'}]})
+    assert bare[0]['title'] == 'B' and bare[0]['url'] == 'v'
+    objects = normalize_response([SimpleNamespace(title='C', url='w', rating='4.5')])
+    assert objects[0]['title'] == 'C' and objects[0]['rating'] == 4.5
+
+
+def test_field_name_drift_is_resolved():
+    record = normalize_record({'data': {
+        'title': 'Cookies', 'description': 'Chewy', 'imageUrl': 'i.jpg',
+        'tipsTricks': ['Rest the dough'], 'uniqueAspect': 'Brown butter', 'keyTakeaways': ['Salt'],
+    }})
+    assert record['summary'] == 'Chewy'
+    assert record['image_url'] == 'i.jpg'
+    assert record['tips_and_tricks'] == ['Rest the dough']
+    assert record['big_difference'] == 'Brown butter'
+    assert record['key_takeaways'] == ['Salt']
+
+
+def test_ratings_are_lenient():
+    records = normalize_response({'results': [
+        {'title': 'a', 'rating': '4.2'}, {'title': 'b', 'rating': 0},
+        {'title': 'c', 'rating': 'five stars'}, {'title': 'd'},
+    ]})
+    assert [r['rating'] for r in records] == [4.2, None, None, None]
+
+
+def test_review_counts_and_dates():
+    records = normalize_response({'results': [
+        {'title': 'a', 'reviewCount': '1,204', 'datePublished': '2024-03-01T00:00:00Z'},
+        {'title': 'b', 'ratingCount': 'many', 'published': '2019'},
+        {'title': 'c', 'review_count': 12, 'date': 1700000000},
+    ]})
+    assert [r['review_count'] for r in records] == [1204, None, 12]
+    assert records[0]['published'] == 1709251200.0
+    assert records[1]['published'] == 1546300800.0
+    assert records[2]['published'] == 1700000000.0
+
+
+def test_empty_envelope_has_no_main_record():
+    records = normalize_response({'data': {'data': {'results': [{'title': 'Only', 'url': 'u'}]}}})
+    assert [r['title'] for r in records] == ['Only']
+    assert normalize_response({'data': {'data': 'nothing'}}) == []
+    assert normalize_record({'data': {}}) == {}
+
+
+def test_malformed_item_does_not_drop_the_rest():
+    records = normalize_response({'results': [
+        {'title': {'nested': 'oops'}, 'url': 'bad'}, {'title': 'Good', 'url': 'good'},
+    ]})
+    assert [(r['rank'], r['title']) for r in records] == [(1, 'Good')]
+
+
+def test_unknown_shape():
+    assert normalize_response('plain text') is None
+    assert normalize_record(None) == {}
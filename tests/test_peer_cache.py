@@ -0,0 +1,123 @@
+import pickle
+import threading
+import pytest
+from werkzeug.serving import make_server
+from app import create_app
+from app.extensions import cache, db
+from app.services import peer_cache
+from app.services.cache_codec import cache_get, encode, decode_portable
+from app.services.cache_index import cache_index
+from app.services.peer_cache import HashRing
+
+
+@pytest.fixture
+def cluster():
+    """Two app instances served on local ports, configured as peers."""
+    apps, servers, threads = [], [], []
+    for _ in range(2):
+        app = create_app('testing')
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        apps.append(app)
+        servers.append(server)
+        threads.append(thread)
+
+    urls = [f'http://127.0.0.1:{server.server_port}' for server in servers]
+    for app, url in zip(apps, urls):
+        app.config.update(CACHE_PEERS=urls, CACHE_PEER_SELF=url, CACHE_PEER_SECRET='secret')
+        with app.app_context():
+            db.create_all()
+            cache.clear()
+    cache_index.clear()
+
+    yield apps, urls
+
+    for server in servers:
+        server.shutdown()
+
+
+def key_owned_by(app, url):
+    with app.app_context():
+        return next(f'search:{i}' for i in range(1000) if peer_cache.owner(f'search:{i}') == url)
+
+
+def test_hash_ring_is_stable():
+    """Test adding a node only moves a share of the keys."""
+    keys = [f'key-{i}' for i in range(2000)]
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+    moved = sum(1 for k in keys if before.node_for(k) != after.node_for(k))
+    assert {before.node_for(k) for k in keys} == {'a', 'b', 'c'}
+    assert moved < len(keys) * 0.4
+    assert all(after.node_for(k) == 'd' for k in keys if before.node_for(k) != after.node_for(k))
+
+
+def test_value_published_to_owner_and_fetched_by_peers(cluster):
+    """Test a value computed on one instance is served to the other by its owner."""
+    (app_a, app_b), (url_a, url_b) = cluster
+    key = key_owned_by(app_a, url_b)
+
+    with app_a.app_context():
+        peer_cache.set_shared(key, [{'title': 'Cookies'}], timeout=600, tags=['website:allrecipes.com'])
+
+    with app_b.app_context():
+        assert cache_get(key) == [{'title': 'Cookies'}]
+
+    with app_a.app_context():
+        cache.delete(key)
+        assert peer_cache.get_shared(key) == [{'title': 'Cookies'}]
+        assert cache.get(key) is not None  # Stored locally after the peer hit
+
+
+def test_owner_does_not_ask_peers(cluster):
+    """Test a miss on the owning instance is a real miss."""
+    (app_a, app_b), (url_a, url_b) = cluster
+    key = key_owned_by(app_a, url_a)
+    with app_a.app_context():
+        assert peer_cache.get_shared(key) is None
+
+
+def test_peer_endpoints_require_secret(cluster):
+    """Test peer endpoints reject requests without the shared secret."""
+    (app_a, _), _ = cluster
+    client = app_a.test_client()
+    assert client.get('/peer/cache/search:1').status_code == 403
+    assert client.get('/peer/cache/search:1', headers={'X-Peer-Secret': 'secret'}).status_code == 404
+
+
+def test_peer_endpoints_disabled_without_peers(client):
+    """Test single instances do not expose peer endpoints."""
+    assert client.get('/peer/cache/search:1').status_code == 404
+
+
+def test_peers_without_secret_fail_closed(cluster):
+    """Test configured peers share nothing until a secret is set."""
+    (app_a, app_b), (url_a, url_b) = cluster
+    key = key_owned_by(app_a, url_b)
+    for app in (app_a, app_b):
+        app.config['CACHE_PEER_SECRET'] = None
+
+    with app_a.app_context():
+        assert not peer_cache.enabled()
+        peer_cache.set_shared(key, [{'title': 'Cookies'}])
+    with app_b.app_context():
+        assert cache.get(key) is None
+    client = app_b.test_client()
+    assert client.put(f'/peer/cache/{key}', data=encode('x')).status_code == 404
+    assert client.get(f'/peer/cache/{key}').status_code == 404
+
+
+def test_peers_exchange_only_portable_values(cluster):
+    """Test pushed pickle or marshal bytes are refused and served values are portable."""
+    (app_a, _), _ = cluster
+    client = app_a.test_client()
+    headers = {'X-Peer-Secret': 'secret'}
+    for blob in (encode({'title': 'Cookies'}), b'\x03' + pickle.dumps({'title': 'Cookies'})):
+        assert client.put('/peer/cache/search:1', data=blob, headers=headers).status_code == 400
+    with app_a.app_context():
+        assert cache.get('search:1') is None
+        peer_cache.store_local('search:1', [{'title': 'Cookies'}])
+
+    response = client.get('/peer/cache/search:1', headers=headers)
+    assert decode_portable(response.data) == [{'title': 'Cookies'}]
@@ -0,0 +1,80 @@
+import uuid
+import pytest
+from unittest.mock import patch
+from app.services.latency import latency_model, DEFAULT_SECONDS
+from app.services.progress import (StageProgress, QUEUED, SEARCHING, PARSING, RANKING, ENRICHING, DONE,
+                                   remaining, poll_interval)
+from app.services.search_state import search_state, SearchJob
+
+
+@pytest.fixture(autouse=True)
+def no_history(app):
+    # The in-memory store lives as long as the test process
+    search_state._connection().execute('DELETE FROM stage_timings')
+    latency_model.clear()
+
+
+@pytest.fixture
+def search_id(app):
+    search_id = str(uuid.uuid4())
+    search_state.create(search_id, {'website': 'example.com', 'query': 'cookies'})
+    return search_id
+
+
+def test_timing_history_is_capped(app):
+    with patch('app.services.search_state.TIMING_HISTORY', 5):
+        for seconds in range(12):
+            search_state.record_timing('example.com', 'relevance', PARSING, seconds)
+    timings = search_state.timings(PARSING, 'example.com', 'relevance')
+    assert [seconds for seconds, _ in timings] == [11, 10, 9, 8, 7]
+
+
+def test_stages_are_reported_and_timed(search_id):
+    for seconds in (4, 4, 4):
+        latency_model.record('example.com', 'relevance', SEARCHING, seconds)
+    job = SearchJob(search_id)
+    job.progress = StageProgress(search_id, 'Example.com')
+
+    job.report(QUEUED)
+    record = search_state.get(search_id)['progress']
+    assert record['stage'] == QUEUED
+    assert record['eta'] == pytest.approx(4 + sum(DEFAULT_SECONDS[s] for s in (QUEUED, PARSING, RANKING)))
+
+    search_state.start(search_id)
+    job.report(SEARCHING)
+    job.report(PARSING)
+    job.report(RANKING)
+    search_state.publish_basic(search_id, [], result_key='results:cookies')
+    job.report(ENRICHING, 0, 2)
+    job.report(ENRICHING, 1, 2)
+    record = search_state.get(search_id)['progress']
+    assert (record['stage'], record['done'], record['total']) == (ENRICHING, 1, 2)
+    assert record['eta'] == DEFAULT_SECONDS[ENRICHING]
+
+    job.report(ENRICHING, 2, 2)
+    search_state.complete(search_id, [], result_key='results:cookies')
+    job.report(DONE)
+    for stage in (QUEUED, SEARCHING, PARSING, RANKING):
+        assert len(search_state.timings(stage, 'example.com', 'relevance')) >= 1
+    assert search_state.timings(ENRICHING, 'example.com', 'relevance')[0][1] == 2
+
+
+def test_status_poll_returns_progress(client, search_id):
+    with client.session_transaction() as session:
+        session['search_id'] = search_id
+    StageProgress(search_id, 'example.com').report(QUEUED)
+    data = client.get('/check_search_status').get_json()
+    assert data['complete'] is False
+    assert data['progress']['stage'] == QUEUED
+    assert 0 < data['eta'] <= data['progress']['eta']
+    assert data['poll_after'] == poll_interval(data['eta'])
+
+
+def test_remaining_time_counts_down():
+    record = {'stage': SEARCHING, 'eta': 30.0, 'at': 1000.0}
+    assert remaining(record, now=1010.0) == 20.0
+    assert remaining(record, now=1100.0) == 0
+    assert remaining({'stage': SEARCHING}) is None
+    assert poll_interval(None) == 1
+    assert poll_interval(2) == 1
+    assert poll_interval(400) == 10
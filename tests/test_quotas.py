@@ -0,0 +1,171 @@
+import uuid
+import pytest
+from unittest.mock import patch
+from datetime import datetime
+from app.extensions import cache, db
+from app.models import CreditUsage, User, UserSearchHistory
+from app.services import quotas
+from app.main import routes
+from app.services.firecrawl_service import search_website, enrich_result, QuotaExceeded
+from app.services.scheduler import ADMIN, ANONYMOUS
+from app.services.search_state import search_state, SearchJob, ERROR
+
+
+@pytest.fixture
+def owner(app):
+    cache.clear()
+    return f"session:{uuid.uuid4()}"
+
+
+def test_charge_counts_day_and_hour(owner):
+    quotas.charge(owner)
+    quotas.charge(owner, credits=2)
+    assert quotas.usage(owner) == {'day': 3, 'hour': 3}
+    assert CreditUsage.query.filter_by(owner=owner).count() == 2
+
+
+def test_charge_survives_losing_the_row_insert_race(owner):
+    quotas.charge(owner)
+    increment = quotas._increment
+    raced = []
+
+    def hour_row_looks_missing(owner, window, start, credits):
+        # Another worker inserts the hour row between our UPDATE and INSERT
+        if window == 'hour' and not raced:
+            raced.append(window)
+            return 0
+        return increment(owner, window, start, credits)
+
+    with patch('app.services.quotas._increment', side_effect=hour_row_looks_missing):
+        quotas.charge(owner, credits=2)
+    assert raced
+    assert quotas.usage(owner) == {'day': 3, 'hour': 3}
+
+
+def test_burst_limit_applies_before_daily_limit(owner, app):
+    app.config['QUOTA_BURST_ANONYMOUS'] = 2
+    app.config['QUOTA_DAILY_ANONYMOUS'] = 5
+    assert quotas.remaining(owner, ANONYMOUS) == 2
+    quotas.charge(owner, credits=2)
+    assert quotas.remaining(owner, ANONYMOUS) == 0
+    assert not quotas.allowed(owner, ANONYMOUS)
+
+    summary = quotas.summary(owner, ANONYMOUS)
+    assert summary['day'] == 2
+    assert summary['daily_limit'] == 5
+
+
+def test_admins_are_unlimited(owner):
+    quotas.charge(owner, credits=1000)
+    assert quotas.remaining(owner, ADMIN) is None
+    assert quotas.allowed(owner, ADMIN)
+
+
+def test_top_owners(owner):
+    quotas.charge('user:1', credits=4)
+    quotas.charge(owner)
+    assert [u.owner for u in quotas.top_owners()] == ['user:1', owner]
+
+
+@patch('app.services.firecrawl_service.time.sleep')
+@patch('app.services.firecrawl_service.FirecrawlApp')
+def test_search_charges_owner_and_falls_back_to_cache(mock_firecrawl, mock_sleep, owner, app):
+    """Test an owner out of credits gets cached results but no new paid calls."""
+    app.config['QUOTA_BURST_ANONYMOUS'] = 1
+    firecrawl = mock_firecrawl.return_value
+    firecrawl.async_extract.__name__ = 'async_extract'
+    firecrawl.async_extract.return_value = {'success': True, 'id': 'extract-1'}
+    firecrawl.get_extract_status.return_value = {
+        'status': 'completed',
+        'data': {'results': [{'title': 'Chewy Cookies', 'url': 'https://example.com/1'}]},
+    }
+
+    def job():
+        search_id = str(uuid.uuid4())
+        search_state.create(search_id, {'query': 'cookies'})
+        search_state.start(search_id)
+        return SearchJob(search_id, owner=owner, priority=ANONYMOUS)
+
+    assert search_website('example.com', 'cookies', job=job(), detailed=False)
+    assert quotas.usage(owner)['hour'] == 1
+
+    # The same search is served from the cache
+    assert search_website('example.com', 'cookies', job=job(), detailed=False)
+    # A new one is not run at all
+    with pytest.raises(QuotaExceeded):
+        search_website('example.com', 'brownies', job=job(), detailed=False)
+    assert firecrawl.async_extract.call_count == 1
+
+
+@patch('app.main.routes.search_website', side_effect=QuotaExceeded('Credit quota used up'))
+def test_search_out_of_credits_explains_quota(mock_search, app, client, owner):
+    """Test a search with nothing cached and no credits ends on the quota page, not 'not found'."""
+    search_id = str(uuid.uuid4())
+    params = {'website': 'example.com', 'query': 'brownies'}
+    search_state.create(search_id, params)
+    routes.run_search(app, search_id, params, SearchJob(search_id, owner=owner, priority=ANONYMOUS))
+    state = search_state.get(search_id)
+    assert (state['state'], state['error']) == (ERROR, quotas.EXHAUSTED)
+
+    with client.session_transaction() as sess:
+        sess['search_id'] = search_id
+    assert client.get('/check_search_status').get_json()['redirect_url'] == '/api-error/quota'
+    page = client.get('/api-error/quota')
+    assert page.status_code == 200
+    assert b'used up your search credits' in page.data
+
+
+def test_enrichment_over_quota_leaves_result_unenriched(owner):
+    quotas.charge(owner, credits=100)
+    job = SearchJob(None, owner=owner, priority=ANONYMOUS)
+    result = {'title': 'Chewy Cookies', 'url': 'https://example.com/recipe/1'}
+    with patch('app.services.firecrawl_service.FirecrawlApp') as mock_firecrawl:
+        enriched = enrich_result(result, job=job)
+    assert 'enriched' not in enriched
+    assert not mock_firecrawl.return_value.async_extract.called
+
+
+def test_search_route_marks_cache_only(client, app):
+    app.config['QUOTA_BURST_ANONYMOUS'] = 0
+    with patch('app.main.routes.scheduler.submit'):
+        response = client.post('/search', data={'website': 'example.com', 'query': 'cookies'},
+                               follow_redirects=True)
+    assert b'only cached results' in response.data
+    with client.session_transaction() as sess:
+        state = search_state.get(sess['search_id'])
+    assert state['params']['cache_only'] is True
+
+
+def login(client, is_admin=False):
+    user = User(username='admin' if is_admin else 'cook', email=f"{'admin' if is_admin else 'cook'}@example.com",
+                is_admin=is_admin)
+    user.set_password('TestPass123!')
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return user
+
+
+def test_profile_page_shows_credits(client):
+    user = login(client)
+    db.session.add(UserSearchHistory(user_id=user.id, website='allrecipes.com', search_query='cookies',
+                                     ranking_type='ratings', created_at=datetime.utcnow()))
+    db.session.commit()
+    quotas.charge(f'user:{user.id}', credits=2)
+
+    response = client.get('/auth/profile')
+    assert response.status_code == 200
+    assert b'Search Credits' in response.data
+    assert b'2 of 30' in response.data
+    assert b'cookies' in response.data
+
+
+def test_usage_dashboard_shows_credits(client):
+    login(client, is_admin=True)
+    quotas.charge('session:heavy', credits=7)
+
+    response = client.get('/api-usage')
+    assert response.status_code == 200
+    assert b'7 of 100' in response.data
+    assert b'session:heavy' in response.data
@@ -0,0 +1,76 @@
+import numpy as np
+from app.services.ranking import (rank, register, scores, quality_scores, RANKINGS, RELEVANCE, RATINGS,
+                                  BAYESIAN, WILSON)
+
+DAY = 86400
+NOW = 1_700_000_000.0
+
+
+def titles(results):
+    return [r.title for r in results]
+
+
+def test_review_counts_temper_ratings():
+    """Test a 4.7 from 12,000 reviews beats a 4.9 from 3."""
+    results = [{'title': 'Few', 'rating': 4.9, 'review_count': 3},
+               {'title': 'Many', 'rating': 4.7, 'review_count': 12000},
+               {'title': 'Poor', 'rating': 2.5, 'review_count': 800}]
+    ratings = np.array([4.9, 4.7, 2.5])
+    counts = np.array([3.0, 12000.0, 800.0])
+    bayesian = quality_scores(ratings, counts, BAYESIAN)
+    assert bayesian[1] > bayesian[0] > bayesian[2]
+    # Wilson is harsher still: three reviews say less than 800 mediocre ones
+    wilson = quality_scores(ratings, counts, WILSON)
+    assert wilson[1] > wilson[2] > wilson[0]
+    assert titles(rank(results, RATINGS)) == ['Many', 'Few', 'Poor']
+
+
+def test_unrated_results_score_as_average():
+    results = [{'title': 'Bad', 'rating': 1.0}, {'title': 'Unrated'}, {'title': 'Good', 'rating': 5.0},
+               {'title': 'Text rating', 'rating': '4.5'}]
+    assert titles(rank(results, RATINGS)) == ['Good', 'Text rating', 'Unrated', 'Bad']
+
+
+def test_relevance_order_is_kept():
+    results = [{'title': t, 'rating': r} for t, r in (('A', 3.0), ('B', 5.0), ('C', None))]
+    assert titles(rank(results, RELEVANCE)) == ['A', 'B', 'C']
+    assert titles(rank(results, 'unknown type')) == ['A', 'B', 'C']
+    assert titles(rank(results, RELEVANCE, limit=2)) == ['A', 'B']
+
+
+def test_ties_keep_relevance_order():
+    results = [{'title': str(i), 'rating': 4.0} for i in range(6)]
+    assert titles(rank(results, RATINGS)) == ['0', '1', '2', '3', '4', '5']
+    assert titles(rank(results, RATINGS, limit=3)) == ['0', '1', '2']
+
+
+def test_top_k_matches_full_ranking():
+    rng = np.random.default_rng(7)
+    results = [{'title': str(i), 'rating': float(rating), 'review_count': int(count)}
+               for i, (rating, count) in enumerate(zip(rng.uniform(1, 5, 300), rng.integers(0, 5000, 300)))]
+    full = titles(rank(results, RATINGS))
+    assert titles(rank(results, RATINGS, limit=10)) == full[:10]
+    assert len(rank(results, RATINGS, limit=0)) == 0
+
+
+def test_recency_and_pluggable_weights(app):
+    results = [{'title': 'Old', 'rating': 4.8, 'published': NOW - 900 * DAY},
+               {'title': 'New', 'rating': 4.6, 'published': NOW - 10 * DAY}]
+    assert titles(rank(results, RATINGS, now=NOW)) == ['Old', 'New']
+
+    register('fresh', recency=1.0, quality=0.2)
+    try:
+        assert titles(rank(results, 'fresh', now=NOW)) == ['New', 'Old']
+        app.config['RANKING_WEIGHTS'] = {'fresh': {'quality': 1.0}}
+        assert titles(rank(results, 'fresh', now=NOW)) == ['Old', 'New']
+    finally:
+        RANKINGS.pop('fresh')
+        app.config['RANKING_WEIGHTS'] = {}
+
+
+def test_scores_do_not_reorder_input():
+    results = [{'title': 'A', 'rating': 2.0}, {'title': 'B', 'rating': 5.0}]
+    ranked = rank(results, RATINGS)
+    assert titles(ranked) == ['B', 'A']
+    assert [r['title'] for r in results] == ['A', 'B']
+    assert scores(ranked, RATINGS).shape == (2,)
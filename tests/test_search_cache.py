@@ -0,0 +1,66 @@
+import pytest
+from unittest.mock import patch
+from app.extensions import cache
+from app.services.firecrawl_service import FirecrawlAPIManager, search_website, apply_ranking
+
+
+def nested_response():
+    """Firecrawl extract response in the nested data -> data -> results shape"""
+    return {
+        'success': True,
+        'status': 'completed',
+        'data': {
+            'data': {
+                'title': 'Classic Cookies',
+                'summary': 'The original.',
+                'rating': 4.2,
+                'url': 'https://example.com/recipe/1',
+                'results': [
+                    {'title': 'Chewy Cookies', 'summary': 'Soft.', 'rating': 4.9,
+                     'url': 'https://example.com/recipe/2'},
+                    {'title': 'Unrated Cookies', 'summary': 'New.',
+                     'url': 'https://example.com/recipe/3'},
+                    {'title': 'Crispy Cookies', 'summary': 'Crunchy.', 'rating': 4.5,
+                     'url': 'https://example.com/recipe/4'},
+                ]
+            }
+        }
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    with app.app_context():
+        cache.clear()
+        yield
+
+
+@patch.object(FirecrawlAPIManager, 'search')
+def test_ranking_modes_share_one_api_call(mock_search, app):
+    """Test relevance and ratings for the same query cost one search."""
+    mock_search.return_value = nested_response()
+
+    relevance = search_website('example.com', 'cookies', 'relevance')
+    ratings = search_website('example.com', 'cookies', 'ratings')
+
+    assert mock_search.call_count == 1
+    assert [r['title'] for r in relevance] == [
+        'Classic Cookies', 'Chewy Cookies', 'Unrated Cookies', 'Crispy Cookies'
+    ]
+    # Unrated scores as the average result rather than sinking to the bottom
+    assert [r['title'] for r in ratings] == [
+        'Chewy Cookies', 'Unrated Cookies', 'Crispy Cookies', 'Classic Cookies'
+    ]
+
+    # Reading a ranked view never reorders the cached results
+    assert [r['title'] for r in search_website('example.com', 'cookies', 'relevance')] == [
+        r['title'] for r in relevance
+    ]
+
+
+def test_apply_ranking_does_not_mutate():
+    """Test ranking returns a new list."""
+    results = [{'rating': 1.0}, {'rating': None}, {'rating': 5.0}]
+    ranked = apply_ranking(results, 'ratings')
+    assert [r['rating'] for r in ranked] == [5.0, None, 1.0]
+    assert [r['rating'] for r in results] == [1.0, None, 5.0]
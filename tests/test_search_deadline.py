@@ -0,0 +1,103 @@
+import time
+import uuid
+import pytest
+from unittest.mock import patch, MagicMock
+from app.extensions import cache
+from app.main import routes
+from app.services.firecrawl_service import FirecrawlAPIManager, search_website, get_detailed_results
+from app.services.search_state import search_state, SearchJob, DeadlineExceeded, ERROR
+
+
+@pytest.fixture
+def job(app):
+    search_id = str(uuid.uuid4())
+    search_state.create(search_id, {'query': 'cookies'})
+    search_state.start(search_id)
+    cache.clear()
+    return SearchJob(search_id, deadline=time.time() + 60)
+
+
+def test_job_budget_is_capped_by_remaining_time(job):
+    assert job.budget(600) <= 60
+    assert job.budget(5) == 5
+    assert SearchJob('no-deadline').budget(600) == 600
+
+
+def test_expired_job_raises_deadline_exceeded(job):
+    job.deadline = time.time() - 1
+    assert job.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        job.check()
+
+
+@patch('app.services.firecrawl_service.time.sleep')
+@patch('app.services.firecrawl_service.FirecrawlApp')
+def test_search_out_of_time_raises_deadline_exceeded(mock_firecrawl, mock_sleep, job):
+    """Test the search stage gives up at the deadline instead of polling on."""
+    firecrawl = mock_firecrawl.return_value
+    firecrawl.async_extract.__name__ = 'async_extract'
+    firecrawl.async_extract.return_value = {'success': True, 'id': 'extract-1'}
+
+    def still_processing(extract_id):
+        job.deadline = time.time() - 1
+        return {'status': 'processing'}
+    firecrawl.get_extract_status.side_effect = still_processing
+
+    with pytest.raises(DeadlineExceeded):
+        search_website('allrecipes.com', 'cookies', job=job)
+    assert firecrawl.get_extract_status.call_count == 1
+
+
+@patch('app.services.search_state.time.sleep')
+@patch('app.services.firecrawl_service.FirecrawlApp')
+def test_retry_backoff_stops_at_deadline(mock_firecrawl, mock_sleep, job):
+    """Test a backoff longer than the time left raises DeadlineExceeded without waiting."""
+    failing = MagicMock(side_effect=Exception('500 Internal Server Error'), __name__='async_extract')
+    manager = FirecrawlAPIManager()
+    # time.sleep is patched process-wide, so ignore other threads' short sleeps
+    backoffs = lambda: [c for c in mock_sleep.call_args_list if c.args == (60,)]
+    with pytest.raises(DeadlineExceeded):
+        manager._execute_with_timeout(failing, job=job)
+    assert backoffs() == []
+
+    job.deadline = time.time() + 3600
+    with pytest.raises(Exception, match='API request failed'):
+        manager._execute_with_timeout(failing, job=job)
+    assert backoffs()  # Once per retry attempt
+
+
+def test_enrichment_returns_partial_results_at_deadline(job):
+    """Test results not enriched before the deadline are returned as they are."""
+    basic = [{'url': f'https://allrecipes.com/recipe/{i}', 'title': f'Recipe {i}'} for i in range(3)]
+
+    def enrich(url, fetch, namespace):
+        job.deadline = time.time() - 1  # The first page uses up the budget
+        return {'rating': 4.8}
+
+    with patch('app.services.firecrawl_service.DEV_MODE', False), \
+            patch('app.services.firecrawl_service.extraction_cache.get_or_extract', side_effect=enrich) as fetch:
+        results = get_detailed_results([dict(r) for r in basic], 'allrecipes.com', job)
+
+    assert fetch.call_count == 1
+    assert len(results) == 3
+    assert results[0]['rating'] == 4.8
+    assert [r['title'] for r in results[1:]] == ['Recipe 1', 'Recipe 2']
+
+
+def test_search_route_stores_mode(client):
+    with patch('app.main.routes.scheduler.submit'):
+        client.post('/search', data={'website': 'allrecipes.com', 'query': 'cookies', 'mode': 'fast'})
+    with client.session_transaction() as sess:
+        state = search_state.get(sess['search_id'])
+    assert state['params']['mode'] == 'fast'
+
+
+@patch('app.main.routes.search_website', side_effect=DeadlineExceeded('out of time'))
+def test_search_out_of_time_is_reported_as_an_error(mock_search, app):
+    """Test a search that runs out of time fails with a hint, not an empty 'no results' page."""
+    search_id = str(uuid.uuid4())
+    params = {'website': 'allrecipes.com', 'query': 'cookies'}
+    search_state.create(search_id, params)
+    routes.run_search(app, search_id, params, SearchJob(search_id))
+    state = search_state.get(search_id)
+    assert (state['state'], state['error']) == (ERROR, routes.OUT_OF_TIME)
@@ -0,0 +1,101 @@
+import json
+import time
+import uuid
+import pytest
+from app.services import scheduler, search_events
+from app.services.search_state import search_state
+
+BASIC = [{'title': 'Chewy Cookies', 'url': 'https://example.com/recipe/1'},
+         {'title': 'Crisp Cookies', 'url': 'https://example.com/recipe/2'}]
+
+
+@pytest.fixture
+def search_id(app):
+    search_id = str(uuid.uuid4())
+    search_state.create(search_id, {'website': 'example.com', 'query': 'cookies'})
+    return search_id
+
+
+def parse(body):
+    """Event names and payloads from an SSE body"""
+    events = []
+    for message in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in message.splitlines() if line.startswith(('event', 'data')))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_writes_bump_versions(search_id):
+    first = search_state.snapshot(search_id)
+    search_state.start(search_id)
+    assert search_state.set_progress(search_id, {'stage': 'searching', 'eta': 30.0})
+    second = search_state.snapshot(search_id)
+    assert second['version'] > first['version']
+    assert second['progress'] == {'stage': 'searching', 'eta': 30.0}
+
+    search_state.publish_basic(search_id, BASIC, result_key='results:cookies')
+    published = search_state.snapshot(search_id)
+    enriched = dict(BASIC[0], enriched=True)
+    assert search_state.update_result('results:cookies', BASIC[0]['url'], enriched)
+    assert search_state.snapshot(search_id)['result_version'] > published['result_version']
+
+
+def test_progress_is_not_recorded_for_finished_searches(search_id):
+    search_state.start(search_id)
+    search_state.complete(search_id, BASIC)
+    assert not search_state.set_progress(search_id, {'stage': 'enriching', 'done': 1, 'total': 2})
+
+
+def test_stream_sends_results_and_ends_when_done(app, search_id):
+    search_state.start(search_id)
+    search_state.publish_basic(search_id, BASIC, result_key='results:stream')
+    stream = search_events.stream(search_id, lambda snapshot: '/results')
+    assert next(stream).startswith('retry:')
+    events = parse(next(stream) + next(stream))
+    assert events[0] == ('state', {'state': 'enriching', 'progress': None})
+    assert events[1] == ('results', BASIC)
+
+    enriched = dict(BASIC[1], enriched=True, pros='Crisp')
+    search_state.complete(search_id, [BASIC[0], enriched], result_key='results:stream')
+    events = parse(''.join(stream))
+    assert [name for name, _ in events] == ['state', 'result', 'done']
+    assert events[1][1] == enriched
+    assert events[2][1]['redirect_url'] == '/results'
+
+
+def test_stream_reports_unknown_search(app):
+    events = parse(''.join(search_events.stream('missing', lambda snapshot: '/')))
+    assert events == [('gone', {})]
+
+
+def test_stream_ends_when_the_worker_shuts_down(app, search_id):
+    search_state.start(search_id)
+    stream = search_events.stream(search_id, lambda snapshot: '/')
+    assert next(stream).startswith('retry:')
+    assert parse(next(stream))[0][0] == 'state'
+    scheduler.begin_shutdown()
+    try:
+        started = time.time()
+        assert list(stream) == []
+        assert time.time() - started < 1
+    finally:
+        scheduler.shutting_down.clear()
+
+
+def test_events_route(client, search_id):
+    search_state.start(search_id)
+    search_state.fail(search_id, 'Firecrawl is down')
+    response = client.get(f'/search/{search_id}/events')
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = parse(response.get_data(as_text=True))
+    assert events[-1][0] == 'done'
+    assert '/api-error' in events[-1][1]['redirect_url']
+    assert search_events.slots.open == 0
+
+
+def test_streams_are_capped(client, app, search_id):
+    app.config['SSE_MAX_STREAMS'] = 0
+    response = client.get(f'/search/{search_id}/events')
+    assert response.status_code == 503
@@ -0,0 +1,258 @@
+import time
+import uuid
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.cache_codec import PORTABLE_MAGIC
+from app.services.firecrawl_service import FirecrawlAPIManager, get_detailed_results
+from app.services.search_state import (
+    search_state, SearchJob, SearchCancelled, PENDING, RUNNING, COMPLETE, ERROR, CANCELLED
+)
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+def test_search_lifecycle(app):
+    """Test a search moves from pending to complete with its results."""
+    search_id = new_id()
+    search_state.create(search_id, {'website': 'allrecipes.com', 'query': 'cookies'})
+    assert search_state.get(search_id)['state'] == PENDING
+
+    assert search_state.start(search_id)
+    assert search_state.get(search_id)['state'] == RUNNING
+
+    assert search_state.complete(search_id, [{'title': 'Cookies'}])
+    state = search_state.get(search_id)
+    assert state['state'] == COMPLETE
+    assert state['params']['query'] == 'cookies'
+    assert state['result'] == [{'title': 'Cookies'}]
+
+
+def test_transitions_are_claimed_once(app):
+    """Test a search can only be started once and not failed after completing."""
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    assert search_state.start(search_id)
+    assert not search_state.start(search_id)
+
+    assert search_state.complete(search_id, [])
+    assert not search_state.fail(search_id, 'too late')
+    assert search_state.get(search_id)['state'] == COMPLETE
+
+    assert not search_state.start(new_id())
+
+
+def test_failed_search_keeps_error(app):
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    assert search_state.fail(search_id, 'API limit reached')
+    state = search_state.get(search_id)
+    assert state['state'] == ERROR
+    assert state['error'] == 'API limit reached'
+    assert state['result'] is None
+
+
+def test_expired_searches_are_removed(app):
+    search_id = new_id()
+    app.config['SEARCH_STATE_TTL'] = 60
+    search_state.create(search_id, {'query': 'cookies'})
+
+    with patch('app.services.search_state.time.time', return_value=time.time() + 120):
+        assert search_state.get(search_id) is None
+        search_state.cleanup()
+    count = search_state._connection().execute(
+        'SELECT COUNT(*) FROM search_state WHERE search_id = ?', (search_id,)
+    ).fetchone()[0]
+    assert count == 0
+
+
+def test_status_and_results_read_shared_state(client):
+    """Test status polls and the results page work from the shared store alone."""
+    search_id = new_id()
+    search_state.create(search_id, {'website': 'allrecipes.com', 'query': 'cookies', 'ranking_type': 'relevance'})
+    with client.session_transaction() as sess:
+        sess['search_id'] = search_id
+
+    assert client.get('/check_search_status').get_json()['complete'] is False
+
+    search_state.start(search_id)
+    search_state.complete(search_id, [{'title': 'Chewy Cookies', 'summary': 'Soft.', 'url': 'https://example.com/1'}])
+    data = client.get('/check_search_status').get_json()
+    assert data['complete'] is True
+    assert data['redirect_url'].endswith(f'/results/{search_id}')
+
+    response = client.get(f'/results/{search_id}')
+    assert response.status_code == 200
+    assert b'Chewy Cookies' in response.data
+
+
+def test_status_reports_errors(client):
+    search_id = new_id()
+    search_state.create(search_id, {'website': 'allrecipes.com', 'query': 'cookies'})
+    search_state.fail(search_id, 'Search failed')
+    with client.session_transaction() as sess:
+        sess['search_id'] = search_id
+
+    data = client.get('/check_search_status').get_json()
+    assert data['complete'] is True
+    assert 'Search+failed' in data['redirect_url']
+
+
+def test_identical_searches_share_results(app):
+    """Test searches completed with the same key point at one stored result set."""
+    first, second = new_id(), new_id()
+    for search_id in (first, second):
+        search_state.create(search_id, {'query': 'cookies'})
+        search_state.complete(search_id, [{'title': 'Cookies'}], result_key='search_results:shared')
+
+    assert search_state.get(first)['result_key'] == search_state.get(second)['result_key']
+    count = search_state._connection().execute(
+        'SELECT COUNT(*) FROM result_sets WHERE result_key = ?', ('search_results:shared',)
+    ).fetchone()[0]
+    assert count == 1
+    assert search_state.get(second)['result'] == [{'title': 'Cookies'}]
+
+
+def test_concurrent_identical_search_keeps_enrichments(app):
+    """Test a second search publishing basic results does not wipe the first one's enrichments."""
+    first, second = new_id(), new_id()
+    key = 'search_results:concurrent'
+    basic = [{'title': 'A', 'url': 'https://example.com/a'}, {'title': 'B', 'url': 'https://example.com/b'}]
+    search_state.create(first, {'query': 'cookies'})
+    search_state.start(first)
+    search_state.publish_basic(first, basic, result_key=key)
+    assert search_state.update_result(key, 'https://example.com/a',
+                                      {'title': 'A', 'url': 'https://example.com/a', 'summary': 'Chewy',
+                                       'enriched': True})
+
+    search_state.create(second, {'query': 'cookies'})
+    search_state.start(second)
+    search_state.publish_basic(second, basic, result_key=key)
+    results = search_state.load_results(key)
+    assert [(r.title, r.enriched, r.summary) for r in results] == [('A', True, 'Chewy'), ('B', False, '')]
+
+
+def test_stored_columns_use_the_portable_encoding(app):
+    """Test everything written to the shared database round-trips as portable data, not marshal."""
+    search_id = new_id()
+    params = {'website': 'example.com', 'query': 'cookies', 'cache_only': False}
+    checkpoint = {'stage': 'enrich', 'result_key': 'results:portable', 'remaining': 12.5, 'user_id': 7}
+    search_state.create(search_id, params)
+    search_state.start(search_id)
+    assert search_state.set_progress(search_id, {'stage': 'searching', 'eta': 30.0})
+    search_state.publish_basic(search_id, [{'title': 'A', 'url': 'https://example.com/a'}],
+                               result_key='results:portable')
+    assert search_state.suspend(search_id, checkpoint)
+
+    conn = search_state._connection()
+    row = conn.execute('SELECT params, checkpoint, progress FROM search_state WHERE search_id = ?',
+                       (search_id,)).fetchone()
+    data = conn.execute('SELECT data FROM result_sets WHERE result_key = ?', ('results:portable',)).fetchone()[0]
+    assert all(blob.startswith(PORTABLE_MAGIC) for blob in (*row, data))
+    assert [r.title for r in search_state.load_results('results:portable')] == ['A']
+
+    claimed = {claimed_id: (p, c) for claimed_id, p, c in search_state.claim_interrupted()}
+    assert claimed[search_id] == (params, checkpoint)
+
+
+def test_result_sets_are_evicted_least_recently_read_first(app):
+    """Test the byte cap evicts the result set that was read longest ago."""
+    payload = [{'title': f'Recipe {i}', 'summary': 'x' * 50} for i in range(20)]
+    old_id, hot_id, new_search = new_id(), new_id(), new_id()
+    keys = {old_id: f'lru:{old_id}', hot_id: f'lru:{hot_id}', new_search: f'lru:{new_search}'}
+
+    with patch('app.services.search_state.time.time', return_value=time.time() + 10):
+        search_state.create(old_id, {'query': 'old'})
+        search_state.complete(old_id, payload, result_key=keys[old_id])
+    with patch('app.services.search_state.time.time', return_value=time.time() + 20):
+        search_state.create(hot_id, {'query': 'hot'})
+        search_state.complete(hot_id, payload, result_key=keys[hot_id])
+    with patch('app.services.search_state.time.time', return_value=time.time() + 30):
+        search_state.get(old_id)  # Reading the old set makes it recently used
+
+    size = search_state._connection().execute(
+        'SELECT size FROM result_sets WHERE result_key = ?', (keys[old_id],)
+    ).fetchone()[0]
+    app.config['SEARCH_RESULT_MAX_BYTES'] = size * 2
+    with patch('app.services.search_state.time.time', return_value=time.time() + 40):
+        search_state.create(new_search, {'query': 'new'})
+        search_state.complete(new_search, payload, result_key=keys[new_search])
+        assert search_state.get(hot_id)['result'] is None
+        assert search_state.get(old_id)['result'] == payload
+        assert search_state.get(new_search)['result'] == payload
+
+
+def test_stale_heartbeat_cancels_search(app):
+    """Test a search nobody has polled for is cancelled and its job stops."""
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    search_state.start(search_id)
+    job = SearchJob(search_id)
+    job.check()
+
+    timeout = app.config['SEARCH_HEARTBEAT_TIMEOUT']
+    with patch('app.services.search_state.time.time', return_value=time.time() + timeout + 1):
+        with pytest.raises(SearchCancelled):
+            job.check()
+    state = search_state.get(search_id)
+    assert state['state'] == CANCELLED
+    assert not search_state.complete(search_id, [{'title': 'Too late'}])
+
+
+def test_heartbeat_keeps_search_alive(app):
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    timeout = app.config['SEARCH_HEARTBEAT_TIMEOUT']
+    with patch('app.services.search_state.time.time', return_value=time.time() + timeout):
+        search_state.heartbeat(search_id)
+    with patch('app.services.search_state.time.time', return_value=time.time() + timeout + 5):
+        assert not SearchJob(search_id).cancelled
+
+
+def test_new_search_cancels_previous_one(client):
+    """Test starting a second search in a session cancels the first."""
+    with patch('app.main.routes.scheduler.submit'):
+        client.post('/search', data={'website': 'allrecipes.com', 'query': 'cookies'})
+        with client.session_transaction() as sess:
+            first = sess['search_id']
+        client.post('/search', data={'website': 'allrecipes.com', 'query': 'brownies'})
+
+    assert search_state.get(first)['state'] == CANCELLED
+    with client.session_transaction() as sess:
+        assert search_state.get(sess['search_id'])['state'] == PENDING
+
+
+@patch('app.services.firecrawl_service.time.sleep')
+@patch('app.services.firecrawl_service.FirecrawlApp')
+def test_cancelled_search_stops_polling_extract(mock_firecrawl, mock_sleep, app):
+    """Test a cancelled job stops polling the provider and never returns results."""
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    search_state.start(search_id)
+    firecrawl = mock_firecrawl.return_value
+    firecrawl.async_extract.__name__ = 'async_extract'
+    firecrawl.async_extract.return_value = {'success': True, 'id': 'extract-1'}
+
+    def still_processing(extract_id):
+        search_state.cancel(search_id)
+        return {'status': 'processing'}
+    firecrawl.get_extract_status.side_effect = still_processing
+
+    with pytest.raises(SearchCancelled):
+        FirecrawlAPIManager().search('allrecipes.com', 'cookies', SearchJob(search_id))
+    assert firecrawl.get_extract_status.call_count == 1
+    firecrawl.extract.assert_not_called()
+
+
+def test_cancelled_search_skips_enrichment(app):
+    search_id = new_id()
+    search_state.create(search_id, {'query': 'cookies'})
+    search_state.cancel(search_id)
+    fetch = MagicMock()
+    with patch('app.services.firecrawl_service.DEV_MODE', False), \
+            patch('app.services.firecrawl_service.extraction_cache.get_or_extract', fetch):
+        with pytest.raises(SearchCancelled):
+            get_detailed_results([{'url': 'https://allrecipes.com/recipe/1'}], 'allrecipes.com',
+                                 SearchJob(search_id))
+    fetch.assert_not_called()